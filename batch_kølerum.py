@@ -0,0 +1,214 @@
+"""Dette modul kører simuleringen af mange måneder på én gang med NumPy og bliver brugt i Monte Carlo.
+
+    Returns:
+        _type_: dict - Samlet data for simuleringen af alle månederne som arrays
+"""
+import numpy as np
+
+from kølerum import COMPRESSOR_BIT, DELTA_T, DOOR_BIT, STEPS
+from price_series import as_price_array
+from termostat import Thermostat
+
+
+class BatchKølerum:
+    def __init__(self, thermostat: Thermostat, energy_prices, months=1, rng=None, door_schedule=None, record_logs=True, steps=STEPS, delta_t=DELTA_T, ambient=None, record_states=False):
+        """Samme kølerum som Kølerum, men tilstanden for hver måned ligger i arrays af længde months.
+
+        Args:
+            thermostat (Thermostat): termostatet der styrer kompressoren
+            energy_prices (PriceSeries): Elpriser, se price_series.as_price_array
+            months (int, optional): antal måneder der simuleres samtidig. Defaults to 1.
+            rng (np.random.Generator, optional): tilfældighedsgenerator til døren. Defaults to None.
+            door_schedule (DoorSchedule, optional): dørens åbninger for alle månederne. Defaults to None.
+            record_logs (bool, optional): gem logs for hvert step. Er den False summeres kun
+                priserne for hver måned. Et tal gemmer kun logs for de første
+                record_logs måneder. Defaults to True.
+            steps (int, optional): antal steps i simuleringen. Defaults to STEPS.
+            delta_t (float, optional): sekunder pr. step. Defaults to DELTA_T.
+            ambient (PriceSeries, optional): rumtemperatur pr. step, se Kølerum. Defaults to None.
+            record_states (bool, optional): gem også dør og kompressor for de måneder der
+                gemmes logs for, se Kølerum. Defaults to False.
+
+        Examples:
+            >>> k = BatchKølerum(thermostat=None, energy_prices=[], months=3)
+            >>> k.t_current
+            array([5., 5., 5.])
+            >>> BatchKølerum(thermostat=None, energy_prices=[], months=3, record_logs=1, steps=10).temps.shape
+            (1, 10)
+        """
+        self.t_rum = 20  # Rumtemperatur
+        self.t_komp = -5  # Kompressorens køletemperatur
+        self.delta_t = delta_t  # Sekunder pr. step
+        self.t_start = 5  # Starttemperatur
+        self.t_target = 5  # Mål for temperatur
+        self.steps = steps  # Antal steps i simuleringen
+
+        self.months = months  # Antal måneder der køres samtidig
+        self.t_current = np.full(months, float(self.t_start))  # Én temperatur pr. måned
+        self.door_open = np.zeros(months, dtype=bool)  # Døren er lukket til at starte med
+        self.compressor_on = np.zeros(months, dtype=bool)  # Kompressoren er slukket til at starte med
+
+        self.n = 0  # 0 minutter er gået
+        # Antal måneder der gemmes logs for
+        self.record_logs = months if record_logs is True else min(int(record_logs), months)
+        logs_shape = (self.record_logs, self.steps)
+        self.food_waste = np.zeros(logs_shape)  # Madspild
+        self.temps = np.zeros(logs_shape)  # Temperatur
+        self.electricity_cost = np.zeros(logs_shape)  # Elpris
+        self.states = np.zeros(logs_shape, dtype=np.uint8) if record_states else None  # Dør og kompressor pr. step
+        self.food_waste_total = np.zeros(months)  # Samlet madspild pr. måned
+        self.electricity_total = np.zeros(months)  # Samlet elpris pr. måned
+
+        self.energy_prices = as_price_array(energy_prices)  # Elpriser som float64 array
+        self.termostat = thermostat  # Termostat
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.door_schedule = door_schedule  # Dørens åbninger trukket på forhånd
+        self.ambient = None if ambient is None else as_price_array(ambient)  # Rumtemperatur pr. step
+
+    def decide_constants(self, door: np.ndarray, compressor: np.ndarray) -> tuple:
+        """Bestemmer konstanterne for alle måneder på én gang
+
+        Args:
+            door (np.ndarray): True hvor døren er åben
+            compressor (np.ndarray): True hvor kompressoren er tændt
+
+        Returns:
+            tuple: c_1 og c_2 som arrays
+
+        Examples:
+            >>> k = BatchKølerum(thermostat=None, energy_prices=[], months=2)
+            >>> c_1, c_2 = k.decide_constants(np.array([True, False]), np.array([True, False]))
+            >>> c_1.tolist(), c_2.tolist()
+            ([3.0000000000000004e-05, 5e-07], [8e-06, 0.0])
+        """
+        c_1 = np.where(door, 3 * (10**-5), 5 * (10**-7))  # Åben/lukket dør
+        c_2 = np.where(compressor, 8 * (10**-6), 0.0)  # Kompr tændt/slukket
+        return c_1, c_2
+
+    def decide_door(self, percentage=0.1) -> np.ndarray:
+        """Bestemmer om døren er åben for hver måned
+
+        Er der givet et door_schedule læses døren derfra i stedet for at trække.
+
+        Args:
+            percentage (float, optional): Procent chance for at døren er åben (10%). Defaults to 0.1.
+
+        Returns:
+            np.ndarray: True hvor døren er åben
+
+        Examples:
+            >>> k = BatchKølerum(thermostat=None, energy_prices=[], months=4)
+            >>> k.decide_door(1.0).tolist()
+            [True, True, True, True]
+            >>> k.decide_door(0.0).tolist()
+            [False, False, False, False]
+        """
+        if self.door_schedule is not None:
+            return self.door_schedule.step(self.n)
+        return self.rng.random(self.months) <= percentage
+
+    def update_compressor(self) -> np.ndarray:
+        """Spørger termostatet om kompressoren skal tændes for hver måned
+
+        Returns:
+            np.ndarray: True hvor kompressoren skal tændes
+        """
+        return self.termostat.update_compressor_batch(self.t_current, self.n)
+
+    def get_new_temperature(self) -> np.ndarray:
+        """Beregner de nye temperaturer og inkrementerer n med et step på delta_t sekunder
+
+        Returns:
+            np.ndarray: nye temperaturer
+        """
+        if self.record_logs:
+            self.temps[:, self.n] = self.t_current[:self.record_logs]  # Gemmer temperaturen
+        self.door_open = self.decide_door()  # Bestemmer om døren er åben
+        self.compressor_on = self.update_compressor()  # Bestemmer om kompressoren er tændt
+        c_1, c_2 = self.decide_constants(self.door_open, self.compressor_on)
+        if self.states is not None:
+            self.states[:, self.n] = (
+                self.door_open[:self.record_logs] * DOOR_BIT + self.compressor_on[:self.record_logs] * COMPRESSOR_BIT
+            )
+
+        t_rum = self.t_rum if self.ambient is None else self.ambient[self.n]
+        delta_t_current_rum = t_rum - self.t_current
+        delta_t_current_komp = self.t_komp - self.t_current
+        new_temp = (
+            self.t_current
+            + (c_1 * delta_t_current_rum + c_2 * delta_t_current_komp) * self.delta_t
+        )  # Beregner de nye temperaturer
+        self.t_current = new_temp  # Opdaterer temperaturerne
+        self.n += 1  # Inkrementerer n
+        return new_temp
+
+    def calculate_food_waste(self) -> None:
+        """Beregner madspildet for alle måneder i det nuværende step
+
+        Examples:
+            >>> k = BatchKølerum(thermostat=None, energy_prices=[], months=3)
+            >>> k.t_current = np.array([3.0, 5.0, 7.0])
+            >>> k.calculate_food_waste()
+            >>> k.food_waste[:, 0].round(4).tolist()
+            [1.0094, 0.0, 0.9634]
+        """
+        t = self.t_current
+        frost = t < 3.5  # Frostskade
+        bacteria = t > 6.5  # Bakterievækst
+        waste = np.where(
+            frost,
+            4.39 * np.exp(-0.49 * t),
+            np.where(bacteria, 0.11 * np.exp(0.31 * t), 0.0),
+        ) * (self.delta_t / DELTA_T)  # Priserne er pr. 5 minutter, se Kølerum
+        self.food_waste_total += waste
+        if self.record_logs:
+            self.food_waste[:, self.n] = waste[:self.record_logs]
+
+    def calculate_electricity_price(self) -> None:
+        """Beregner elprisen for alle måneder hvor kompressoren er tændt"""
+        cost = np.where(self.compressor_on, self.energy_prices[self.n] * (self.delta_t / DELTA_T), 0.0)
+        self.electricity_total += cost
+        if self.record_logs:
+            self.electricity_cost[:, self.n] = cost[:self.record_logs]
+
+    def sum_up_cost(self) -> dict:
+        """Summerer dataen for alle månederne
+
+        Returns:
+            dict: logs som arrays af formen (record_logs, steps) og priser pr. måned
+        """
+        return {
+            "temperature_log": self.temps,
+            "electricity_log": self.electricity_cost,
+            "food_waste_log": self.food_waste,
+            "state_log": self.states,
+            "electricity_total": self.electricity_total,
+            "food_waste_total": self.food_waste_total,
+            "total_cost": self.electricity_total + self.food_waste_total,
+        }
+
+    def step(self):
+        """Kører simulationen for et step for alle måneder"""
+        self.calculate_food_waste()
+        self.calculate_electricity_price()
+        self.get_new_temperature()
+
+    def run_simulation(self):
+        """Kører simulationen for hele horisonten for alle måneder på én gang"""
+        for _ in range(self.steps):
+            self.step()
+        return self.sum_up_cost()
+
+
+if __name__ == "__main__":
+    """Dette er blot for at det er muligt at se hvad modulet gør og køre doctest"""
+    import doctest
+
+    from price_series import PriceSeries
+    from termostat import ThermostatSemiSmart
+
+    energy_prices = PriceSeries.load("elpris.csv")
+
+    KØL = BatchKølerum(ThermostatSemiSmart(energy_prices), energy_prices, months=100)
+    print(KØL.run_simulation()["total_cost"].mean())  # Gennemsnitlig pris pr. måned
+    print(doctest.testmod())
@@ -0,0 +1,307 @@
+"""Dette modul måler hvor hurtigt simuleringens varme stier kører.
+
+Hver måling giver tid, steps pr. sekund og det højeste hukommelsesforbrug
+målt med tracemalloc. Resultaterne kan gemmes som JSON og sammenlignes med en
+tidligere baseline, så et fald i hastighed mellem to commits kan ses.
+
+Kør fx:
+    python benchmark.py --quick --save benchmarks/baseline.json
+    python benchmark.py --quick --baseline benchmarks/baseline.json
+"""
+
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from kølerum import STEPS, Kølerum
+from monte_carlo import ENGINES, MonteCarlo
+from termostat import THERMOSTATS, ThermostatSimple, ThermostatSmart
+
+
+def measure(func, steps, setup=None, repeat=3):
+    """Måler en funktion. Tiden er den bedste af repeat kørsler.
+
+    Hukommelsen måles i en ekstra kørsel, da tracemalloc gør koden langsommere.
+
+    Args:
+        func (callable): kaldes med resultatet af setup, eller uden argumenter
+        steps (int): antal simulerede steps (eller kald) i én kørsel
+        setup (callable, optional): laver nye argumenter før hver kørsel. Defaults to None.
+        repeat (int, optional): antal tidsmålinger. Defaults to 3.
+
+    Returns:
+        dict: seconds, steps, steps_per_second og peak_memory_bytes
+
+    Examples:
+        >>> result = measure(lambda: sum(range(1000)), steps=1000, repeat=2)
+        >>> sorted(result)
+        ['peak_memory_bytes', 'seconds', 'steps', 'steps_per_second']
+        >>> result["steps"]
+        1000
+    """
+    def call():
+        # Setup er ikke med i målingen
+        arguments = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        func(*arguments)
+        return time.perf_counter() - start
+
+    best = min(call() for _ in range(repeat))
+
+    tracemalloc.start()
+    try:
+        arguments = () if setup is None else (setup(),)
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        func(*arguments)
+        _, peak = tracemalloc.get_traced_memory()
+        peak -= before
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": best,
+        "steps": steps,
+        "steps_per_second": steps / best if best > 0 else float("inf"),
+        "peak_memory_bytes": peak,
+    }
+
+
+def default_cases(energy_prices, quick=False):
+    """Laver listen af målinger for kølerummet, Monte Carlo, termostaterne og plotteren.
+
+    Alle motorer fra monte_carlo.ENGINES måles i samme sæt, så en hurtigere
+    motor altid sammenlignes med den skalare.
+
+    Args:
+        energy_prices (PriceSeries): elpriserne
+        quick (bool, optional): kun N=10 og N=100 for Monte Carlo. Defaults to False.
+
+    Returns:
+        list: tuples af (navn, func, steps, setup)
+    """
+    cases = []
+    step_count = 1000
+
+    for name, thermostat_class in THERMOSTATS.items():
+        def new_kølerum(thermostat_class=thermostat_class):
+            return Kølerum(thermostat_class(energy_prices), energy_prices, rng=np.random.default_rng(0))
+
+        def steps(kølerum):
+            for _ in range(step_count):
+                kølerum.step()
+
+        cases.append((f"Kølerum.step[{name}]", steps, step_count, new_kølerum))
+        cases.append((f"Kølerum.run_simulation[{name}]", Kølerum.run_simulation, STEPS, new_kølerum))
+
+    for months in (10, 100) if quick else (10, 100, 1000):
+        for engine in ENGINES:
+            def run(monte_carlo, months=months):
+                monte_carlo.run_simulation(months)
+
+            def new_monte_carlo(engine=engine):
+                kølerum = Kølerum(ThermostatSmart(energy_prices), energy_prices)
+                return MonteCarlo(kølerum, engine=engine, seed=0)
+
+            cases.append((f"MonteCarlo.run_simulation[{engine},N={months}]", run, months * STEPS, new_monte_carlo))
+
+    temperatures = np.random.default_rng(0).normal(5, 1, STEPS)
+    batch_temperatures = np.random.default_rng(1).normal(5, 1, 1000)
+    for name, thermostat_class in THERMOSTATS.items():
+        thermostat = thermostat_class(energy_prices)
+
+        def update(thermostat=thermostat):
+            for n, t in enumerate(temperatures.tolist()):
+                thermostat.update_compressor(t, n)
+
+        def update_batch(thermostat=thermostat):
+            for n in range(0, STEPS, 10):
+                thermostat.update_compressor_batch(batch_temperatures, n)
+
+        cases.append((f"{thermostat_class.__name__}.update_compressor", update, STEPS, None))
+        cases.append((f"{thermostat_class.__name__}.update_compressor_batch[1000]", update_batch, STEPS // 10 * 1000, None))
+
+    cases.extend(_plotter_cases(energy_prices))
+    return cases
+
+
+def _plotter_cases(energy_prices):
+    """Målinger for CoolingPlotter, tomme hvis matplotlib mangler."""
+    try:
+        import matplotlib
+
+        matplotlib.use("Agg")
+        from matplotlib import pyplot as plt
+
+        from plotter import CoolingPlotter
+    except ImportError:
+        return []
+
+    months = 10
+
+    def new_plotter():
+        return CoolingPlotter(
+            months=months,
+            kølerum_simple=Kølerum(ThermostatSimple(energy_prices), energy_prices),
+            kølerum_smart=Kølerum(ThermostatSmart(energy_prices), energy_prices),
+            monte_carlo_class=MonteCarlo,
+            seed=0,
+        )
+
+    plotter = new_plotter()
+
+    def plot(method, **kwargs):
+        def draw():
+            plt.close(getattr(plotter, method)(**kwargs))
+        return draw
+
+    return [
+        ("CoolingPlotter.__init__[N=10]", new_plotter, 2 * months * STEPS, None),
+        ("CoolingPlotter.plot_electricity_cumsum", plot("plot_electricity_cumsum", duration="month"), STEPS, None),
+        ("CoolingPlotter.plot_food_waste_cumsum", plot("plot_food_waste_cumsum", duration="month"), STEPS, None),
+        ("CoolingPlotter.plot_temperature", plot("plot_temperature", duration="week"), STEPS, None),
+        ("CoolingPlotter.plot_histogram_cost", plot("plot_histogram_cost"), STEPS, None),
+    ]
+
+
+def run_suite(cases, repeat=3, only=None, progress=None):
+    """Kører målingerne.
+
+    Args:
+        cases (list): se default_cases
+        repeat (int, optional): antal tidsmålinger pr. måling. Defaults to 3.
+        only (str, optional): kør kun målinger hvis navn indeholder teksten. Defaults to None.
+        progress (callable, optional): kaldes med navn og resultat efter hver måling. Defaults to None.
+
+    Returns:
+        dict: meta og results (navn -> resultat fra measure)
+    """
+    results = {}
+    for name, func, steps, setup in cases:
+        if only is not None and only not in name:
+            continue
+        results[name] = measure(func, steps, setup, repeat)
+        if progress is not None:
+            progress(name, results[name])
+    return {"meta": _meta(repeat), "results": results}
+
+
+def _meta(repeat):
+    """Hvor og hvornår målingen blev lavet."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "repeat": repeat,
+    }
+
+
+def save(report, path):
+    """Gemmer en rapport som JSON.
+
+    Args:
+        report (dict): fra run_suite
+        path (str): filen
+    """
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+
+
+def load(path):
+    """Læser en rapport gemt med save.
+
+    Args:
+        path (str): filen
+
+    Returns:
+        dict: rapporten
+    """
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(report, baseline, tolerance=0.1):
+    """Sammenligner steps pr. sekund med en baseline.
+
+    Args:
+        report (dict): den nye rapport
+        baseline (dict): den gamle rapport
+        tolerance (float, optional): hvor meget langsommere der tillades før det er en
+            regression. Defaults to 0.1.
+
+    Returns:
+        list: en dict pr. måling der findes i begge, med speedup og regression
+
+    Examples:
+        >>> old = {"results": {"a": {"steps_per_second": 100.0, "peak_memory_bytes": 10}}}
+        >>> new = {"results": {"a": {"steps_per_second": 80.0, "peak_memory_bytes": 10}}}
+        >>> row = compare(new, old)[0]
+        >>> row["speedup"], row["regression"]
+        (0.8, True)
+    """
+    rows = []
+    for name, result in report["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        speedup = result["steps_per_second"] / old["steps_per_second"]
+        rows.append({
+            "name": name,
+            "baseline_steps_per_second": old["steps_per_second"],
+            "steps_per_second": result["steps_per_second"],
+            "speedup": speedup,
+            "memory_ratio": result["peak_memory_bytes"] / max(old["peak_memory_bytes"], 1),
+            "regression": speedup < 1 - tolerance,
+        })
+    return rows
+
+
+def _print_result(name, result):
+    """Skriver en måling som én linje med tid, steps pr. sekund og hukommelse."""
+    print(
+        f"{name:<60} {result['seconds']:9.4f} s {result['steps_per_second']:14,.0f} steps/s "
+        f"{result['peak_memory_bytes'] / 2**20:9.2f} MiB"
+    )
+
+
+if __name__ == "__main__":
+    """Kører målingerne og gemmer eller sammenligner dem"""
+    import argparse
+
+    from price_series import PriceSeries
+
+    parser = argparse.ArgumentParser(description="Benchmark af simuleringen")
+    parser.add_argument("--quick", action="store_true", help="spring N=1000 over")
+    parser.add_argument("--repeat", type=int, default=3, help="tidsmålinger pr. måling")
+    parser.add_argument("--only", help="kør kun målinger hvis navn indeholder teksten")
+    parser.add_argument("--save", help="gem rapporten som JSON")
+    parser.add_argument("--baseline", help="sammenlign med en gemt rapport")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="tilladt fald i hastighed")
+    args = parser.parse_args()
+
+    energy_prices = PriceSeries.load("elpris.csv")
+    report = run_suite(
+        default_cases(energy_prices, args.quick), args.repeat, args.only, progress=_print_result
+    )
+    if args.save:
+        save(report, args.save)
+    if args.baseline:
+        rows = compare(report, load(args.baseline), args.tolerance)
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else ""
+            print(f"{row['name']:<60} {row['speedup']:6.2f}x {flag}")
+        if any(row["regression"] for row in rows):
+            raise SystemExit(1)
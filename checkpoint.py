@@ -0,0 +1,167 @@
+"""Dette modul gemmer færdige blokke af en lang Monte Carlo kørsel på disken.
+
+En checkpoint mappe indeholder en manifest.json og en .npz fil for hver
+gruppe af færdige måneder. Manifestet gemmer seed og næste måned, hvilket er
+hele tilfældighedstilstanden, da hver blok har sin egen strøm ud fra seed og
+blokkens nummer. En afbrudt kørsel kan derfor fortsætte og give præcis samme
+resultat som en kørsel der aldrig blev afbrudt.
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from result_cache import cache_key
+
+MONTHLY = ("monthly_total_costs", "monthly_electricity_costs", "monthly_food_waste_costs")
+LOGS = ("temperature_logs", "electricity_logs", "food_waste_logs")
+
+
+class Checkpoint:
+    def __init__(self, directory):
+        """En checkpoint mappe.
+
+        Args:
+            directory (str): mappen
+        """
+        self.directory = Path(directory)  # Checkpoint mappen
+        self.manifest_path = self.directory / "manifest.json"
+
+    def exists(self):
+        """Om der er et manifest i mappen.
+
+        Returns:
+            bool: True hvis der er et checkpoint
+        """
+        return self.manifest_path.exists()
+
+    def read_manifest(self):
+        """Læser manifestet.
+
+        Returns:
+            dict: manifestet
+        """
+        with open(self.manifest_path) as file:
+            return json.load(file)
+
+    def start(self, monte_carlo, months, sample_months, seed, checkpoint_months):
+        """Opretter et nyt checkpoint, eller validerer og åbner et eksisterende.
+
+        Sluttede den forrige kørsel midt i en blok, og skal der køres flere
+        måneder, fjernes månederne efter den sidste blokgrænse, så de køres igen.
+
+        Args:
+            monte_carlo (MonteCarlo): kørslen
+            months (int): antal måneder i alt
+            sample_months (int): måneder hvis fulde logs gemmes
+            seed (int): seed for blokkene
+            checkpoint_months (int): mindst antal måneder pr. gemt fil
+
+        Raises:
+            ValueError: If the checkpoint belongs to a different simulation.
+
+        Returns:
+            dict: manifestet
+        """
+        key, _ = cache_key(monte_carlo)
+        if self.exists():
+            manifest = self.read_manifest()
+            if manifest["key"] != key or manifest["sample_months"] != sample_months:
+                raise ValueError("The checkpoint belongs to a different simulation.")
+            if months < manifest["next_month"]:
+                raise ValueError("The checkpoint already has more months than requested.")
+            partial = manifest["next_month"] % manifest["chunk_size"]
+            if months > manifest["next_month"] and partial:
+                # Den sidste blok sluttede før blokgrænsen og skal køres igen fra grænsen,
+                # da en kortere blok ikke giver de samme måneder som en hel blok
+                self.truncate(manifest, manifest["next_month"] - partial)
+            manifest["months"] = months
+        else:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            manifest = {
+                "key": key,
+                "seed": int(seed),
+                "months": months,
+                "sample_months": sample_months,
+                "chunk_size": monte_carlo.chunk_size(),
+                "checkpoint_months": checkpoint_months,
+                "next_month": 0,
+                "files": [],
+            }
+        self._write_manifest(manifest)
+        return manifest
+
+    def save(self, manifest, first, stop, block):
+        """Gemmer måneder [first, stop) og flytter manifestets næste måned.
+
+        Filen skrives før manifestet, så et nedbrud mellem de to kun koster
+        den sidste blok.
+
+        Args:
+            manifest (dict): manifestet
+            first (int): første måned i blokken
+            stop (int): måneden efter blokken
+            block (dict): arrays for MONTHLY og LOGS
+        """
+        manifest["files"].append([first, stop, self._write_block(first, stop, block)])
+        manifest["next_month"] = stop
+        self._write_manifest(manifest)
+
+    def truncate(self, manifest, month):
+        """Fjerner de gemte måneder fra month og frem.
+
+        En fil der går hen over month skrives igen med kun månederne før month.
+        Manifestet skrives før de gamle filer slettes.
+
+        Args:
+            manifest (dict): manifestet
+            month (int): den første måned der fjernes
+        """
+        files, removed = [], []
+        for first, stop, name in manifest["files"]:
+            if stop <= month:
+                files.append([first, stop, name])
+                continue
+            removed.append(name)
+            if first < month:
+                with np.load(self.directory / name) as data:
+                    kept = max(0, min(month, manifest["sample_months"]) - first)  # Måneder med logs
+                    block = {key: data[key][:month - first] for key in MONTHLY}
+                    block.update({key: data[key][:kept] for key in LOGS})
+                files.append([first, month, self._write_block(first, month, block)])
+        manifest["files"] = files
+        manifest["next_month"] = month
+        self._write_manifest(manifest)
+        for name in removed:
+            (self.directory / name).unlink(missing_ok=True)
+
+    def blocks(self, manifest):
+        """Læser de gemte blokke i rækkefølge.
+
+        Args:
+            manifest (dict): manifestet
+
+        Yields:
+            dict: arrays for MONTHLY og LOGS
+        """
+        for _, _, name in manifest["files"]:
+            with np.load(self.directory / name) as data:
+                yield {name: data[name] for name in data.files}
+
+    def _write_block(self, first, stop, block):
+        """Skriver måneder [first, stop) atomisk og giver filens navn."""
+        name = f"months-{first:08d}-{stop:08d}.npz"
+        tmp_path = self.directory / (name + ".tmp")
+        with open(tmp_path, "wb") as handle:
+            np.savez(handle, **block)
+        os.replace(tmp_path, self.directory / name)
+        return name
+
+    def _write_manifest(self, manifest):
+        """Skriver manifestet atomisk."""
+        tmp_path = self.manifest_path.with_name("manifest.json.tmp")
+        with open(tmp_path, "w") as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(tmp_path, self.manifest_path)
@@ -0,0 +1,331 @@
+"""Dette modul kører Monte Carlo simuleringen fra kommandolinjen uden GUI.
+
+Det importerer hverken PySimpleGUI, Tk eller matplotlib, så det kan køres
+på en server. Resultaterne skrives som CSV og NPZ, og tiden som JSON, så
+store kørsler kan laves headless og bagefter ses i GUI'en.
+
+Kør fx:
+    python cli.py --thermostat simple smart --months 10000 --engine batch --seed 1 --output results
+"""
+
+import argparse
+import csv
+import json
+import math
+import sys
+import time
+from pathlib import Path
+from statistics import NormalDist
+
+import numpy as np
+
+from density import DensityEngine
+from distributed import Coordinator, parse_address, start_local_workers
+from kølerum import DELTA_T, STEPS, Kølerum
+from monte_carlo import ENGINES, MonteCarlo
+from price_series import PriceSeries
+from tail_risk import TailRisk
+from termostat import THERMOSTATS, ThermostatOptimal
+from trace_store import TraceStore
+
+QUANTILES = (0.05, 0.5, 0.95)
+
+
+def parse_args(argv=None):
+    """Læser kommandolinjens argumenter.
+
+    Args:
+        argv (list, optional): argumenterne. Defaults to sys.argv.
+
+    Returns:
+        argparse.Namespace: argumenterne
+
+    Examples:
+        >>> args = parse_args(["--thermostat", "smart", "--months", "50"])
+        >>> args.thermostat, args.months, args.engine
+        (['smart'], 50, 'batch')
+
+        Kørselsmåderne kan ikke kombineres:
+
+        >>> parse_args(["--precision", "1", "--checkpoint", "runs"])
+        Traceback (most recent call last):
+        ...
+        SystemExit: 2
+    """
+    parser = argparse.ArgumentParser(description="Kør kølerums simuleringen uden GUI")
+    parser.add_argument("--thermostat", nargs="+", choices=sorted(THERMOSTATS), default=["simple", "smart"])
+    parser.add_argument("--months", type=int, default=100, help="måneder, eller maks måneder med --precision")
+    parser.add_argument("--seed", type=int, nargs="+", default=[None], help="et eller flere seeds")
+    parser.add_argument("--engine", choices=ENGINES, default="batch")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--door-method", choices=("bernoulli", "geometric"))
+    parser.add_argument("--precision", type=float, help="stop når 95%% intervallet har denne halve bredde")
+    parser.add_argument("--checkpoint", help="mappe til checkpoints så en afbrudt kørsel kan fortsætte")
+    parser.add_argument("--prices", default="elpris.csv", help="CSV med elpriser")
+    parser.add_argument("--delta-t", type=int, default=DELTA_T, help="sekunder pr. step")
+    parser.add_argument("--days", type=float, help="dage i hver simulering. Defaults to 30")
+    parser.add_argument("--ambient", help="CSV med rumtemperatur i stedet for de faste 20 grader")
+    parser.add_argument("--ambient-column", default="Temperatur", help="kolonnen med rumtemperaturen")
+    parser.add_argument("--output", help="mappe til summary.csv og evt. traces")
+    parser.add_argument("--traces", type=int, default=0, help="måneder hvis fulde logs gemmes som NPZ")
+    parser.add_argument("--trace-store", help="mappe hvor alle månedernes logs gemmes som kolonner, se trace_store")
+    parser.add_argument("--timing-json", help="fil til tider som JSON, '-' for stdout")
+    parser.add_argument("--profile", action="store_true", help="mål tiden i hver fase af step")
+    parser.add_argument("--coordinator", help="host:port workers fra distributed.py forbinder til")
+    parser.add_argument("--authkey", help="fælles nøgle til --coordinator")
+    parser.add_argument("--local-workers", type=int, default=0, help="workers der startes på denne maskine")
+    parser.add_argument("--worker-timeout", type=float, default=600, help="maks sekunder uden at en shard bliver færdig")
+    parser.add_argument("--exact", action="store_true", help="beregn også den forventede pris uden sampling")
+    parser.add_argument("--tail", type=float, help="estimer også denne kvantil med importance sampling, fx 0.99")
+    parser.add_argument("--tail-months", type=int, default=2000, help="måneder i importance sampling kørslen")
+    args = parser.parse_args(argv)
+    if args.coordinator and not args.authkey:
+        parser.error("--coordinator needs --authkey, otherwise no remote worker can connect")
+    # run_one bruger kun én af disse måder at køre på
+    modes = {
+        "--precision": args.precision is not None,
+        "--checkpoint": bool(args.checkpoint),
+        "--trace-store": bool(args.trace_store),
+        "--coordinator/--local-workers": bool(args.coordinator or args.local_workers),
+    }
+    chosen = [name for name, given in modes.items() if given]
+    if len(chosen) > 1:
+        parser.error(f"{' and '.join(chosen)} cannot be combined")
+    return args
+
+
+def horizon(args):
+    """Antal steps i hver simulering ud fra --days og --delta-t.
+
+    Args:
+        args (argparse.Namespace): se parse_args
+
+    Returns:
+        int: steps
+
+    Examples:
+        >>> horizon(parse_args([])), horizon(parse_args(["--delta-t", "60", "--days", "365"]))
+        (8640, 525600)
+    """
+    if args.days is None:
+        return STEPS * DELTA_T // args.delta_t
+    return round(args.days * 24 * 3600 / args.delta_t)
+
+
+def load_inputs(args):
+    """Indlæser elpriser og evt. rumtemperatur lagt ud på simuleringens steps.
+
+    Args:
+        args (argparse.Namespace): se parse_args
+
+    Returns:
+        tuple: (elpriser, rumtemperatur eller None), se PriceSeries.on_grid
+    """
+    steps = horizon(args)
+    energy_prices = PriceSeries.load(args.prices).on_grid(args.delta_t, steps)
+    ambient = None
+    if args.ambient:
+        ambient = PriceSeries.load(args.ambient, column=args.ambient_column).on_grid(args.delta_t, steps)
+    return energy_prices, ambient
+
+
+def run_one(thermostat_name, energy_prices, args, seed, checkpoint=None, ambient=None, coordinator=None, processes=()):
+    """Kører én termostat med ét seed.
+
+    Args:
+        thermostat_name (str): nøgle i THERMOSTATS
+        energy_prices (PriceSeries): elpriserne, én pr. step
+        args (argparse.Namespace): se parse_args
+        seed (int): seed, eller None
+        checkpoint (str, optional): checkpoint mappe. Defaults to None.
+        ambient (PriceSeries, optional): rumtemperatur pr. step. Defaults to None.
+        coordinator (Coordinator, optional): kør på coordinatorens workers. Defaults to None.
+        processes (list, optional): de lokale workers, se Coordinator.run. Defaults to ().
+
+    Returns:
+        tuple: (række til summary, resultatet fra MonteCarlo, MonteCarlo)
+    """
+    thermostat_class = THERMOSTATS[thermostat_name]
+    kølerum = Kølerum(
+        None,
+        energy_prices,
+        steps=horizon(args),
+        delta_t=args.delta_t,
+        ambient=ambient,
+    )
+    if thermostat_class is ThermostatOptimal:
+        # Styringen skal løses for netop dette kølerum
+        kølerum.termostat = ThermostatOptimal.for_room(kølerum)
+    else:
+        kølerum.termostat = thermostat_class(energy_prices)
+    monte_carlo = MonteCarlo(
+        kølerum,
+        engine=args.engine,
+        batch_size=args.batch_size,
+        seed=seed,
+        workers=args.workers,
+        door_method=args.door_method,
+        profile=args.profile,
+    )
+    started = time.perf_counter()
+    if args.precision is not None:
+        results = monte_carlo.run_until(args.precision, max_months=args.months, sample_months=args.traces)
+    elif coordinator is not None:
+        results = coordinator.run(monte_carlo, args.months, args.traces, timeout=args.worker_timeout, processes=processes)
+    elif checkpoint is not None:
+        results = monte_carlo.run_checkpointed(args.months, checkpoint, sample_months=args.traces)
+    elif args.trace_store:
+        store = TraceStore(Path(args.trace_store) / f"{thermostat_name}-seed{seed}")
+        results = store.record(monte_carlo, args.months, sample_months=args.traces)
+    else:
+        results = monte_carlo.run_streaming(args.months, sample_months=args.traces)
+    seconds = time.perf_counter() - started
+    row = summarize(thermostat_name, seed, results, seconds, steps=kølerum.steps)
+    if args.exact:
+        started = time.perf_counter()
+        row["exact_mean_cost"] = DensityEngine(kølerum).run()["total_cost"]
+        row["exact_seconds"] = time.perf_counter() - started
+    if args.tail is not None:
+        tail = TailRisk(kølerum, engine=args.engine, workers=args.workers, seed=seed).run(args.tail, args.tail_months)
+        row["tail_level"] = tail["level"]
+        row["tail_quantile"] = tail["quantile"]
+        row["tail_door_probability"] = tail["door_probability"]
+        # Standardfejlen på sandsynligheden for at overstige kvantilen, ikke på kvantilen selv
+        row["tail_exceedance_std_error"] = tail["quantile_exceedance"]["std_error"]
+    return row, results, monte_carlo
+
+
+def summarize(thermostat_name, seed, results, seconds, confidence=0.95, steps=STEPS):
+    """Laver en række til summary.csv.
+
+    Args:
+        thermostat_name (str): termostatet
+        seed (int): seed
+        results (dict): fra MonteCarlo.run_streaming
+        seconds (float): tiden kørslen tog
+        confidence (float, optional): konfidensniveau. Defaults to 0.95.
+        steps (int, optional): steps i hver simulering. Defaults to STEPS.
+
+    Returns:
+        dict: statistik og tid for kørslen
+    """
+    stats = results["cost_stats"]
+    months = stats.count
+    std = stats.std() if months > 1 else math.nan
+    half_width = NormalDist().inv_cdf((1 + confidence) / 2) * std / math.sqrt(months) if months > 1 else math.nan
+    row = {
+        "thermostat": thermostat_name,
+        "seed": seed,
+        "months": months,
+        "mean_cost": stats.mean,
+        "std_cost": std,
+        "ci_low": stats.mean - half_width,
+        "ci_high": stats.mean + half_width,
+        "min_cost": stats.min,
+        "max_cost": stats.max,
+    }
+    for q in QUANTILES:
+        row[f"p{round(q * 100):02d}_cost"] = results["cost_sketch"].quantile(q)
+    row["mean_electricity"] = results["electricity_stats"].mean
+    row["mean_food_waste"] = results["food_waste_stats"].mean
+    row["seconds"] = seconds
+    row["months_per_second"] = months / seconds if seconds > 0 else math.inf
+    row["steps_per_second"] = months * steps / seconds if seconds > 0 else math.inf
+    return row
+
+
+def write_summary(rows, path):
+    """Skriver rækkerne som CSV.
+
+    Args:
+        rows (list): rækker fra summarize
+        path (Path): filen
+    """
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_traces(results, path, steps=STEPS):
+    """Gemmer de fulde logs og evt. de månedlige priser som NPZ.
+
+    Args:
+        results (dict): fra MonteCarlo
+        path (Path): filen
+        steps (int, optional): steps i hver simulering. Defaults to STEPS.
+    """
+    arrays = {
+        name: np.asarray(results[name], dtype=float).reshape(-1, steps)
+        for name in ("temperature_logs", "electricity_logs", "food_waste_logs")
+    }
+    if "monthly_total_costs" in results:
+        arrays["monthly_total_costs"] = np.asarray(results["monthly_total_costs"])
+    np.savez_compressed(path, **arrays)
+
+
+def main(argv=None):
+    """Kører alle kombinationer af termostat og seed.
+
+    Args:
+        argv (list, optional): argumenterne. Defaults to sys.argv.
+
+    Returns:
+        list: en række pr. kørsel
+    """
+    args = parse_args(argv)
+    started = time.perf_counter()
+    energy_prices, ambient = load_inputs(args)
+    output = Path(args.output) if args.output else None
+    if output is not None:
+        output.mkdir(parents=True, exist_ok=True)
+
+    coordinator = None
+    processes = []
+    if args.coordinator or args.local_workers:
+        # Én coordinator til alle kørslerne, så workers forbliver forbundet mellem dem
+        address = parse_address(args.coordinator) if args.coordinator else ("127.0.0.1", 0)
+        coordinator = Coordinator(address, args.authkey.encode() if args.authkey else None)
+        processes = start_local_workers(coordinator.address, coordinator.authkey, args.local_workers)
+    rows = []
+    timing = {"runs": [], "load_seconds": time.perf_counter() - started}
+    try:
+        for seed in args.seed:
+            for name in args.thermostat:
+                checkpoint = None
+                if args.checkpoint:
+                    checkpoint = Path(args.checkpoint) / f"{name}-seed{seed}"
+                row, results, monte_carlo = run_one(name, energy_prices, args, seed, checkpoint, ambient, coordinator, processes)
+                rows.append(row)
+                run_timing = {key: row[key] for key in ("thermostat", "seed", "months", "seconds", "months_per_second", "steps_per_second")}
+                if args.profile:
+                    run_timing["profile"] = monte_carlo.profile_report()
+                timing["runs"].append(run_timing)
+                print(
+                    f"{name:<10} seed={seed} months={row['months']} mean={row['mean_cost']:.2f} "
+                    f"[{row['ci_low']:.2f}, {row['ci_high']:.2f}] {row['seconds']:.2f} s",
+                    file=sys.stderr,
+                )
+                if output is not None and args.traces > 0:
+                    write_traces(results, output / f"traces-{name}-seed{seed}.npz", monte_carlo.kølerum_template.steps)
+    finally:
+        if coordinator is not None:
+            coordinator.close()
+            for process in processes:
+                process.join(timeout=5)
+
+    timing["total_seconds"] = time.perf_counter() - started
+    if output is not None:
+        write_summary(rows, output / "summary.csv")
+    if args.timing_json == "-":
+        json.dump(timing, sys.stdout, indent=2)
+        print()
+    elif args.timing_json:
+        with open(args.timing_json, "w") as file:
+            json.dump(timing, file, indent=2)
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Dette modul sammenligner to termostater med parrede måneder.
+
+Begge termostater ser det samme dørmønster i måned i (common random numbers),
+så forskellen i pris pr. måned har meget mindre støj end to uafhængige
+Monte Carlo kørsler. Derudover kan dørene trækkes i antitetiske par og
+antallet af døråbninger bruges som control variate.
+"""
+
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+from door_schedule import DOOR_PROBABILITY, DoorSchedule
+from monte_carlo import MonteCarlo
+
+
+def paired_difference(costs_a, costs_b, door_counts=None, expected_count=None, antithetic=False, confidence=0.95):
+    """Estimerer den forventede forskel i månedlig pris med et konfidensinterval.
+
+    Args:
+        costs_a (np.ndarray): pris pr. måned for termostat a
+        costs_b (np.ndarray): pris pr. måned for termostat b med samme døre
+        door_counts (np.ndarray, optional): antal døråbninger pr. måned til control variate.
+            Defaults to None.
+        expected_count (float, optional): forventet antal døråbninger pr. måned. Defaults to None.
+        antithetic (bool, optional): måned 2k og 2k+1 er antitetiske par. Defaults to False.
+        confidence (float, optional): konfidensniveau. Defaults to 0.95.
+
+    Returns:
+        dict: mean_difference (a - b), std_error, ci_low, ci_high og variance_reduction
+            i forhold til to uafhængige kørsler med samme antal måneder. variance_reduction
+            er nan når std_error er nan eller 0
+
+    Examples:
+        >>> a = np.array([10.0, 12.0, 11.0, 13.0])
+        >>> result = paired_difference(a, a - 2)
+        >>> result["mean_difference"], result["std_error"], result["variance_reduction"]
+        (2.0, 0.0, nan)
+
+        Med én måned er der ingen spredning at sammenligne:
+
+        >>> result = paired_difference([10.0], [9.0])
+        >>> result["mean_difference"], result["std_error"], result["variance_reduction"]
+        (1.0, nan, nan)
+    """
+    costs_a = np.asarray(costs_a, dtype=float)
+    costs_b = np.asarray(costs_b, dtype=float)
+    difference = costs_a - costs_b
+    counts = None if door_counts is None else np.asarray(door_counts, dtype=float)
+    if antithetic:
+        # Et antitetisk par er én uafhængig observation
+        pairs = difference.size // 2
+        difference = difference[: 2 * pairs].reshape(pairs, 2).mean(axis=1)
+        if counts is not None:
+            counts = counts[: 2 * pairs].reshape(pairs, 2).mean(axis=1)
+
+    samples = difference.size
+    estimate = difference
+    if counts is not None and expected_count is not None and samples > 2 and counts.var() > 0:
+        # Control variate: fjerner den del af forskellen der forklares af døren
+        beta = np.cov(difference, counts)[0, 1] / counts.var(ddof=1)
+        estimate = difference - beta * (counts - expected_count)
+
+    mean = float(estimate.mean())
+    std_error = float(estimate.std(ddof=1) / math.sqrt(samples)) if samples > 1 else math.nan
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+
+    if np.isfinite(std_error) and std_error > 0:
+        independent_variance = (costs_a.var(ddof=1) + costs_b.var(ddof=1)) / costs_a.size
+        variance_reduction = float(independent_variance / std_error**2)
+    else:
+        # Med én måned eller en konstant forskel er forholdet ikke defineret
+        variance_reduction = math.nan
+    return {
+        "mean_difference": mean,
+        "std_error": std_error,
+        "ci_low": mean - z * std_error,
+        "ci_high": mean + z * std_error,
+        "confidence": confidence,
+        "months": int(costs_a.size),
+        "mean_a": float(costs_a.mean()),
+        "mean_b": float(costs_b.mean()),
+        "variance_reduction": variance_reduction,
+    }
+
+
+def compare_thermostats(kølerum_a, kølerum_b, months=100, seed=None, antithetic=False, control_variate=False, confidence=0.95, engine="batch", workers=1):
+    """Kører to termostater parret på samme dørmønstre og sammenligner prisen.
+
+    Args:
+        kølerum_a (Kølerum): kølerum med første termostat
+        kølerum_b (Kølerum): kølerum med anden termostat
+        months (int, optional): antal måneder. Defaults to 100.
+        seed (int, optional): seed for dørmønstrene. Defaults to None.
+        antithetic (bool, optional): træk dørene i antitetiske par. Defaults to False.
+        control_variate (bool, optional): brug antal døråbninger som control variate. Defaults to False.
+        confidence (float, optional): konfidensniveau. Defaults to 0.95.
+        engine (str, optional): "scalar" eller "batch". Defaults to "batch".
+        workers (int, optional): antal processer. Defaults to 1.
+
+    Returns:
+        dict: se paired_difference
+    """
+    doors = DoorSchedule.generate(
+        months, np.random.default_rng(seed), steps=kølerum_a.steps, method="bernoulli", antithetic=antithetic
+    )
+    costs_a = MonteCarlo(kølerum_a, engine=engine, workers=workers).run_costs(months, doors)
+    costs_b = MonteCarlo(kølerum_b, engine=engine, workers=workers).run_costs(months, doors)
+    return paired_difference(
+        costs_a,
+        costs_b,
+        door_counts=doors.open_counts() if control_variate else None,
+        expected_count=doors.steps * DOOR_PROBABILITY if control_variate else None,
+        antithetic=antithetic,
+        confidence=confidence,
+    )
+
+
+if __name__ == "__main__":
+    """Sammenligner det simple og det smarte termostat og kører doctest"""
+    import doctest
+
+    from kølerum import Kølerum
+    from price_series import PriceSeries
+    from termostat import ThermostatSimple, ThermostatSmart
+
+    energy_prices = PriceSeries.load("elpris.csv")
+    simple = Kølerum(ThermostatSimple(energy_prices), energy_prices)
+    smart = Kølerum(ThermostatSmart(energy_prices), energy_prices)
+    for options in ({}, {"antithetic": True}, {"antithetic": True, "control_variate": True}):
+        print(options, compare_thermostats(simple, smart, months=200, seed=1, **options))
+    print(doctest.testmod())
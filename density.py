@@ -0,0 +1,195 @@
+"""Dette modul beregner den forventede pris uden at trække tilfældige tal.
+
+Døren er det eneste tilfældige i Kølerum. I stedet for at simulere mange
+måneder følges sandsynlighedsfordelingen af temperaturen på et fint gitter.
+I hvert step spørges termostatet for hvert gitterpunkt, og massen i hvert
+punkt flyttes til den nye temperatur med åben dør (chance p) og lukket dør.
+Lander den nye temperatur mellem to gitterpunkter deles massen lineært
+mellem dem, så middelværdien bevares. Én kørsel giver den forventede pris
+pr. step uden Monte Carlo støj.
+
+Delingen udglatter fordelingen lidt, især ved termostatets grænse, og
+fejlen er proportional med afstanden mellem gitterpunkterne. Derfor køres
+også et gitter med halvt så mange punkter, og 2 * fin - grov fjerner det
+første ordens led (Richardson ekstrapolation).
+
+Termostatet må kun afhænge af temperaturen og n, hvilket gælder alle
+termostaterne i termostat.
+"""
+
+import numpy as np
+
+from door_schedule import DOOR_PROBABILITY
+from kølerum import DELTA_T, STEPS
+from optimal_policy import food_waste
+
+T_LOW = -5.0  # Laveste temperatur i gitteret
+T_HIGH = 20.0  # Højeste temperatur i gitteret
+POINTS = 2501  # Gitterpunkter, 0.01 grader mellem hvert
+
+
+class DensityEngine:
+    def __init__(self, kølerum, door_probability=DOOR_PROBABILITY, t_low=T_LOW, t_high=T_HIGH, points=POINTS, richardson=True):
+        """Forventet pris for et kølerum ved at følge temperaturens fordeling.
+
+        Args:
+            kølerum (Kølerum): kølerummet med termostat, horisont og evt. rumtemperatur
+            door_probability (float, optional): chance for åben dør i et step.
+                Defaults to DOOR_PROBABILITY.
+            t_low (float, optional): laveste temperatur i gitteret. Defaults to T_LOW.
+            t_high (float, optional): højeste temperatur i gitteret. Defaults to T_HIGH.
+            points (int, optional): antal gitterpunkter. Defaults to POINTS.
+            richardson (bool, optional): ekstrapolér med et gitter med halvt så mange
+                punkter. Defaults to True.
+        """
+        self.kølerum = kølerum  # Kølerummet
+        self.door_probability = door_probability  # Chance for åben dør
+        self.richardson = richardson  # Om fejlen fra gitteret ekstrapoleres væk
+        self.grid = np.linspace(t_low, t_high, points)  # Temperaturgitteret
+        self.t_low = t_low  # Laveste temperatur
+        self.scale = (points - 1) / (t_high - t_low)  # Gitterpunkter pr. grad
+        # Konstanterne for (dør, kompressor) i rækkefølgen åben/tændt, åben/slukket, lukket/tændt, lukket/slukket
+        combinations = ((True, True), (True, False), (False, True), (False, False))
+        constants = np.array([kølerum.decide_constants(door, compressor) for door, compressor in combinations])
+        self.c_1 = constants[:, :1]  # Dørens konstant pr. kombination
+        self.c_2 = constants[:, 1:]  # Kompressorens konstant pr. kombination
+        self._targets = None if kølerum.ambient is not None else self._split(kølerum.t_rum)
+
+    def _split(self, t_rum):
+        """Hvilke gitterpunkter massen fra hvert punkt lander i for hver kombination.
+
+        Returns:
+            tuple: (indekser, andele) for venstre og højre nabo, fladet ud til én bincount
+        """
+        grid = self.grid
+        t_next = grid + (self.c_1 * (t_rum - grid) + self.c_2 * (self.kølerum.t_komp - grid)) * self.kølerum.delta_t
+        position = np.clip((t_next - self.t_low) * self.scale, 0, grid.size - 1)
+        left = np.minimum(position.astype(np.intp), grid.size - 2)
+        right_share = position - left
+        return np.concatenate([left.ravel(), left.ravel() + 1]), np.concatenate([(1 - right_share).ravel(), right_share.ravel()])
+
+    def initial(self):
+        """Fordelingen i step 0: al massen ved kølerummets starttemperatur.
+
+        Returns:
+            np.ndarray: sandsynlighed pr. gitterpunkt
+
+        Examples:
+            >>> from kølerum import Kølerum
+            >>> engine = DensityEngine(Kølerum(thermostat=None, energy_prices=[]), points=11, t_low=0, t_high=10)
+            >>> engine.initial().tolist()
+            [0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+        """
+        position = min(max((self.kølerum.t_start - self.t_low) * self.scale, 0), self.grid.size - 1)
+        left = min(int(position), self.grid.size - 2)
+        density = np.zeros(self.grid.size)
+        density[left] = left + 1 - position
+        density[left + 1] = position - left
+        return density
+
+    def run(self, steps=None):
+        """Følger fordelingen gennem hele horisonten i én deterministisk kørsel.
+
+        Rækkefølgen er den samme som i Kølerum.step: madspild for temperaturen i
+        step n, el for kompressoren valgt i step n - 1 og så den nye temperatur.
+
+        Args:
+            steps (int, optional): antal steps. Defaults to kølerummets steps.
+
+        Returns:
+            dict: electricity og food_waste (forventet pris pr. step), temperature_mean og
+                temperature_std pr. step, compressor_on (chance for tændt kompressor pr.
+                step), monthly_electricity, monthly_food_waste og monthly_total (forventet
+                pris pr. måned af 30 dage) samt total_cost for hele horisonten
+
+        Examples:
+            >>> from kølerum import Kølerum
+            >>> from termostat import ThermostatSimple
+            >>> result = DensityEngine(Kølerum(ThermostatSimple(), np.ones(8640))).run(steps=100)
+            >>> result["electricity"].shape, bool(result["compressor_on"][0] == 0)
+            ((100,), True)
+        """
+        result = self._propagate(steps)
+        if self.richardson:
+            points = (self.grid.size - 1) // 2 + 1
+            coarse = DensityEngine(
+                self.kølerum, self.door_probability, self.grid[0], self.grid[-1], points, richardson=False
+            )._propagate(steps)
+            result = {name: 2 * result[name] - coarse[name] for name in result}
+        result["total_cost"] = float(result["electricity"].sum() + result["food_waste"].sum())
+        return result
+
+    def _propagate(self, steps=None):
+        """Selve kørslen på dette gitter, se run."""
+        kølerum = self.kølerum
+        steps = kølerum.steps if steps is None else steps
+        thermostat = kølerum.termostat
+        prices = kølerum.energy_prices
+        p = self.door_probability
+        cost_scale = kølerum.delta_t / DELTA_T  # Priserne er pr. 5 minutter, se Kølerum
+        waste = food_waste(self.grid, kølerum.delta_t)
+        door_shares = np.array([[p], [p], [1 - p], [1 - p]])
+        grid_squared = self.grid**2
+
+        electricity = np.zeros(steps)
+        food = np.zeros(steps)
+        compressor_on = np.zeros(steps)
+        mean = np.zeros(steps)
+        std = np.zeros(steps)
+        density = self.initial()
+        on_mass = 0.0  # Chancen for at kompressoren blev tændt i forrige step
+        for n in range(steps):
+            food[n] = density @ waste
+            electricity[n] = prices.item(n) * on_mass * cost_scale
+            compressor_on[n] = on_mass
+            mean[n] = density @ self.grid
+            std[n] = np.sqrt(max(density @ grid_squared - mean[n] ** 2, 0.0))
+
+            on = np.asarray(thermostat.update_compressor_batch(self.grid, n), dtype=bool)
+            on_density = np.where(on, density, 0.0)
+            off_density = density - on_density
+            on_mass = on_density.sum()
+            mass = door_shares * np.stack([on_density, off_density, on_density, off_density])
+            index, share = self._targets if self._targets is not None else self._split(kølerum.ambient.item(n))
+            density = np.bincount(index, weights=np.concatenate([mass.ravel(), mass.ravel()]) * share, minlength=self.grid.size)
+
+        month_steps = max(1, STEPS * DELTA_T // kølerum.delta_t)
+        starts = np.arange(0, steps, month_steps)
+        monthly_electricity = np.add.reduceat(electricity, starts)
+        monthly_food_waste = np.add.reduceat(food, starts)
+        return {
+            "electricity": electricity,
+            "food_waste": food,
+            "temperature_mean": mean,
+            "temperature_std": std,
+            "compressor_on": compressor_on,
+            "monthly_electricity": monthly_electricity,
+            "monthly_food_waste": monthly_food_waste,
+            "monthly_total": monthly_electricity + monthly_food_waste,
+        }
+
+
+if __name__ == "__main__":
+    """Sammenligner den forventede pris med Monte Carlo og kører doctest"""
+    import doctest
+    import time
+
+    from kølerum import Kølerum
+    from monte_carlo import MonteCarlo
+    from price_series import PriceSeries
+    from termostat import THERMOSTATS
+
+    energy_prices = PriceSeries.load("elpris.csv")
+    for name, thermostat_class in THERMOSTATS.items():
+        kølerum = Kølerum(thermostat_class(energy_prices), energy_prices)
+        started = time.perf_counter()
+        exact = DensityEngine(kølerum).run()["total_cost"]
+        density_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        costs = MonteCarlo(kølerum, engine="batch", seed=1).run_costs(2000)
+        print(
+            f"{name:<10} tæthed {exact:.1f} på {density_seconds:.2f} s, Monte Carlo "
+            f"{costs.mean():.1f} ± {1.96 * costs.std(ddof=1) / np.sqrt(costs.size):.1f} "
+            f"på {time.perf_counter() - started:.2f} s"
+        )
+    print(doctest.testmod())
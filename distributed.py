@@ -0,0 +1,418 @@
+"""Dette modul fordeler en Monte Carlo kørsel på workers på flere maskiner.
+
+En Coordinator lytter på en socket og deler månederne op i shards af hele
+blokke. Hver worker der forbinder får simuleringens opsætning én gang og
+derefter en shard ad gangen. Workeren sender kun løbende statistik og
+kvantil skitser for hver blok tilbage, plus logs for de første sample_months
+måneder. Dør en worker, eller svarer den ikke inden for lease_seconds,
+gives dens shard til en anden. Fejler simuleringen hos en worker, sendes
+tracebacken til coordinatoren, som stopper kørslen. Workers forbliver
+forbundet mellem kørsler, så cli.py kan køre flere termostater og seeds på
+de samme workers.
+
+Hver blok har sin egen strøm ud fra seed og blokkens nummer (se
+monte_carlo.chunk_seed), og coordinatoren lægger blokkene sammen i
+rækkefølge. Resultatet er derfor det samme som MonteCarlo.run_streaming med
+samme seed, uanset hvor mange workers der er, og hvem der kørte hvad.
+
+Kør fx coordinatoren med cli.py --coordinator 0.0.0.0:6000 --authkey hemmelig og
+på hver maskine:
+    python distributed.py --connect coordinator:6000 --authkey hemmelig --workers 8
+"""
+
+import argparse
+import collections
+import multiprocessing
+import os
+import queue
+import socket
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client, Listener, wait
+
+import numpy as np
+
+from kølerum import Kølerum
+from monte_carlo import MonteCarlo, room_options
+from running_stats import QuantileSketch, RunningStats
+
+
+def parse_address(text):
+    """Læser en adresse skrevet som host:port.
+
+    Examples:
+        >>> parse_address("localhost:6000")
+        ('localhost', 6000)
+    """
+    host, port = text.rsplit(":", 1)
+    return host, int(port)
+
+
+def chunk_partial(first, stop, chunk_data):
+    """Samler en bloks resultater til noget der kan lægges sammen.
+
+    Skitsen får plads til alle blokkens måneder, så den ikke komprimeres før
+    den lægges sammen hos coordinatoren. Så bliver resultatet det samme som
+    når run_streaming lægger månederne til direkte.
+
+    Args:
+        first (int): blokkens første måned
+        stop (int): måneden efter blokken
+        chunk_data (dict): blokkens data fra simulate_chunk
+
+    Returns:
+        dict: first, stop, cost_stats, electricity_stats, food_waste_stats,
+            cost_sketch og de beholdte logs
+
+    Examples:
+        >>> data = {name: [] for name in ("temperature_logs", "electricity_logs", "food_waste_logs")}
+        >>> data.update(monthly_total_costs=[3.0, 1.0], monthly_electricity_costs=[2.0, 1.0], monthly_food_waste_costs=[1.0, 0.0])
+        >>> partial = chunk_partial(0, 2, data)
+        >>> partial["cost_stats"].mean, partial["cost_sketch"].means.tolist()
+        (2.0, [1.0, 3.0])
+    """
+    partial = {"first": first, "stop": stop}
+    for stats_name, monthly_name in (
+        ("cost_stats", "monthly_total_costs"),
+        ("electricity_stats", "monthly_electricity_costs"),
+        ("food_waste_stats", "monthly_food_waste_costs"),
+    ):
+        partial[stats_name] = RunningStats()
+        partial[stats_name].add_many(chunk_data[monthly_name])
+    partial["cost_sketch"] = QuantileSketch(max(1, len(chunk_data["monthly_total_costs"])))
+    partial["cost_sketch"].add_many(chunk_data["monthly_total_costs"])
+    for name in ("temperature_logs", "electricity_logs", "food_waste_logs"):
+        partial[name] = [np.asarray(log) for log in chunk_data[name]]
+    return partial
+
+
+class Coordinator:
+    def __init__(self, address=("127.0.0.1", 0), authkey=None, shard_months=None, lease_seconds=None, max_reassigned=3):
+        """Deler MonteCarlo kørsler ud til workers over en socket.
+
+        Workers forbliver forbundet mellem kørsler, så flere kørsler i træk kan
+        bruge de samme workers. De får besked om at stoppe når close kaldes.
+
+        Args:
+            address (tuple, optional): (host, port) der lyttes på. Port 0 vælger en ledig.
+                Defaults to ("127.0.0.1", 0).
+            authkey (bytes, optional): fælles nøgle workers skal kende. Defaults to en tilfældig.
+            shard_months (int, optional): måneder pr. shard, rundet op til hele blokke.
+                Defaults to én blok, dog mindst 10 måneder.
+            lease_seconds (float, optional): hvor længe en worker må bruge på en shard før
+                den regnes for død. None venter til forbindelsen lukkes. Defaults to None.
+            max_reassigned (int, optional): maks gange samme shard gives til en ny worker
+                før kørslen fejler. Defaults to 3.
+        """
+        self.authkey = authkey if authkey is not None else os.urandom(16)  # Fælles nøgle
+        self.listener = Listener(address, authkey=self.authkey)  # Socket workers forbinder til
+        self.address = self.listener.address  # Den faktiske adresse, også når port var 0
+        self.shard_months = shard_months  # Ønskede måneder pr. shard
+        self.lease_seconds = lease_seconds  # Tid før en shard gives til en anden
+        self.max_reassigned = max_reassigned  # Maks nye forsøg pr. shard
+        self.reassigned = 0  # Antal shards der er givet til en anden worker i sidste kørsel
+        self._workers = []  # Forbindelser der venter på næste kørsel
+        self._connections = queue.Queue()  # Nye forbindelser fra accept tråden
+        self._closing = threading.Event()  # Sat når accept tråden skal stoppe
+        self._accept_thread = threading.Thread(target=self._accept, daemon=True)
+        self._accept_thread.start()
+
+    def _accept(self):
+        """Tager imod workers i en tråd, så run ikke blokerer på accept."""
+        while not self._closing.is_set():
+            try:
+                connection = self.listener.accept()
+            except Exception:  # En forbindelse med forkert authkey afvises bare
+                continue
+            if self._closing.is_set():
+                connection.close()
+                return
+            self._connections.put(connection)
+
+    def close(self):
+        """Beder workers om at stoppe, stopper accept tråden og lukker socketten.
+
+        Tråden vækkes med en tom forbindelse, så den ikke sidder i accept på en
+        fil descriptor som en ny Listener kan genbruge.
+        """
+        self._closing.set()
+        try:
+            socket.create_connection(self.address, timeout=1).close()
+        except OSError:
+            pass
+        self._accept_thread.join(timeout=5)
+        self.listener.close()
+        while not self._connections.empty():
+            self._workers.append(self._connections.get_nowait())
+        for connection in self._workers:
+            try:
+                connection.send({"kind": "stop"})
+            except OSError:
+                pass
+            connection.close()
+        self._workers = []
+
+    def run(self, monte_carlo, months, sample_months=1, sketch_capacity=200, timeout=None, processes=None):
+        """Kører months måneder af en kørsel på de workers der er forbundet eller forbinder.
+
+        Args:
+            monte_carlo (MonteCarlo): kørslen. Termostat, elpriser, motor, blokstørrelse,
+                dørmetode og seed sendes til hver worker.
+            months (int): antal måneder
+            sample_months (int, optional): måneder hvis fulde logs returneres. Defaults to 1.
+            sketch_capacity (int, optional): centroider i kvantil skitsen. Defaults to 200.
+            timeout (float, optional): maks sekunder uden fremskridt, fx hvis ingen worker
+                forbinder. None venter for evigt. Defaults to None.
+            processes (list, optional): lokale worker processer. Er de alle stoppet og er
+                ingen worker forbundet, fejler kørslen i stedet for at vente. Defaults to None.
+
+        Raises:
+            TimeoutError: If no shard finishes within timeout.
+            RuntimeError: If a worker fails. The message has the worker's traceback.
+            RuntimeError: If a shard is reassigned more than max_reassigned times.
+            RuntimeError: If every local worker process has exited.
+
+        Returns:
+            dict: samme som MonteCarlo.run_streaming plus workers og reassigned
+        """
+        seed = monte_carlo.seed if monte_carlo.seed is not None else np.random.SeedSequence().entropy
+        template = monte_carlo.kølerum_template
+        setup = {
+            "thermostat": template.termostat,
+            "energy_prices": np.asarray(template.energy_prices),
+            "room": room_options(template),
+            "engine": monte_carlo.engine,
+            "batch_size": monte_carlo.batch_size,
+            "door_method": monte_carlo.door_method,
+            "seed": seed,
+            "sample_months": sample_months,
+        }
+        chunk = monte_carlo.chunk_size()
+        shard_months = self.shard_months if self.shard_months is not None else max(chunk, 10)
+        shard_months = max(chunk, -(-shard_months // chunk) * chunk)  # Hele blokke pr. shard
+        pending = collections.deque(
+            (first, min(first + shard_months, months)) for first in range(0, months, shard_months)
+        )
+        shards = len(pending)
+        attempts = collections.Counter()  # Gange hver shard er givet til en ny worker
+        partials = {}  # Færdige shards efter første måned
+        active = {}  # Forbindelse -> (shard, tidspunkt den blev sendt)
+        idle = []  # Forbindelser der venter på en shard
+        joining = self._workers  # Forbindelser fra tidligere kørsler får også opsætningen
+        self._workers = []
+        self.reassigned = 0
+        workers = 0
+        last_progress = time.monotonic()
+
+        def assign(connection):
+            if not pending:
+                idle.append(connection)
+                return
+            shard = pending.popleft()
+            try:
+                connection.send({"kind": "shard", "first": shard[0], "stop": shard[1]})
+            except OSError:
+                pending.appendleft(shard)
+                connection.close()
+                return
+            active[connection] = (shard, time.monotonic())
+
+        def drop(connection):
+            """Lukker en død worker og giver dens shard til en anden."""
+            if connection in active:
+                shard = active.pop(connection)[0]
+                attempts[shard] += 1
+                if attempts[shard] > self.max_reassigned:
+                    raise RuntimeError(f"Months {shard[0]} to {shard[1]} were reassigned more than {self.max_reassigned} times.")
+                pending.appendleft(shard)
+                self.reassigned += 1
+            connection.close()
+
+        try:
+            while len(partials) < shards:
+                while True:
+                    try:
+                        joining.append(self._connections.get_nowait())
+                    except queue.Empty:
+                        break
+                for connection in joining:
+                    try:
+                        connection.send({"kind": "setup", **setup})
+                    except OSError:
+                        connection.close()
+                        continue
+                    workers += 1
+                    assign(connection)
+                joining = []
+                while idle and pending:
+                    assign(idle.pop())
+
+                for connection in wait(list(active), timeout=0.1):
+                    try:
+                        message = connection.recv()
+                    except (EOFError, OSError):
+                        drop(connection)
+                        continue
+                    if message["kind"] == "error":
+                        raise RuntimeError(f"A worker failed:\n{message['traceback']}")
+                    shard, _ = active.pop(connection)
+                    partials[shard[0]] = message["partials"]
+                    done = sum(partial["stop"] - partial["first"] for shard_partials in partials.values() for partial in shard_partials)
+                    monte_carlo._update_progress(done, months)
+                    last_progress = time.monotonic()
+                    assign(connection)
+
+                now = time.monotonic()
+                if self.lease_seconds is not None:
+                    for connection, (_, sent) in list(active.items()):
+                        if now - sent > self.lease_seconds:
+                            drop(connection)
+                if (
+                    processes
+                    and pending
+                    and not active
+                    and self._connections.empty()
+                    and not any(process.is_alive() for process in processes)
+                ):
+                    raise RuntimeError("Every local worker has exited before the run finished.")
+                if timeout is not None and now - last_progress > timeout:
+                    raise TimeoutError("No shard finished within the timeout.")
+        except BaseException:
+            # Workers midt i en shard ville sende et svar til næste kørsel, så de lukkes
+            for connection in active:
+                connection.close()
+            self._workers = idle
+            raise
+        self._workers = idle
+
+        # Blokkene lægges sammen i rækkefølge som i run_streaming
+        results = monte_carlo._new_stream(sketch_capacity)
+        for first in sorted(partials):
+            for partial in partials[first]:
+                for name in ("cost_stats", "electricity_stats", "food_waste_stats", "cost_sketch"):
+                    results[name].merge(partial[name])
+                for name in ("temperature_logs", "electricity_logs", "food_waste_logs"):
+                    results[name].extend(partial[name])
+        results["workers"] = workers
+        results["reassigned"] = self.reassigned
+        return results
+
+
+def run_worker(address, authkey, workers=1, max_shards=None):
+    """Forbinder til en coordinator og kører shards indtil den siger stop.
+
+    Fejler en shard sendes tracebacken til coordinatoren, som stopper kørslen.
+
+    Args:
+        address (tuple): coordinatorens (host, port)
+        authkey (bytes): den fælles nøgle
+        workers (int, optional): processer på denne maskine. Defaults to 1.
+        max_shards (int, optional): stop uden at sige farvel efter så mange shards,
+            som om workeren døde. Bruges til at teste coordinatoren. Defaults to None.
+
+    Returns:
+        int: antal shards der blev kørt
+    """
+    connection = Client(address, authkey=authkey)
+    monte_carlo = None
+    shards = 0
+    try:
+        while True:
+            try:
+                message = connection.recv()
+            except (EOFError, OSError):
+                return shards
+            if message["kind"] == "stop":
+                return shards
+            if max_shards is not None and shards >= max_shards and message["kind"] == "shard":
+                return shards
+            try:
+                if message["kind"] == "setup":
+                    # En ny kørsel, evt. med en anden termostat end den forrige
+                    setup = message
+                    monte_carlo = None
+                    kølerum = Kølerum(setup["thermostat"], setup["energy_prices"], **setup["room"])
+                    monte_carlo = MonteCarlo(
+                        kølerum,
+                        engine=setup["engine"],
+                        batch_size=setup["batch_size"],
+                        seed=setup["seed"],
+                        workers=workers,
+                        door_method=setup["door_method"],
+                    )
+                    continue
+                if monte_carlo is None:
+                    raise RuntimeError("The worker got a shard without a working setup.")
+                partials = [
+                    chunk_partial(first, stop, chunk_data)
+                    for first, stop, chunk_data in monte_carlo._iter_chunks(
+                        message["stop"], setup["sample_months"], start=message["first"], seed=setup["seed"]
+                    )
+                ]
+            except Exception:
+                connection.send({"kind": "error", "traceback": traceback.format_exc()})
+                continue
+            connection.send({"kind": "result", "partials": partials})
+            shards += 1
+    finally:
+        connection.close()
+
+
+def start_local_workers(address, authkey, count, max_shards=None):
+    """Starter workers som processer på denne maskine.
+
+    Args:
+        address (tuple): coordinatorens (host, port)
+        authkey (bytes): den fælles nøgle
+        count (int): antal workers
+        max_shards (list, optional): max_shards for hver worker, se run_worker. Defaults to None.
+
+    Returns:
+        list: de startede multiprocessing.Process
+    """
+    processes = []
+    for index in range(count):
+        limit = None if max_shards is None else max_shards[index]
+        process = multiprocessing.Process(target=run_worker, args=(address, authkey, 1, limit), daemon=True)
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def run_distributed(monte_carlo, months, local_workers=2, sample_months=1, sketch_capacity=200, address=("127.0.0.1", 0), authkey=None, timeout=None, **options):
+    """Kører months måneder med en coordinator og local_workers lokale workers.
+
+    Andre workers kan også forbinde til coordinatorens adresse undervejs.
+
+    Args:
+        monte_carlo (MonteCarlo): kørslen
+        months (int): antal måneder
+        local_workers (int, optional): workers der startes på denne maskine. Defaults to 2.
+        sample_months (int, optional): måneder hvis fulde logs returneres. Defaults to 1.
+        sketch_capacity (int, optional): centroider i kvantil skitsen. Defaults to 200.
+        address (tuple, optional): se Coordinator. Defaults to ("127.0.0.1", 0).
+        authkey (bytes, optional): se Coordinator. Defaults to en tilfældig.
+        timeout (float, optional): se Coordinator.run. Defaults to None.
+        **options: shard_months, lease_seconds og max_reassigned til Coordinator
+
+    Returns:
+        dict: se Coordinator.run
+    """
+    coordinator = Coordinator(address, authkey, **options)
+    processes = start_local_workers(coordinator.address, coordinator.authkey, local_workers)
+    try:
+        return coordinator.run(monte_carlo, months, sample_months, sketch_capacity, timeout, processes)
+    finally:
+        coordinator.close()
+        for process in processes:
+            process.join(timeout=5)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kør en worker til en distribueret Monte Carlo kørsel")
+    parser.add_argument("--connect", required=True, help="coordinatorens host:port")
+    parser.add_argument("--authkey", required=True, help="den fælles nøgle")
+    parser.add_argument("--workers", type=int, default=1, help="processer på denne maskine")
+    args = parser.parse_args()
+    print(f"{run_worker(parse_address(args.connect), args.authkey.encode(), args.workers)} shards kørt")
@@ -0,0 +1,179 @@
+"""Dette modul laver dørens åbninger for hele måneder på forhånd.
+
+Åbningerne gemmes som en pakket bitmaske med én række pr. måned, så samme
+dørmønster kan afspilles igen under forskellige termostater.
+"""
+
+import numpy as np
+
+from kølerum import STEPS
+
+DOOR_PROBABILITY = 0.1  # Chance for at døren er åben i et step
+METHODS = ("bernoulli", "geometric")
+
+
+class DoorSchedule:
+    def __init__(self, bits, steps=STEPS):
+        """Dørens åbninger som en pakket bitmaske.
+
+        Args:
+            bits (np.ndarray): uint8 array af formen (months, ceil(steps / 8)) fra np.packbits
+            steps (int, optional): antal steps i en måned. Defaults to STEPS.
+
+        Examples:
+            >>> opened = np.zeros((2, 10), dtype=bool)
+            >>> opened[0, [1, 9]] = True
+            >>> schedule = DoorSchedule.from_bool(opened)
+            >>> len(schedule), schedule.month(0).nonzero()[0].tolist()
+            (2, [1, 9])
+            >>> schedule.step(9).tolist(), schedule.open_counts().tolist()
+            ([True, False], [2, 0])
+        """
+        self.bits = bits  # Pakket bitmaske
+        self.steps = steps  # Steps pr. måned
+
+    @classmethod
+    def from_bool(cls, opened):
+        """Pakker en bool matrix af formen (months, steps).
+
+        Args:
+            opened (np.ndarray): True hvor døren er åben
+
+        Returns:
+            DoorSchedule: det pakkede skema
+        """
+        opened = np.atleast_2d(np.asarray(opened, dtype=bool))
+        return cls(np.packbits(opened, axis=1), opened.shape[1])
+
+    @classmethod
+    def generate(cls, months, rng=None, steps=STEPS, percentage=DOOR_PROBABILITY, method="geometric", antithetic=False):
+        """Trækker dørens åbninger for et antal måneder.
+
+        "bernoulli" trækker en uniform værdi pr. step ligesom Kølerum.decide_door.
+        "geometric" trækker kun afstanden mellem åbningerne, hvilket er omkring
+        1/percentage gange færre tilfældige tal og giver samme fordeling.
+
+        Med antithetic=True (kun "bernoulli") bruger måned 2k+1 de spejlede
+        uniforme værdier 1 - u fra måned 2k, så parrene er negativt korrelerede.
+
+        Args:
+            months (int): antal måneder
+            rng (np.random.Generator, optional): tilfældighedsgenerator. Defaults to None.
+            steps (int, optional): steps pr. måned. Defaults to STEPS.
+            percentage (float, optional): chance for åben dør i et step. Defaults to DOOR_PROBABILITY.
+            method (str, optional): "bernoulli" eller "geometric". Defaults to "geometric".
+            antithetic (bool, optional): træk måneder i antitetiske par. Defaults to False.
+
+        Raises:
+            ValueError: If method is not 'bernoulli' or 'geometric'.
+            ValueError: If antithetic is used with the geometric method.
+
+        Returns:
+            DoorSchedule: skemaet for alle månederne
+
+        Examples:
+            >>> rng = np.random.default_rng(0)
+            >>> schedule = DoorSchedule.generate(200, rng)
+            >>> bool(abs(schedule.open_counts().mean() / STEPS - 0.1) < 0.005)
+            True
+            >>> DoorSchedule.generate(3, rng, percentage=1.0).open_counts().tolist()
+            [8640, 8640, 8640]
+            >>> pair = DoorSchedule.generate(2, rng, method="bernoulli", antithetic=True)
+            >>> bool((pair.month(0) & pair.month(1)).any())
+            False
+        """
+        if method not in METHODS:
+            raise ValueError("Invalid method. Use 'bernoulli' or 'geometric'.")
+        rng = rng if rng is not None else np.random.default_rng()
+        if antithetic:
+            if method != "bernoulli":
+                raise ValueError("Antithetic door draws need the 'bernoulli' method.")
+            uniforms = rng.random(((months + 1) // 2, steps))
+            opened = np.empty((2 * uniforms.shape[0], steps), dtype=bool)
+            opened[0::2] = uniforms <= percentage
+            opened[1::2] = (1 - uniforms) <= percentage
+            return cls.from_bool(opened[:months])
+        if method == "bernoulli" or percentage >= 1 or percentage <= 0:
+            return cls.from_bool(rng.random((months, steps)) <= percentage)
+
+        opened = np.zeros((months, steps), dtype=bool)
+        # Nok afstande til at dække måneden for næsten alle måneder i første træk
+        expected = steps * percentage
+        draws = int(expected + 6 * np.sqrt(expected) + 16)
+        rows = np.arange(months)
+        position = np.full(months, -1, dtype=np.int64)
+        while rows.size:
+            gaps = rng.geometric(percentage, size=(rows.size, draws))
+            events = position[rows, None] + np.cumsum(gaps, axis=1)
+            inside = events < steps
+            row_index = np.broadcast_to(rows[:, None], events.shape)
+            opened[row_index[inside], events[inside]] = True
+            # Måneder hvor sidste åbning stadig er inden for måneden trækker videre
+            position[rows] = events[:, -1]
+            rows = rows[events[:, -1] < steps - 1]
+        return cls.from_bool(opened)
+
+    def __len__(self):
+        return self.bits.shape[0]
+
+    def __getitem__(self, months):
+        """Giver et skema for et udsnit af månederne.
+
+        Args:
+            months (slice): månederne
+
+        Returns:
+            DoorSchedule: skemaet for udsnittet
+        """
+        return DoorSchedule(self.bits[months], self.steps)
+
+    def month(self, month):
+        """Dørens tilstand for hvert step i en måned.
+
+        Args:
+            month (int): måneden
+
+        Returns:
+            np.ndarray: bool array af længde steps
+        """
+        return np.unpackbits(self.bits[month], count=self.steps).astype(bool)
+
+    def step(self, n):
+        """Dørens tilstand i step n for alle måneder.
+
+        Args:
+            n (int): step
+
+        Returns:
+            np.ndarray: bool array af længde months
+        """
+        return (self.bits[:, n >> 3] & (0x80 >> (n & 7))) != 0
+
+    def event_indices(self, month):
+        """Steps hvor døren er åben i en måned.
+
+        Args:
+            month (int): måneden
+
+        Returns:
+            np.ndarray: indekser for åbningerne
+        """
+        return np.flatnonzero(self.month(month))
+
+    def open_counts(self):
+        """Antal åbninger i hver måned.
+
+        Returns:
+            np.ndarray: antal åbninger pr. måned
+        """
+        counts = np.unpackbits(self.bits, axis=1, count=self.steps).sum(axis=1)
+        return counts.astype(np.int64)
+
+
+if __name__ == "__main__":
+    """Viser hvor mange gange døren åbnes og kører doctest"""
+    import doctest
+
+    schedule = DoorSchedule.generate(10, np.random.default_rng(1))
+    print(schedule.open_counts())
+    print(doctest.testmod())
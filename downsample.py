@@ -0,0 +1,77 @@
+"""Dette modul skærer lange tidsserier ned til det antal punkter der kan ses.
+
+Largest-Triangle-Three-Buckets (LTTB) deler serien op i spande og vælger i
+hver spand det punkt der danner den største trekant med det forrige valgte
+punkt og gennemsnittet af næste spand. Toppe og dale bevares derfor, selvom
+der kun tegnes omkring ét punkt pr. pixel.
+"""
+
+import numpy as np
+
+
+def lttb_indices(x, y, threshold):
+    """Finder indekserne LTTB beholder.
+
+    Args:
+        x (np.ndarray): x værdier, stigende
+        y (np.ndarray): y værdier
+        threshold (int): antal punkter der skal beholdes
+
+    Returns:
+        np.ndarray: indekser i stigende rækkefølge, altid med første og sidste punkt
+
+    Examples:
+        >>> x = np.arange(10.0)
+        >>> y = np.array([0, 0, 0, 9, 0, 0, 0, 0, -9, 0.0])
+        >>> lttb_indices(x, y, 4).tolist()
+        [0, 3, 8, 9]
+        >>> lttb_indices(x, y, 20).size
+        10
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = x.size
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Punkterne mellem første og sidste fordeles i threshold - 2 spande
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < edges.size:
+            next_x = x[stop:edges[bucket + 2]].mean()
+            next_y = y[stop:edges[bucket + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        # Dobbelt areal af trekanten (a, punkt, næste spands gennemsnit)
+        area = np.abs(
+            (x[a] - next_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (next_y - y[a])
+        )
+        a = start + int(area.argmax())
+        selected[bucket + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def lttb(x, y, threshold):
+    """Skærer en serie ned til threshold punkter med LTTB.
+
+    Args:
+        x (np.ndarray): x værdier, stigende
+        y (np.ndarray): y værdier
+        threshold (int): antal punkter der skal beholdes
+
+    Returns:
+        tuple: (x, y) for de beholdte punkter
+
+    Examples:
+        >>> x = np.linspace(0, 1, 8640)
+        >>> small_x, small_y = lttb(x, np.sin(40 * x), 500)
+        >>> small_x.size, bool(small_y.max() > 0.999)
+        (500, True)
+    """
+    indices = lttb_indices(x, y, threshold)
+    return np.asarray(x)[indices], np.asarray(y)[indices]
@@ -0,0 +1,440 @@
+"""Dette modul simulerer en hel flåde af kølerum med hver deres parametre.
+
+Hvert rum har sin egen rumtemperatur, kompressor, isolering, dørtrafik og
+termostat, men alle ser de samme elpriser. Alle rum og måneder køres
+samtidig som rækker i arrays (rum x måneder), så tusindvis af rum ikke
+kræver tusindvis af Python objekter. Rummene sorteres efter termostat, så
+hver termostattype kaldes én gang pr. step på et sammenhængende udsnit.
+"""
+
+import inspect
+import math
+
+import numpy as np
+import pandas as pd
+
+from batch_kølerum import BatchKølerum
+from door_schedule import DOOR_PROBABILITY
+from kølerum import DELTA_T, STEPS
+from optimal_policy import MODEL, POINTS, grid_index, load_policy
+from price_series import as_price_array
+from termostat import THERMOSTATS, ThermostatOptimal
+
+# Rummets parametre og deres værdier i Kølerum
+ROOM_PARAMETERS = {
+    "t_rum": 20.0,  # Rumtemperatur
+    "t_komp": -5.0,  # Kompressorens køletemperatur
+    "t_start": 5.0,  # Starttemperatur
+    "c_door_open": 3e-5,  # Varmeudveksling med åben dør
+    "c_door_closed": 5e-7,  # Varmeudveksling med lukket dør (isolering)
+    "c_compressor": 8e-6,  # Kompressorens køleevne
+    "door_probability": DOOR_PROBABILITY,  # Chance for åben dør i et step
+    "power": 1.0,  # Elforbrug i forhold til Kølerum når kompressoren kører
+}
+
+MAX_POLICIES = 8  # Højst så mange løste tabeller til de optimale termostater i en flåde
+
+# Termostatparametre der kan gives pr. rum, efter termostatens navn i THERMOSTATS.
+# Termostatet læser dem som arrays med én værdi pr. række i update_compressor_batch.
+ROW_PARAMETERS = {
+    "simple": ("t_target",),
+    "semismart": ("t_target",),
+    "smart": ("t_target_low", "t_target_high", "threshold_price", "cutoff_step"),
+    "optimal": (),
+}
+
+
+class ThermostatGroups:
+    def __init__(self, groups):
+        """Flere termostater der hver styrer et sammenhængende udsnit af rækkerne.
+
+        Args:
+            groups (list): tuples af (slice, Thermostat) der tilsammen dækker alle rækker
+        """
+        self.groups = groups  # Udsnit og termostat
+
+    def update_compressor_batch(self, t_current, n):
+        """Spørger hver termostat for sit udsnit.
+
+        Args:
+            t_current (np.ndarray): temperaturer for alle rækker
+            n (int): iteration
+
+        Returns:
+            np.ndarray: True hvor kompressoren skal tændes
+        """
+        if len(self.groups) == 1:
+            return self.groups[0][1].update_compressor_batch(t_current, n)
+        compressor_on = np.empty(t_current.shape, dtype=bool)
+        for rows, thermostat in self.groups:
+            compressor_on[rows] = thermostat.update_compressor_batch(t_current[rows], n)
+        return compressor_on
+
+
+class PolicyStack:
+    def __init__(self, policies, policy_index):
+        """De optimale termostaters tabeller stablet, så alle rækker slås op på én gang.
+
+        Args:
+            policies (np.ndarray): tabellerne af formen (steps, policies, points)
+            policy_index (np.ndarray): tabellen for hver række
+
+        Examples:
+            >>> policies = np.zeros((2, 2, POINTS), dtype=bool)
+            >>> policies[0, 1] = True
+            >>> PolicyStack(policies, np.array([0, 1, 1])).update_compressor_batch(np.array([5.0, 5.0, 5.0]), 0)
+            array([False,  True,  True])
+        """
+        self.policies = policies  # Tabellerne, step først så et step ligger samlet
+        self.policy_index = policy_index  # Tabel pr. række
+
+    def update_compressor_batch(self, t_current, n):
+        """Slår op i hver rækkes tabel ved det nærmeste gitterpunkt.
+
+        Args:
+            t_current (np.ndarray): temperaturer for rækkerne
+            n (int): iteration
+
+        Returns:
+            np.ndarray: True hvor kompressoren skal tændes
+        """
+        return self.policies[n][self.policy_index, grid_index(t_current, self.policies.shape[2])]
+
+
+def group_models(values, max_policies=MAX_POLICIES):
+    """Deler rummene i højst max_policies grupper med næsten samme model.
+
+    Har rummene højst max_policies forskellige modeller, får hver model sin
+    egen gruppe. Ellers deles hver parameter i lige store intervaller mellem
+    rummenes mindste og største værdi, med færre intervaller indtil der er
+    højst max_policies grupper. En gruppes model er gennemsnittet af dens rum.
+
+    Args:
+        values (np.ndarray): rummenes modelparametre af formen (rooms, parameters)
+        max_policies (int, optional): højeste antal grupper. Defaults to MAX_POLICIES.
+
+    Raises:
+        ValueError: If max_policies is less than 1.
+
+    Returns:
+        tuple: gruppen for hvert rum og gruppernes modeller af formen (groups, parameters)
+
+    Examples:
+        >>> values = np.column_stack([np.linspace(15, 25, 20), np.ones(20)])
+        >>> labels, models = group_models(values, 4)
+        >>> labels.tolist()
+        [0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3]
+        >>> models.round(2).tolist()
+        [[16.05, 1.0], [18.68, 1.0], [21.32, 1.0], [23.95, 1.0]]
+        >>> group_models(values[[0, 5, 0]], 4)[0].tolist()
+        [0, 1, 0]
+    """
+    if max_policies < 1:
+        raise ValueError("max_policies must be at least 1.")
+    models, labels = np.unique(values, axis=0, return_inverse=True)
+    if len(models) <= max_policies:
+        return labels.ravel(), models
+    low, high = values.min(axis=0), values.max(axis=0)
+    span = np.where(high > low, high - low, 1.0)
+    for levels in range(max_policies, 0, -1):
+        # Intervallet hver parameter falder i, med den største værdi i det sidste
+        bins = np.minimum(((values - low) / span * levels).astype(np.intp), levels - 1)
+        keys, labels = np.unique(bins, axis=0, return_inverse=True)
+        if len(keys) <= max_policies:
+            break
+    labels = labels.ravel()
+    models = np.array([values[labels == group].mean(axis=0) for group in range(len(keys))])
+    return labels, models
+
+
+class FleetKølerum(BatchKølerum):
+    def __init__(self, thermostat, energy_prices, parameters, rng=None, record_logs=False, **room):
+        """BatchKølerum hvor rummets konstanter er arrays med én værdi pr. række.
+
+        Args:
+            thermostat (ThermostatGroups): termostaterne for rækkerne
+            energy_prices (PriceSeries): elpriserne
+            parameters (dict): ROOM_PARAMETERS som arrays med én værdi pr. række
+            rng (np.random.Generator, optional): tilfældighedsgenerator til døren. Defaults to None.
+            record_logs (bool, optional): se BatchKølerum. Defaults to False.
+            **room: steps, delta_t og ambient, se BatchKølerum. Med ambient bruges den
+                fælles rumtemperatur i stedet for rummenes t_rum.
+
+        Examples:
+            >>> params = {name: np.full(2, value) for name, value in ROOM_PARAMETERS.items()}
+            >>> params["door_probability"] = np.array([1.0, 0.0])
+            >>> k = FleetKølerum(None, [], params)
+            >>> k.decide_door().tolist()
+            [True, False]
+            >>> [c.tolist() for c in k.decide_constants(k.decide_door(), np.array([True, False]))]
+            [[3e-05, 5e-07], [8e-06, 0.0]]
+        """
+        rows = len(parameters["t_rum"])
+        super().__init__(thermostat, energy_prices, rows, rng=rng, record_logs=record_logs, **room)
+        self.t_rum = parameters["t_rum"]  # Rumtemperatur pr. række
+        self.t_komp = parameters["t_komp"]  # Køletemperatur pr. række
+        self.t_current = np.array(parameters["t_start"], dtype=float)  # Starttemperatur pr. række
+        self.c_door_open = parameters["c_door_open"]  # Konstant for åben dør pr. række
+        self.c_door_closed = parameters["c_door_closed"]  # Konstant for lukket dør pr. række
+        self.c_compressor = parameters["c_compressor"]  # Kompressorens konstant pr. række
+        self.door_probability = parameters["door_probability"]  # Dørtrafik pr. række
+        self.power = parameters["power"]  # Elforbrug pr. række
+
+    def decide_constants(self, door, compressor):
+        """Som BatchKølerum, men med rummets egne konstanter."""
+        c_1 = np.where(door, self.c_door_open, self.c_door_closed)  # Åben/lukket dør
+        c_2 = np.where(compressor, self.c_compressor, 0.0)  # Kompr tændt/slukket
+        return c_1, c_2
+
+    def decide_door(self, percentage=None):
+        """Trækker døren for hver række med rummets egen sandsynlighed."""
+        probability = self.door_probability if percentage is None else percentage
+        return self.rng.random(self.months) <= probability
+
+    def calculate_electricity_price(self):
+        """Som BatchKølerum, men ganget med rummets elforbrug."""
+        cost = np.where(self.compressor_on, self.energy_prices[self.n] * (self.power * self.delta_t / DELTA_T), 0.0)
+        self.electricity_total += cost
+        if self.record_logs:
+            self.electricity_cost[:, self.n] = cost[:self.record_logs]
+
+
+class Fleet:
+    def __init__(self, rooms, energy_prices, steps=STEPS, delta_t=DELTA_T, ambient=None,
+                 max_policies=MAX_POLICIES, cache_dir=".cache/policies"):
+        """En flåde af kølerum beskrevet som en tabel med ét rum pr. række.
+
+        Kolonnen "thermostat" er en nøgle i termostat.THERMOSTATS. Andre kolonner
+        er enten rumparametre fra ROOM_PARAMETERS eller parametre til rummets
+        termostat fra ROW_PARAMETERS. Manglende kolonner og tomme felter får
+        standardværdien.
+        Kolonnen "name" bruges som navn, ellers bruges rækkens nummer.
+
+        Args:
+            rooms (pd.DataFrame): tabellen, eller en liste af dicts
+            energy_prices (PriceSeries): de fælles elpriser, én pr. step
+            steps (int, optional): steps i hver simulering. Defaults to STEPS.
+            delta_t (float, optional): sekunder pr. step. Defaults to DELTA_T.
+            ambient (PriceSeries, optional): fælles rumtemperatur pr. step i stedet for
+                kolonnen t_rum. Defaults to None.
+            max_policies (int, optional): højeste antal tabeller der løses til de optimale
+                termostater. Rum med næsten samme model deler tabel, se group_models.
+                Defaults to MAX_POLICIES.
+            cache_dir (str, optional): mappe til tabellerne, se ThermostatOptimal.
+                Defaults to ".cache/policies".
+
+        Raises:
+            ValueError: If a thermostat is unknown.
+            ValueError: If a column is not a room or thermostat parameter.
+            ValueError: If a room sets a parameter its thermostat does not read.
+            ValueError: If an optimal thermostat is combined with an ambient series.
+
+        Examples:
+            >>> Fleet([{"thermostat": "optimal", "cache_dir": "policies"}], np.ones(10))
+            Traceback (most recent call last):
+            ...
+            ValueError: Unknown room columns ['cache_dir'].
+            >>> Fleet([{"thermostat": "smart", "t_target": 4.0}], np.ones(10))
+            Traceback (most recent call last):
+            ...
+            ValueError: The thermostats ['smart'] do not take the column t_target.
+            >>> len(Fleet([{"thermostat": "smart"}, {"thermostat": "simple", "t_target": 4.0}], np.ones(10)).rooms)
+            2
+        """
+        self.rooms = pd.DataFrame(rooms).reset_index(drop=True)  # Rummene
+        if "thermostat" not in self.rooms:
+            self.rooms["thermostat"] = "simple"
+        if "name" not in self.rooms:
+            self.rooms["name"] = self.rooms.index.astype(str)
+        unknown = set(self.rooms["thermostat"]) - set(THERMOSTATS)
+        if unknown:
+            raise ValueError(f"Unknown thermostat {sorted(unknown)}. Use one of {sorted(THERMOSTATS)}.")
+        thermostat_parameters = {name for names in ROW_PARAMETERS.values() for name in names}
+        columns = set(self.rooms) - {"name", "thermostat"} - set(ROOM_PARAMETERS) - thermostat_parameters
+        if columns:
+            raise ValueError(f"Unknown room columns {sorted(columns)}.")
+        for name in sorted(thermostat_parameters & set(self.rooms)):
+            # Et felt for et termostat der ikke læser parameteren ville blive ignoreret
+            reads = self.rooms["thermostat"].map(lambda kind: name in ROW_PARAMETERS.get(kind, ()))
+            ignored = self.rooms[name].notna() & ~reads
+            if ignored.any():
+                kinds = sorted(set(self.rooms["thermostat"][ignored]))
+                raise ValueError(f"The thermostats {kinds} do not take the column {name}.")
+        if ambient is not None and (self.rooms["thermostat"] == "optimal").any():
+            raise ValueError("The optimal thermostat needs a constant t_rum, not an ambient series.")
+        self.energy_prices = as_price_array(energy_prices)  # Fælles elpriser
+        self.room = {"steps": steps, "delta_t": delta_t, "ambient": ambient}  # Horisont og tidsskridt
+        self.max_policies = max_policies  # Højst så mange optimale tabeller
+        self.cache_dir = cache_dir  # Mappe til de optimale tabeller
+        # Rummene ordnet efter termostat, så hver termostat har et sammenhængende udsnit
+        self.order = np.argsort(self.rooms["thermostat"].to_numpy(), kind="stable")
+
+    def run(self, months=12, seed=None, block_rows=200_000):
+        """Simulerer alle rum i months måneder.
+
+        Rækkerne er (rum, måned) par. De køres i blokke af hele rum med højst
+        block_rows rækker, og hver blok får sin egen strøm fra seed.
+
+        Args:
+            months (int, optional): måneder pr. rum. Defaults to 12.
+            seed (int, optional): seed for dørene. Defaults to None.
+            block_rows (int, optional): maks rækker i én FleetKølerum. Defaults to 200000.
+
+        Returns:
+            dict: rooms (DataFrame med statistik pr. rum), fleet (statistik for flådens
+                samlede pris pr. måned) og monthly_costs (array af formen (rooms, months))
+
+        Examples:
+            >>> rooms = [{"thermostat": "simple"}, {"thermostat": "smart", "t_rum": 25, "power": 2}]
+            >>> result = Fleet(rooms, np.full(8641, 1.5)).run(months=3, seed=1)
+            >>> result["monthly_costs"].shape, result["rooms"]["months"].tolist()
+            ((2, 3), [3, 3])
+            >>> bool(result["rooms"]["mean_cost"][1] > result["rooms"]["mean_cost"][0])
+            True
+        """
+        room_count = len(self.rooms)
+        rooms_per_block = max(1, block_rows // months)
+        electricity = np.empty((room_count, months))
+        food_waste = np.empty((room_count, months))
+        policies = self._optimal_policies()
+        for block, first in enumerate(range(0, room_count, rooms_per_block)):
+            room_index = self.order[first:first + rooms_per_block]
+            kølerum = FleetKølerum(
+                self._thermostats(room_index, months, policies),
+                self.energy_prices,
+                self._parameters(room_index, months),
+                rng=np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(block,))),
+                **self.room,
+            )
+            data = kølerum.run_simulation()
+            electricity[room_index] = data["electricity_total"].reshape(-1, months)
+            food_waste[room_index] = data["food_waste_total"].reshape(-1, months)
+        return self._summarize(electricity, food_waste)
+
+    def _column(self, name, default, room_index):
+        """En kolonne for rummene, med default hvor den mangler."""
+        if name not in self.rooms:
+            return np.full(room_index.size, default, dtype=float)
+        values = pd.to_numeric(self.rooms[name].iloc[room_index], errors="coerce").to_numpy(dtype=float)
+        return np.where(np.isnan(values), default, values)
+
+    def _parameters(self, room_index, months):
+        """Rumparametrene gentaget for hver måned."""
+        return {
+            name: np.repeat(self._column(name, default, room_index), months)
+            for name, default in ROOM_PARAMETERS.items()
+        }
+
+    def _thermostats(self, room_index, months, policies=None):
+        """En termostat pr. termostattype med array parametre for dens rækker.
+
+        De optimale rum deler én PolicyStack med policies fra _optimal_policies.
+        """
+        kinds = self.rooms["thermostat"].to_numpy()[room_index]
+        groups = []
+        start = 0
+        for kind in dict.fromkeys(kinds):
+            count = int(np.count_nonzero(kinds == kind))
+            group_index = room_index[start:start + count]
+            thermostat_class = THERMOSTATS[kind]
+            rows = slice(start * months, (start + count) * months)
+            start += count
+            if thermostat_class is ThermostatOptimal:
+                tables, room_policy = policies
+                groups.append((rows, PolicyStack(tables, np.repeat(room_policy[group_index], months))))
+                continue
+            defaults = inspect.signature(thermostat_class).parameters
+            params = {
+                name: np.repeat(self._column(name, defaults[name].default, group_index), months)
+                for name in ROW_PARAMETERS.get(kind, ())
+                if name in self.rooms
+            }
+            groups.append((rows, thermostat_class(self.energy_prices, **params)))
+        return ThermostatGroups(groups)
+
+    def _optimal_policies(self):
+        """Løser tabellerne til de optimale termostater én gang for hele flåden.
+
+        Rummene deles i højst max_policies grupper med group_models, og hver
+        gruppes tabel løses for gruppens model, tidsskridt og horisont.
+
+        Returns:
+            tuple: tabellerne af formen (steps, policies, points) og tabellen for hvert
+                rum (-1 for andre termostater), eller None uden optimale termostater
+
+        Examples:
+            >>> rooms = [{"thermostat": "optimal", "t_rum": 15 + i / 2} for i in range(20)]
+            >>> fleet = Fleet(rooms, np.ones(30), steps=20, max_policies=3, cache_dir=None)
+            >>> tables, room_policy = fleet._optimal_policies()
+            >>> tables.shape, np.bincount(room_policy).tolist()
+            ((20, 3, 321), [7, 6, 7])
+        """
+        optimal = np.flatnonzero(self.rooms["thermostat"].to_numpy() == "optimal")
+        if optimal.size == 0:
+            return None
+        names = [name for name in MODEL if name in ROOM_PARAMETERS]
+        values = np.column_stack([self._column(name, ROOM_PARAMETERS[name], optimal) for name in names])
+        labels, models = group_models(values, self.max_policies)
+        tables = [
+            load_policy(
+                self.energy_prices,
+                dict(zip(names, model.tolist()), delta_t=self.room["delta_t"]),
+                points=POINTS,
+                steps=self.room["steps"],
+                cache_dir=self.cache_dir,
+            )
+            for model in models
+        ]
+        room_policy = np.full(len(self.rooms), -1, dtype=np.intp)
+        room_policy[optimal] = labels
+        return np.stack(tables, axis=1), room_policy
+
+    def _summarize(self, electricity, food_waste):
+        """Statistik pr. rum og for hele flåden."""
+        costs = electricity + food_waste
+        months = costs.shape[1]
+        rooms = pd.DataFrame({
+            "name": self.rooms["name"],
+            "thermostat": self.rooms["thermostat"],
+            "months": months,
+            "mean_cost": costs.mean(axis=1),
+            "std_cost": costs.std(axis=1, ddof=1) if months > 1 else math.nan,
+            "mean_electricity": electricity.mean(axis=1),
+            "mean_food_waste": food_waste.mean(axis=1),
+        })
+        fleet_costs = costs.sum(axis=0)
+        fleet = {
+            "rooms": len(rooms),
+            "months": months,
+            "mean_cost": float(fleet_costs.mean()),
+            "std_cost": float(fleet_costs.std(ddof=1)) if months > 1 else math.nan,
+            "p05_cost": float(np.quantile(fleet_costs, 0.05)),
+            "p95_cost": float(np.quantile(fleet_costs, 0.95)),
+            "mean_electricity": float(electricity.sum(axis=0).mean()),
+            "mean_food_waste": float(food_waste.sum(axis=0).mean()),
+            "by_thermostat": rooms.groupby("thermostat")["mean_cost"].sum().to_dict(),
+        }
+        return {"rooms": rooms, "fleet": fleet, "monthly_costs": costs}
+
+
+if __name__ == "__main__":
+    """Simulerer en flåde af tilfældige rum og kører doctest"""
+    import doctest
+    import time
+
+    from price_series import PriceSeries
+
+    rng = np.random.default_rng(0)
+    count = 2000
+    rooms = pd.DataFrame({
+        "thermostat": rng.choice(["simple", "semismart", "smart"], count),
+        "t_rum": rng.uniform(15, 25, count),
+        "c_door_closed": rng.uniform(3e-7, 8e-7, count),
+        "door_probability": rng.uniform(0.02, 0.2, count),
+    })
+    started = time.perf_counter()
+    result = Fleet(rooms, PriceSeries.load("elpris.csv")).run(months=10, seed=1)
+    print(result["rooms"].head())
+    print(result["fleet"])
+    print(f"{count} rum x 10 måneder på {time.perf_counter() - started:.1f} s")
+    print(doctest.testmod())
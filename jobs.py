@@ -0,0 +1,228 @@
+"""Dette modul kører en simulering i baggrunden og sender fremdrift til GUI'en.
+
+En Job kører sin funktion i en tråd og lægger beskeder i en kø, som GUI'ens
+løkke læser med poll. Tråden rører aldrig ved GUI'en selv. JobProgress ligner
+en sg.ProgressBar, så MonteCarlo kan bruge den direkte, men den sender
+fremdriften og den løbende gennemsnitspris som beskeder og stopper kørslen
+med JobCancelled når jobbet er annulleret.
+"""
+
+import math
+import queue
+import threading
+import time
+
+import numpy as np
+
+from running_stats import RunningStats
+
+
+class JobCancelled(Exception):
+    """Kastes i jobbets tråd når jobbet er annulleret."""
+
+
+class Job:
+    def __init__(self, target, *args, **kwargs):
+        """Et job der kører target(job, *args, **kwargs) i en tråd.
+
+        Beskederne er tuples af (kind, data) hvor kind er "progress", "partial",
+        "done", "cancelled" eller "error".
+
+        Args:
+            target (callable): funktionen. Får jobbet som første argument.
+
+        Examples:
+            >>> job = Job(lambda job, x: x * 2, 21)
+            >>> job.start().join()
+            >>> [kind for kind, _ in job.poll()], job.result
+            (['done'], 42)
+        """
+        self.target = target  # Funktionen der køres
+        self.args = args  # Argumenter til funktionen
+        self.kwargs = kwargs  # Keyword argumenter til funktionen
+        self.messages = queue.Queue()  # Beskeder til GUI'en
+        self.cancel_event = threading.Event()  # Sat når jobbet skal stoppe
+        self.thread = None  # Tråden jobbet kører i
+        self.result = None  # Resultatet når jobbet er færdigt
+        self.error = None  # Fejlen hvis jobbet fejlede
+
+    def start(self):
+        """Starter jobbet i en daemon tråd.
+
+        Returns:
+            Job: self
+        """
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def join(self, timeout=None):
+        """Venter på at jobbet bliver færdigt."""
+        self.thread.join(timeout)
+
+    def cancel(self):
+        """Beder jobbet om at stoppe ved næste blok."""
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def raise_if_cancelled(self):
+        """Kaldes fra jobbets tråd.
+
+        Raises:
+            JobCancelled: If the job has been cancelled.
+        """
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def put(self, kind, data=None):
+        """Sender en besked til GUI'en."""
+        self.messages.put((kind, data))
+
+    def poll(self):
+        """Tager alle beskeder der er kommet, uden at vente.
+
+        Returns:
+            list: beskederne i rækkefølge
+        """
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def progress_bar(self, interval=0.2, bins=20):
+        """Laver en progress bar der sender beskeder til dette job.
+
+        Args:
+            interval (float, optional): mindste antal sekunder mellem "partial" beskeder.
+                Defaults to 0.2.
+            bins (int, optional): søjler i det løbende histogram. Defaults to 20.
+
+        Returns:
+            JobProgress: progress bar til MonteCarlo eller CoolingPlotter
+        """
+        return JobProgress(self, interval, bins)
+
+    def _run(self):
+        try:
+            self.result = self.target(self, *self.args, **self.kwargs)
+        except JobCancelled:
+            self.put("cancelled")
+        except Exception as error:  # Fejlen vises i GUI'en i stedet for at tråden dør stille
+            self.error = error
+            self.put("error", error)
+        else:
+            self.put("done", self.result)
+
+
+class JobProgress:
+    def __init__(self, job, interval=0.2, bins=20):
+        """Progress bar der sender fremdrift og delresultater gennem et jobs kø.
+
+        Args:
+            job (Job): jobbet
+            interval (float, optional): se Job.progress_bar. Defaults to 0.2.
+            bins (int, optional): se Job.progress_bar. Defaults to 20.
+
+        Examples:
+            >>> job = Job(lambda job: None)
+            >>> bar = job.progress_bar(interval=0)
+            >>> bar.UpdateBar(50)
+            >>> bar.chunk_done([10.0, 12.0], "simple")
+            >>> [kind for kind, _ in job.poll()]
+            ['progress', 'partial']
+            >>> job.cancel()
+            >>> bar.UpdateBar(60)
+            Traceback (most recent call last):
+            ...
+            jobs.JobCancelled
+        """
+        self.job = job  # Jobbet beskederne sendes til
+        self.interval = interval  # Sekunder mellem delresultater
+        self.bins = bins  # Søjler i histogrammet
+        self.stats = {}  # Løbende statistik pr. label
+        self.costs = {}  # Månedlige priser pr. label til histogrammet
+        self.sent = {}  # Hvornår der sidst blev sendt et delresultat pr. label
+
+    def UpdateBar(self, current_count, max=None):
+        """Samme navn som sg.ProgressBar.UpdateBar.
+
+        Raises:
+            JobCancelled: If the job has been cancelled.
+        """
+        self.job.raise_if_cancelled()
+        self.job.put("progress", {"percent": current_count})
+
+    def chunk_done(self, costs, label=None):
+        """Lægger en færdig bloks månedlige priser til og sender evt. et delresultat.
+
+        Args:
+            costs (list): blokkens samlede pris pr. måned
+            label (str, optional): hvilken kørsel blokken hører til. Defaults to None.
+        """
+        stats = self.stats.setdefault(label, RunningStats())
+        stats.add_many(costs)
+        self.costs.setdefault(label, []).extend(costs)
+        now = time.monotonic()
+        if now - self.sent.get(label, -math.inf) >= self.interval:
+            self.sent[label] = now
+            self.job.put("partial", self.partial(label))
+
+    def partial(self, label=None):
+        """Delresultatet for en label.
+
+        Args:
+            label (str, optional): kørslen. Defaults to None.
+
+        Returns:
+            dict: label, months, mean, half_width (95%) og histogram (counts, edges)
+        """
+        stats = self.stats[label]
+        half_width = 1.96 * stats.std() / math.sqrt(stats.count) if stats.count > 1 else math.inf
+        counts, edges = np.histogram(self.costs[label], bins=self.bins)
+        return {
+            "label": label,
+            "months": stats.count,
+            "mean": stats.mean,
+            "half_width": half_width,
+            "histogram": (counts.tolist(), edges.tolist()),
+        }
+
+
+class StageProgress:
+    def __init__(self, progress_bar, start, span, label=None):
+        """Viser én kørsel som en del af en fælles progress bar.
+
+        Så fylder to Monte Carlo kørsler baren én gang i stedet for to.
+
+        Args:
+            progress_bar (sg.ProgressBar): den fælles bar, fx en JobProgress
+            start (int): procent hvor kørslen starter
+            span (int): hvor mange procent kørslen fylder
+            label (str, optional): navn der sendes med delresultater. Defaults to None.
+
+        Examples:
+            >>> job = Job(lambda job: None)
+            >>> StageProgress(job.progress_bar(), 50, 50).UpdateBar(50)
+            >>> job.poll()[0][1]["percent"]
+            75
+        """
+        self.progress_bar = progress_bar  # Den fælles bar
+        self.start = start  # Start i procent
+        self.span = span  # Procent for denne kørsel
+        self.label = label  # Kørslens navn
+
+    def UpdateBar(self, current_count, max=None):
+        self.progress_bar.UpdateBar(self.start + current_count * self.span // 100)
+
+    def chunk_done(self, costs, label=None):
+        chunk_done = getattr(self.progress_bar, "chunk_done", None)
+        if chunk_done is not None:
+            chunk_done(costs, self.label if label is None else label)
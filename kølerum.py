@@ -5,16 +5,73 @@
 """
 import math
 import random
+from array import array
 
+import numpy as np
+
+from price_series import as_price_array
 from termostat import Thermostat
 
+STEPS = 8640  # Antal steps af 5 minutter i en måned
+DELTA_T = 300  # Sekunder pr. step
+DOOR_BIT = 1  # Bit i state loggen for åben dør
+COMPRESSOR_BIT = 2  # Bit i state loggen for tændt kompressor
+
+
+def _zero_log(steps=STEPS):
+    """Laver en forudallokeret log af float64 fyldt med nuller."""
+    return array("d", bytes(8 * steps))
+
 
 class Kølerum:
-    def __init__(self, thermostat: Thermostat, energy_prices):
+    __slots__ = (
+        "t_rum",
+        "t_komp",
+        "delta_t",
+        "t_start",
+        "t_target",
+        "t_current",
+        "door_open",
+        "compressor_on",
+        "n",
+        "food_waste",
+        "temps",
+        "electricity_cost",
+        "states",
+        "energy_prices",
+        "termostat",
+        "rng",
+        "door_schedule",
+        "steps",
+        "ambient",
+    )
+
+    def __init__(self, thermostat: Thermostat, energy_prices, rng=None, door_schedule=None, steps=STEPS, delta_t=DELTA_T, ambient=None, record_states=False):
+        """Et kølerum der simuleres step for step.
+
+        Horisonten er steps steps af delta_t sekunder. Elpriserne og en evt.
+        rumtemperatur skal have en værdi pr. step, se PriceSeries.on_grid.
 
+        Args:
+            thermostat (Thermostat): termostatet der styrer kompressoren
+            energy_prices (PriceSeries): elpriserne, én pr. step
+            rng (random.Random, optional): tilfældighedsgenerator til døren. Defaults to None.
+            door_schedule (list, optional): dørens åbninger trukket på forhånd. Defaults to None.
+            steps (int, optional): antal steps i simuleringen. Defaults to STEPS.
+            delta_t (float, optional): sekunder pr. step. Defaults to DELTA_T.
+            ambient (PriceSeries, optional): rumtemperatur pr. step i stedet for
+                den faste t_rum. Defaults to None.
+            record_states (bool, optional): gem dør og kompressor for hvert step som
+                DOOR_BIT og COMPRESSOR_BIT. Defaults to False.
+
+        Examples:
+            >>> k = Kølerum(thermostat=None, energy_prices=[], steps=3, ambient=np.array([20.0, 30.0, 40.0]))
+            >>> len(k.temps), k.ambient.item(2)
+            (3, 40.0)
+        """
         self.t_rum = 20  # Rumtemperatur
         self.t_komp = -5  # Kompressorens køletemperatur
-        self.delta_t = 300  # 5 minutter
+        self.delta_t = delta_t  # Sekunder pr. step
         self.t_start = 5  # Starttemperatur
         self.t_target = 5  # Mål for temperatur
 
@@ -23,12 +80,17 @@ class Kølerum:
         self.compressor_on = False  # Kompressoren er slukket til at starte med
 
         self.n = 0  # 0 minutter er gået
-        self.food_waste = [0 for i in range(8640)]  # Madspild
-        self.temps = [0 for i in range(8640)]  # Temperatur
-        self.electricity_cost = [0 for i in range(8640)]  # Elpris  # Samlet pris
+        self.steps = steps  # Antal steps i simuleringen
+        self.food_waste = _zero_log(steps)  # Madspild
+        self.temps = _zero_log(steps)  # Temperatur
+        self.electricity_cost = _zero_log(steps)  # Elpris
+        self.states = array("B", bytes(steps)) if record_states else None  # Dør og kompressor pr. step
 
-        self.energy_prices = energy_prices # Elpriser
+        self.energy_prices = as_price_array(energy_prices) # Elpriser som float64 array
         self.termostat = thermostat # Termostat
+        self.rng = rng if rng is not None else random # Tilfældighedsgenerator til døren
+        self.door_schedule = door_schedule # Dørens åbninger trukket på forhånd, se door_schedule
+        self.ambient = None if ambient is None else as_price_array(ambient) # Rumtemperatur pr. step
 
     def decide_constants(self, door: bool, compressor: bool) -> float:
         """Bestemmer hvilke konstanter der skal bruges til at beregne temperaturen
@@ -58,6 +120,8 @@ class Kølerum:
     def decide_door(self, percentage=0.1) -> bool:
         """Bestemmer om døren skal være åben eller lukket
 
+        Er der givet et door_schedule læses døren derfra i stedet for at trække.
+
         Args:
             percentage (float, optional): Procent chance for at døren er åben (10%). Defaults to 0.1.
             Yes
@@ -70,11 +134,15 @@ class Kølerum:
             True
             >>> k.decide_door(0.0)
             False
+            >>> Kølerum(thermostat=None, energy_prices=[], door_schedule=[True]).decide_door(0.0)
+            True
         """
-        return random.random() <= percentage
+        if self.door_schedule is not None:
+            return bool(self.door_schedule[self.n])
+        return self.rng.random() <= percentage
 
     def get_new_temperature(self) -> float:
-        """Beregner den nye temperatur og inkrementerer n med steps på 5 minutter
+        """Beregner den nye temperatur og inkrementerer n med et step på delta_t sekunder
 
         Returns:
             _type_: new temperature
@@ -87,8 +155,11 @@ class Kølerum:
         c_1, c_2 = self.decide_constants(
             self.door_open, self.compressor_on
         )  # Bestemmer konstanterne
+        if self.states is not None:
+            self.states[self.n] = self.door_open * DOOR_BIT + self.compressor_on * COMPRESSOR_BIT
 
-        delta_t_current_rum = self.t_rum - self.t_current
+        t_rum = self.t_rum if self.ambient is None else self.ambient.item(self.n)
+        delta_t_current_rum = t_rum - self.t_current
         delta_t_current_komp = self.t_komp - self.t_current
         new_temp = (
             self.t_current
@@ -99,57 +170,73 @@ class Kølerum:
         return new_temp
 
     def calculate_food_waste(self) -> None:
-        """Beregner madspildet og tilføjer det til en liste for en total pr. måned"""
+        """Beregner madspildet og tilføjer det til en liste for en total pr. måned
+
+        Priserne i modellen er pr. 5 minutter, så de skaleres med delta_t / DELTA_T.
+        """
         if self.t_current < 3.5:
-            self.food_waste[self.n] = 4.39 * math.exp(-0.49 * self.t_current)
+            self.food_waste[self.n] = 4.39 * math.exp(-0.49 * self.t_current) * (self.delta_t / DELTA_T)
               # Frostskade
         elif self.t_current > 6.5:
-            self.food_waste[self.n] = 0.11 * math.exp(0.31 * self.t_current)
+            self.food_waste[self.n] = 0.11 * math.exp(0.31 * self.t_current) * (self.delta_t / DELTA_T)
               # Bakterievækst
         else:
             pass
     def calculate_electricity_price(self) -> None:
         """Bereneger elprisen og tilføjer det til en liste for en total pr. måned"""
         if self.compressor_on:
-            self.electricity_cost[self.n] = float(self.energy_prices[self.n]["Pris"]) 
+            self.electricity_cost[self.n] = self.energy_prices.item(self.n) * (self.delta_t / DELTA_T)
         else:
             pass  # Hvis kompressoren er slukket
 
     def sum_up_cost(self) -> dict:
         """Sumerer alt dataen og returnerer det
 
+        Logs returneres som NumPy views direkte på bufferne, så intet kopieres.
+
         Returns:
-            dict: a collection of the data
+            dict: a collection of the data. state_log har DOOR_BIT og COMPRESSOR_BIT
+                for hvert step, eller None uden record_states
+
+        Examples:
+            >>> k = Kølerum(thermostat=None, energy_prices=[])
+            >>> k.food_waste[0] = 1.5
+            >>> data = k.sum_up_cost()
+            >>> data["food_waste_log"].dtype, data["total_cost"]
+            (dtype('float64'), 1.5)
         """
+        temps = np.frombuffer(self.temps)
+        electricity = np.frombuffer(self.electricity_cost)
+        food_waste = np.frombuffer(self.food_waste)
         return {
-            "temperature_log": self.temps,
-            "electricity_log": self.electricity_cost,
-            "food_waste_log": self.food_waste,
-            "total_cost": sum(self.electricity_cost) + sum(self.food_waste),
+            "temperature_log": temps,
+            "electricity_log": electricity,
+            "food_waste_log": food_waste,
+            "state_log": None if self.states is None else np.frombuffer(self.states, dtype=np.uint8),
+            "total_cost": float(electricity.sum() + food_waste.sum()),
         }
 
     def step(self):
-        """Kører simulationen for 5 minutter"""
+        """Kører simulationen for et step"""
         self.calculate_food_waste()
         self.calculate_electricity_price()
         self.get_new_temperature()
 
     def run_simulation(self):
-        """Kører simulationen for en måned"""
-        for _ in range(8640):
+        """Kører simulationen for hele horisonten"""
+        for _ in range(self.steps):
             self.step()
         return self.sum_up_cost()
 
 
 if __name__ == "__main__":
     """Dette er blot for at det er muligt at se hvad hvert enkelt modul gør og køre doctest"""
-    import csv
     import doctest
 
+    from price_series import PriceSeries
     from termostat import ThermostatSemiSmart
 
-    with open("elpris.csv") as elpris:
-        energy_prices = list(csv.DictReader(elpris))
+    energy_prices = PriceSeries.load("elpris.csv")
 
     thermostat = ThermostatSemiSmart(energy_prices)
 
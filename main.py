@@ -5,25 +5,26 @@ og koden er en smule rodet og ikke optimeret.
 @template: Tobias Kallehauge
 """
 
-import csv
-import threading
-
-
 import matplotlib
 import matplotlib.pyplot as plt
 import PySimpleGUI as sg
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
-from plotter import CoolingPlotter
+from jobs import Job
+from plotter import CoolingPlotter, PlotCanvas
 from kølerum import Kølerum
 from monte_carlo import MonteCarlo
+from price_series import PriceSeries
+from result_cache import ResultCache
 from termostat import ThermostatSemiSmart, ThermostatSimple, ThermostatSmart
 
 
 
-# Indlæser elpriserne
-with open("elpris.csv") as elpris:
-    energy_prices = list(csv.DictReader(elpris))
+# Indlæser elpriserne (fra den binære cache efter første kørsel)
+energy_prices = PriceSeries.load("elpris.csv")
+
+# Resultater af tidligere kørsler med samme seed
+result_cache = ResultCache()
 
 matplotlib.use("TkAgg")
 
@@ -40,20 +41,36 @@ def draw_figure(canvas, figure):
     return figure_canvas_agg
 
 
-def delete_fig(fig):
+def draw_partial_histogram(graph, histograms):
     """
-    Deletes a matplotlib figure from the GUI canvas.
+    Draws the running cost histograms of both thermostats on a shared axis.
     """
-    fig.get_tk_widget().forget()
-    plt.close("all")
+    graph.erase()
+    low = min(edges[0] for _, edges in histograms.values())
+    high = max(edges[-1] for _, edges in histograms.values())
+    width = high - low or 1
+    top = max(max(counts) for counts, _ in histograms.values()) or 1
+    for label, color in (("simple", "blue"), ("smart", "orange")):
+        if label not in histograms:
+            continue
+        counts, edges = histograms[label]
+        for count, left, right in zip(counts, edges, edges[1:]):
+            graph.draw_rectangle(
+                ((left - low) / width, count / top), ((right - low) / width, 0), line_color=color
+            )
 
 
 # Lauyout til første vindue
 layout1 = [
     [sg.Text("Vælg antal måneder")],
-    [sg.Combo(["10", "100", "1000", "10000"], default_value="10", key="N")],
+    [sg.Combo(["10", "100", "1000", "10000", "Auto"], default_value="10", key="N")],
+    [sg.Text("Ved Auto: stop når gennemsnittet er kendt med ± DKK (95%)"), sg.Input("5", key="PRECISION", size=(6, 1))],
     [sg.Text("Vælg termostat type")],
     [sg.Combo(["semi smart", "smart"], default_value="smart", key="THERMOSTAT")],
+    [sg.Text("Vælg motor")],
+    [sg.Combo(["batch", "scalar"], default_value="batch", key="ENGINE")],
+    [sg.Checkbox("Parret sammenligning (samme døre for begge termostater)", default=True, key="PAIRED")],
+    [sg.Text("Seed (tom for tilfældig, ellers genbruges tidligere kørsler)"), sg.Input("1", key="SEED", size=(8, 1))],
     [sg.Button("Kør Simulering", key="-KØR-")],
     [
                 sg.Frame(
@@ -96,7 +113,7 @@ layout1 = [
                         ],
                         [
                             sg.Text(
-                                f"Koden er heller ikke optimeret så i skal have rigtig god tid hvis i vælger høje N.",
+                                f"Den skalare motor er ikke optimeret så vælg batch motoren hvis i vælger høje N.",
                                 font=("Helvetica", 14),
                                 pad=(10, 5),
                              )
@@ -120,19 +137,34 @@ window1 = sg.Window(
 )
 
 # Fra template
-fig_gui = None
 cooling_plotter = None
 
+# Plot varigheder fra GUI'ens combos og canvas bredden i pixels
+DURATIONS = {"Dag": "day", "Uge": "week", "Måned": "month"}
+CANVAS_WIDTH = 1000
 
-def create_cooling_plotter(N, thermostat_type, progress_bar):
+
+def create_cooling_plotter(job, N, thermostat_type, engine="scalar", paired=False, precision=None, seed=None):
     """Bestemmer hvilken termostat der skal bruges og kører simuleringen.
 
+    Køres i baggrunden som et Job. Fremdrift og løbende gennemsnit sendes
+    gennem jobbets kø, så GUI'en kun opdateres fra hovedtråden.
+
     Args:
+        job (Job): jobbet simuleringen kører i
         N (int): Antal simulationer
         thermostat_type (str): Hviket termostat der skal bruges
-        progress_bar (sg.ProgressBar): Bare en loading bar der skal have fremdrift af monte carlo
+        engine (str, optional): "scalar" eller "batch" motor til monte carlo. Defaults to "scalar".
+        paired (bool, optional): begge termostater ser samme døre så forskellen får et
+            konfidensinterval. Defaults to False.
+        precision (float, optional): stop når gennemsnittet er kendt med ± precision DKK,
+            højst N måneder. Defaults to None.
+        seed (int, optional): seed for simuleringen. Med seed bruges resultat cachen når
+            det ikke er en parret kørsel. Defaults to None.
+
+    Returns:
+        CoolingPlotter: data til plottene
     """
-    global cooling_plotter # Gad ikke putte alt i en klasse når det er gui
     # Forskellige termostater
     if thermostat_type == "semi smart":
         kølerum_simple = Kølerum(
@@ -149,8 +181,10 @@ def create_cooling_plotter(N, thermostat_type, progress_bar):
             thermostat=ThermostatSmart(energy_prices), energy_prices=energy_prices
         )
     # Kører simuleringen
-    cooling_plotter = CoolingPlotter(
-        N, progress_bar, kølerum_simple, kølerum_smart, MonteCarlo
+    return CoolingPlotter(
+        N, job.progress_bar(), kølerum_simple, kølerum_smart, MonteCarlo, engine=engine, paired=paired,
+        precision=precision, seed=seed,
+        cache=result_cache if seed is not None and not paired and precision is None else None,
     )
 
 # Main loop 1
@@ -161,31 +195,78 @@ while True:
         exit()
     
     if event == "-KØR-":
-        N = int(values["N"])
+        precision = None
+        if values["N"] == "Auto":
+            # Højst 10000 måneder, men stopper så snart præcisionen er nået
+            N = 10000
+            precision = float(values["PRECISION"])
+        else:
+            N = int(values["N"])
         thermostat_type = values["THERMOSTAT"]
-        # Loading bar
+        engine = values["ENGINE"]
+        # Parret sammenligning kræver alle måneders priser, så den bruges ikke med Auto
+        paired = values["PAIRED"] and precision is None
+        seed = int(values["SEED"]) if values["SEED"].strip() else None
+        # Loading bar med løbende gennemsnit og histogram
         layout_loading = [
             [sg.Text("Loading...")],
             [sg.ProgressBar(100, orientation="h",
                             size=(20, 20), key="-PROG-")],
+            [sg.Text("Simple: venter", key="-MEAN_simple-", size=(60, 1))],
+            [sg.Text("Smart: venter", key="-MEAN_smart-", size=(60, 1))],
+            [sg.Graph((400, 120), (0, 0), (1, 1), key="-PARTIAL_HIST-", background_color="white")],
+            [sg.Button("Annuller", key="-CANCEL-")],
         ]
         window_loading = sg.Window("Loading", layout_loading, finalize=True)
         progress_bar = window_loading["-PROG-"]
+        histograms = {}  # Seneste histogram pr. termostat
 
-        # Kører simulation i en anden thread
-        thread = threading.Thread(
-            target=create_cooling_plotter, args=(
-                N, thermostat_type, progress_bar)
-        )
-        thread.start()
-        window1.close()
-        # Opdaterer loading bar
-        while thread.is_alive():
+        # Kører simulation i baggrunden. Tråden sender kun beskeder, GUI'en opdateres her
+        job = Job(create_cooling_plotter, N, thermostat_type, engine, paired, precision, seed).start()
+        window1.hide()
+        cooling_plotter = None
+        while cooling_plotter is None:
             event, _ = window_loading.read(timeout=100)
             if event == sg.WIN_CLOSED:
+                job.cancel()
                 exit()
-        # Endelig færdig:)
+            if event == "-CANCEL-":
+                job.cancel()
+                window_loading["-CANCEL-"].update("Annullerer...", disabled=True)
+            for kind, data in job.poll():
+                if kind == "progress":
+                    progress_bar.UpdateBar(data["percent"])
+                elif kind == "partial":
+                    window_loading[f"-MEAN_{data['label']}-"].update(
+                        f"{data['label'].capitalize()}: {data['mean']:.2f} DKK "
+                        f"± {data['half_width']:.2f} ({data['months']} måneder)"
+                    )
+                    histograms[data["label"]] = data["histogram"]
+                    draw_partial_histogram(window_loading["-PARTIAL_HIST-"], histograms)
+                elif kind == "done":
+                    cooling_plotter = data
+                elif kind == "cancelled":
+                    break
+                elif kind == "error":
+                    sg.popup_error(f"Simuleringen fejlede: {data}")
+                    break
+            else:
+                continue
+            # Annulleret eller fejlet: tilbage til første vindue
+            break
         window_loading.close()
+        if cooling_plotter is None:
+            window1.un_hide()
+            continue
+        window1.close()
+        # Parret forskel med konfidensinterval hvis den er beregnet
+        difference = cooling_plotter.cost_difference
+        difference_text = "Forskel er kun beregnet ved parret sammenligning"
+        if difference is not None:
+            difference_text = (
+                f"Forskel (simple - smart): {difference['mean_difference']:.2f} DKK "
+                f"[{difference['ci_low']:.2f}; {difference['ci_high']:.2f}] 95% KI"
+            )
         # Layout til andet vindue
         layout2 = [
             [
@@ -201,14 +282,21 @@ while True:
                     layout=[
                         [
                             sg.Text(
-                                f"Simple gennemsnitlig pris: {cooling_plotter.df_data_simple_average:.2f} DKK",
+                                f"Simple gennemsnitlig pris: {cooling_plotter.simple_average:.2f} DKK ({cooling_plotter.months_simple} måneder)",
                                 font=("Helvetica", 14),
                                 pad=(10, 5),
                             )
                         ],
                         [
                             sg.Text(
-                                f"Smart gennemsnitlig pris: {cooling_plotter.df_data_smart_average:.2f} DKK",
+                                f"Smart gennemsnitlig pris: {cooling_plotter.smart_average:.2f} DKK ({cooling_plotter.months_smart} måneder)",
+                                font=("Helvetica", 14),
+                                pad=(10, 5),
+                            )
+                        ],
+                        [
+                            sg.Text(
+                                difference_text,
                                 font=("Helvetica", 14),
                                 pad=(10, 5),
                             )
@@ -233,7 +321,7 @@ while True:
             sg.Combo(["Dag", "Uge"], default_value="Dag", key="TEMPDURATION")],
 
             [sg.Button("Histogram", key="-HISTOGRAM-", size=(20, 2))],
-            [sg.Canvas(key="-CANVAS-", size=(1000, 600))],
+            [sg.Canvas(key="-CANVAS-", size=(CANVAS_WIDTH, 600))],
         ]
 
         # Andet vindue setup
@@ -246,70 +334,41 @@ while True:
         )
 
         # Main loop 2
+        # Én figur og ét canvas genbruges, så et nyt plot kun sætter nye data
+        plot_canvas = PlotCanvas()
+        figure_canvas = None
         while True:
             event, values = window2.read()
             if event == sg.WIN_CLOSED:
                 break
-            
+
             # Plots
             if event in ("-CUMSUM-", "-TEMP_SIMPLE-", "-TEMP_SMART-", "-HISTOGRAM-", "-FOODCUMSUM-"):
-                if fig_gui:
-                    delete_fig(fig_gui)
-
                 # Alle de forskellige plots med forskellige intervaller
                 if event == "-CUMSUM-":
-                    el_duration = values["ELDURATION"]
-                    if el_duration == "Uge":
-                        fig = cooling_plotter.plot_electricity_cumsum(
-                            duration="week"
-                        )
-                    elif el_duration == "Dag":
-                        fig = cooling_plotter.plot_electricity_cumsum(
-                            duration="day"
-                        )
-                    else:
-                        fig = cooling_plotter.plot_electricity_cumsum(
-                            duration="month"
-                        )
+                    view = cooling_plotter.view(
+                        "electricity_cumsum", DURATIONS[values["ELDURATION"]], max_points=CANVAS_WIDTH
+                    )
                 elif event == "-FOODCUMSUM-":
-                    el_duration = values["ELDURATION"]
-                    if el_duration == "Uge":
-                        fig = cooling_plotter.plot_food_waste_cumsum(
-                            duration="week"
-                        )
-                    elif el_duration == "Dag":
-                        fig = cooling_plotter.plot_food_waste_cumsum(
-                            duration="day"
-                        )
-                    else:
-                        fig = cooling_plotter.plot_food_waste_cumsum(
-                            duration="month"
-                        )
+                    view = cooling_plotter.view(
+                        "food_waste_cumsum", DURATIONS[values["ELDURATION"]], max_points=CANVAS_WIDTH
+                    )
                 elif event == "-TEMP_SIMPLE-":
-                    temp_duration = values["TEMPDURATION"]
-                    if temp_duration == "Uge":
-                        fig = cooling_plotter.plot_temperature(
-                            duration="week", type="simple"
-                        )
-                    else:
-                        fig = cooling_plotter.plot_temperature(
-                        duration="day", type="simple"
+                    view = cooling_plotter.view(
+                        "temperature", DURATIONS[values["TEMPDURATION"]], "simple", max_points=CANVAS_WIDTH
                     )
                 elif event == "-TEMP_SMART-":
-                    temp_duration = values["TEMPDURATION"]
-                    if temp_duration == "Uge":
-                        fig = cooling_plotter.plot_temperature(
-                            duration="week", type="smart"
-                        )
-                    else:
-                        fig = cooling_plotter.plot_temperature(
-                        duration="day", type="smart"
+                    view = cooling_plotter.view(
+                        "temperature", DURATIONS[values["TEMPDURATION"]], "smart", max_points=CANVAS_WIDTH
                     )
                 elif event == "-HISTOGRAM-":
-                    fig = cooling_plotter.plot_histogram_cost()
+                    view = cooling_plotter.view("histogram")
 
-                # Fra template
-                fig_gui = draw_figure(window2["-CANVAS-"].TKCanvas, fig)
+                plot_canvas.show(view)
+                if figure_canvas is None:
+                    figure_canvas = draw_figure(window2["-CANVAS-"].TKCanvas, plot_canvas.figure)
+                else:
+                    figure_canvas.draw_idle()
 
 plt.close("all")
 window2.close()
@@ -4,71 +4,576 @@
         dict: Samlede resultater af simuleringen for months måneder.
 """
 
+import math
+import pickle
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+
+from batch_kølerum import BatchKølerum
+from checkpoint import LOGS, MONTHLY, Checkpoint
+from door_schedule import DoorSchedule
 from kølerum import Kølerum
+from price_series import dumps_mapped
+from profiling import ProfiledBatchKølerum, ProfiledKølerum, StepProfile
+from running_stats import QuantileSketch, RunningStats
+
+ENGINES = ("scalar", "batch")
+
+# Termostat og elpriser for en worker process, sat én gang af _init_worker
+_worker_state = {}
+
+
+def chunk_seed(seed, chunk):
+    """Giver den uafhængige tilfældighedsstrøm for en blok af måneder.
+
+    Strømmen afhænger kun af seed og blokkens nummer, så den er den samme
+    uanset hvor mange workers der bruges.
+
+    Args:
+        seed (int): seed for hele simuleringen
+        chunk (int): blokkens nummer
+
+    Returns:
+        np.random.SeedSequence: seed sequence for blokken
+
+    Examples:
+        >>> chunk_seed(42, 3).spawn_key
+        (3,)
+        >>> chunk_seed(42, 3).generate_state(1) == chunk_seed(42, 3).generate_state(1)
+        array([ True])
+    """
+    return np.random.SeedSequence(seed, spawn_key=(chunk,))
+
+
+def room_options(kølerum):
+    """Horisont, tidsskridt og rumtemperatur fra et kølerum, til nye kølerum i en blok.
+
+    Args:
+        kølerum (Kølerum): kølerummet
+
+    Returns:
+        dict: steps, delta_t og ambient
+
+    Examples:
+        >>> room_options(Kølerum(thermostat=None, energy_prices=[], steps=10, delta_t=60))
+        {'steps': 10, 'delta_t': 60, 'ambient': None}
+    """
+    return {"steps": kølerum.steps, "delta_t": kølerum.delta_t, "ambient": kølerum.ambient}
+
+
+def simulate_chunk(thermostat, energy_prices, months, engine="scalar", seed_sequence=None, keep=None, door_method=None, door_schedule=None, profile=False, room=None, states=False):
+    """Kører en blok af måneder med sin egen tilfældighedsgenerator.
+
+    Args:
+        thermostat (Thermostat): termostatet der styrer kompressoren
+        energy_prices (np.ndarray): elpriserne som float64 array
+        months (int): antal måneder i blokken
+        engine (str, optional): "scalar" eller "batch". Defaults to "scalar".
+        seed_sequence (np.random.SeedSequence, optional): blokkens tilfældighedsstrøm.
+            Er den None bruges det globale random modul. Defaults to None.
+        keep (int, optional): antal måneder fra starten af blokken hvis logs returneres.
+            None returnerer alle. Defaults to None.
+        door_method (str, optional): "bernoulli" eller "geometric" trækker dørens åbninger
+            for hele blokken på forhånd. None trækker døren i hvert step. Defaults to None.
+        door_schedule (DoorSchedule, optional): dørens åbninger for blokken. Defaults to None.
+        profile (bool, optional): mål tiden i hver fase af step, se profiling. Defaults to False.
+        room (dict, optional): steps, delta_t og ambient til kølerummene, se room_options.
+            Defaults to None.
+        states (bool, optional): returnér også dør og kompressor for hvert step i de
+            beholdte måneder under "state_logs", se Kølerum.sum_up_cost. Defaults to False.
+
+    Returns:
+        dict: logs for de beholdte måneder og priser for hver måned i blokken, og
+            en StepProfile under "profile" hvis profile er True
+    """
+    keep = months if keep is None else keep
+    step_profile = StepProfile() if profile else None
+    room = room if room is not None else {}
+    if door_schedule is None and door_method is not None:
+        door_schedule = DoorSchedule.generate(
+            months, np.random.default_rng(seed_sequence), method=door_method, **({"steps": room["steps"]} if "steps" in room else {})
+        )
+    if engine == "batch":
+        rng = np.random.default_rng(seed_sequence)
+        options = dict(room, profile=step_profile) if profile else room
+        kølerum = (ProfiledBatchKølerum if profile else BatchKølerum)(
+            thermostat,
+            energy_prices,
+            months,
+            rng=rng,
+            door_schedule=door_schedule,
+            record_logs=keep,
+            record_states=states,
+            **options,
+        )
+        data = kølerum.run_simulation()
+        chunk_data = {
+            "temperature_logs": list(data["temperature_log"][:keep]),
+            "electricity_logs": list(data["electricity_log"][:keep]),
+            "food_waste_logs": list(data["food_waste_log"][:keep]),
+            "monthly_electricity_costs": data["electricity_total"].tolist(),
+            "monthly_food_waste_costs": data["food_waste_total"].tolist(),
+            "monthly_total_costs": data["total_cost"].tolist(),
+        }
+        if states:
+            chunk_data["state_logs"] = list(data["state_log"][:keep])
+        if profile:
+            chunk_data["profile"] = step_profile
+        return chunk_data
+
+    rng = None
+    if seed_sequence is not None:
+        rng = random.Random(int(seed_sequence.generate_state(1, dtype=np.uint64)[0]))
+    chunk_data = {
+        "temperature_logs": [],
+        "electricity_logs": [],
+        "food_waste_logs": [],
+        "monthly_electricity_costs": [],
+        "monthly_food_waste_costs": [],
+        "monthly_total_costs": [],
+    }
+    if states:
+        chunk_data["state_logs"] = []
+    for month in range(months):
+        doors = None if door_schedule is None else door_schedule.month(month).tolist()
+        if profile:
+            kølerum = ProfiledKølerum(
+                thermostat, energy_prices, rng=rng, door_schedule=doors, profile=step_profile, record_states=states, **room
+            )
+        else:
+            kølerum = Kølerum(thermostat, energy_prices, rng=rng, door_schedule=doors, record_states=states, **room)
+        month_data = kølerum.run_simulation()
+        if month < keep:
+            chunk_data["temperature_logs"].append(month_data["temperature_log"])
+            chunk_data["electricity_logs"].append(month_data["electricity_log"])
+            chunk_data["food_waste_logs"].append(month_data["food_waste_log"])
+            if states:
+                chunk_data["state_logs"].append(month_data["state_log"])
+        chunk_data["monthly_electricity_costs"].append(float(month_data["electricity_log"].sum()))
+        chunk_data["monthly_food_waste_costs"].append(float(month_data["food_waste_log"].sum()))
+        chunk_data["monthly_total_costs"].append(month_data["total_cost"])
+    if profile:
+        chunk_data["profile"] = step_profile
+    return chunk_data
+
+
+def _init_worker(state):
+    """Gemmer termostat, elpriser og rummets horisont i worker processen så de kun sendes én gang.
+
+    state er de tre pickled med price_series.dumps_mapped, så memory-mappede
+    cache filer åbnes igen fra disken i stedet for at blive kopieret.
+    """
+    thermostat, energy_prices, room = pickle.loads(state)
+    _worker_state["thermostat"] = thermostat
+    _worker_state["energy_prices"] = energy_prices
+    _worker_state["room"] = room
+
+
+def _simulate_chunk_in_worker(months, **kwargs):
+    """Kører en blok i en worker process med termostatet fra _init_worker."""
+    return simulate_chunk(
+        _worker_state["thermostat"],
+        _worker_state["energy_prices"],
+        months,
+        room=_worker_state["room"],
+        **kwargs,
+    )
 
 
 class MonteCarlo:
-    def __init__(self, kølerum, progress_bar=None):
+    def __init__(self, kølerum, progress_bar=None, engine="scalar", batch_size=1000, seed=None, workers=1, door_method=None, profile=False):
         """Initializes the Monte Carlo simulation.
 
         Args:
             kølerum (class): En instans af Kølerum med et termostat.
             progress_bar (sg.ProgressBar, optional): En progress bar for at vise fremdrift. Defaults to None.
+            engine (str, optional): "scalar" kører én Kølerum pr. måned, "batch" kører alle måneder
+                samtidig med BatchKølerum. Defaults to "scalar".
+            batch_size (int, optional): Antal måneder pr. BatchKølerum i batch motoren. Defaults to 1000.
+            seed (int, optional): Seed der gør simuleringen reproducerbar. Defaults to None.
+            workers (int, optional): Antal processer månederne fordeles på. Defaults to 1.
+            door_method (str, optional): "bernoulli" eller "geometric" trækker dørens åbninger for
+                hver blok på forhånd, se door_schedule. Defaults to None.
+            profile (bool, optional): Mål tiden i hver fase af step og tæl hændelser. Resultatet
+                fås med profile_report. Defaults to False.
+
+        Raises:
+            ValueError: If engine is not 'scalar' or 'batch'.
+
         Examples:
             >>> from kølerum import Kølerum
             >>> mc = MonteCarlo(kølerum=Kølerum(thermostat=None, energy_prices=[]))
             >>> isinstance(mc.kølerum_template, Kølerum)
             True
         """
+        if engine not in ENGINES:
+            raise ValueError("Invalid engine. Use 'scalar' or 'batch'.")
         self.kølerum_template = kølerum # Kølerummet
 
         self.progress_bar = progress_bar # Progress bar for at vise fremdrift
-        
-    def run_simulation(self, months=12):
+        self.engine = engine # Hvilken motor der simulerer månederne
+        self.batch_size = batch_size # Måneder pr. batch
+        self.seed = seed # Seed for reproducerbare kørsler
+        self.workers = workers # Antal processer
+        self.door_method = door_method # Hvordan dørens åbninger trækkes
+        self.profile = StepProfile() if profile else None # Samlet profil for alle kørsler
+
+    def profile_report(self):
+        """Giver profilen for alle kørsler siden MonteCarlo blev lavet.
+
+        Raises:
+            ValueError: If the MonteCarlo was not created with profile=True.
+
+        Returns:
+            dict: se profiling.StepProfile.report
+        """
+        if self.profile is None:
+            raise ValueError("Profiling is off. Create the MonteCarlo with profile=True.")
+        return self.profile.report()
+
+    def chunk_size(self):
+        """Antal måneder i hver blok. Hver blok har sin egen tilfældighedsstrøm.
+
+        Returns:
+            int: måneder pr. blok
+        """
+        return self.batch_size if self.engine == "batch" else 1
+
+    def run_simulation(self, months=12, door_schedule=None):
         """Kører simuleringen for et antal måneder.
 
+        Månederne deles op i blokke af chunk_size måneder. Er der givet et seed
+        får hver blok sin egen strøm, så resultatet er det samme for alle workers.
+
         Args:
             months (int, optional): how many months to simulate Defaults to 12.
+            door_schedule (DoorSchedule, optional): door openings to replay, one row per month.
+                Defaults to None.
 
         Returns:
-            dict: collected data from the simulation
+            dict: collected data from the simulation. Logs er arrays af formen
+                (months, steps), som fyldes en blok ad gangen, så hver log kun
+                ligger i hukommelsen én gang
         """
-        self.temperature_logs = [0 for i in range(months)] # Temperaturlog for hele simuleringen
-        self.electricity_logs = [0 for i in range(months)] # Elforbrugslog for hele simuleringen
-        self.food_waste_logs = [0 for i in range(months)] # Madspildslog for hele simuleringen
+        shape = (months, self.kølerum_template.steps)
+        self.temperature_logs = np.empty(shape) # Temperaturlog for hele simuleringen
+        self.electricity_logs = np.empty(shape) # Elforbrugslog for hele simuleringen
+        self.food_waste_logs = np.empty(shape) # Madspildslog for hele simuleringen
         self.monthly_total_costs = [0 for i in range(months)] # Samlet pris for hele simuleringen
-        for month in range(months):
-            kølerum = Kølerum(thermostat=self.kølerum_template.termostat, energy_prices=self.kølerum_template.energy_prices) 
-
-            month_data = kølerum.run_simulation() # Kører simuleringen for en måned
 
+        for start, stop, chunk_data in self._iter_chunks(months, door_schedule=door_schedule):
             # Samler dataen for hele simuleringen
-            self.temperature_logs[month] = month_data["temperature_log"]
-            self.electricity_logs[month] = month_data["electricity_log"]
-            self.food_waste_logs[month] = month_data["food_waste_log"]
-            self.monthly_total_costs[month] = month_data["total_cost"]
-            
-            # Giver fremdrift til progress bar
-            if self.progress_bar:
-                self.progress_bar.UpdateBar((month + 1) * 100 // months)
+            self.temperature_logs[start:stop] = chunk_data["temperature_logs"]
+            self.electricity_logs[start:stop] = chunk_data["electricity_logs"]
+            self.food_waste_logs[start:stop] = chunk_data["food_waste_logs"]
+            self.monthly_total_costs[start:stop] = chunk_data["monthly_total_costs"]
         return {
             "temperature_logs": self.temperature_logs,
             "electricity_logs": self.electricity_logs,
             "food_waste_logs": self.food_waste_logs,
         }
-        
+
+    def run_costs(self, months=12, door_schedule=None):
+        """Kører simuleringen og returnerer kun den samlede pris for hver måned.
+
+        Der gemmes ingen logs, så det er billigt selv for mange måneder.
+
+        Args:
+            months (int, optional): how many months to simulate. Defaults to 12.
+            door_schedule (DoorSchedule, optional): door openings to replay. Defaults to None.
+
+        Returns:
+            np.ndarray: total cost per month
+        """
+        costs = np.empty(months)
+        for start, stop, chunk_data in self._iter_chunks(months, 0, door_schedule):
+            costs[start:stop] = chunk_data["monthly_total_costs"]
+        return costs
+
+    def run_streaming(self, months=12, sample_months=1, sketch_capacity=200, door_schedule=None):
+        """Kører simuleringen uden at gemme logs for alle måneder.
+
+        Hver færdig blok lægges straks ind i løbende statistik og smides væk.
+        Kun de første sample_months måneder beholder deres fulde logs, så
+        hukommelsen ikke vokser med months.
+
+        Args:
+            months (int, optional): how many months to simulate. Defaults to 12.
+            sample_months (int, optional): months whose full logs are kept. Defaults to 1.
+            sketch_capacity (int, optional): centroids in the quantile sketch. Defaults to 200.
+            door_schedule (DoorSchedule, optional): door openings to replay. Defaults to None.
+
+        Returns:
+            dict: sample logs and running statistics of the monthly costs
+        """
+        results = self._new_stream(sketch_capacity)
+        for _, _, chunk_data in self._iter_chunks(months, sample_months, door_schedule):
+            self._fold(results, chunk_data)
+        return results
+
+    def run_until(self, precision, confidence=0.95, batch_months=100, min_months=30, max_months=100000, max_seconds=None, sample_months=1, sketch_capacity=200):
+        """Kører måneder i batches indtil middelprisen er kendt præcist nok.
+
+        Efter hver batch beregnes konfidensintervallet for den gennemsnitlige
+        månedlige pris. Simuleringen stopper når den halve bredde er højst
+        precision, eller når max_months eller max_seconds er brugt.
+
+        Args:
+            precision (float): ønsket halv bredde af konfidensintervallet i DKK, fx 0.5
+            confidence (float, optional): konfidensniveau. Defaults to 0.95.
+            batch_months (int, optional): måneder mellem hver kontrol. Rundes op til hele
+                blokke. Defaults to 100.
+            min_months (int, optional): mindst antal måneder før der må stoppes. Defaults to 30.
+            max_months (int, optional): maks antal måneder. Defaults to 100000.
+            max_seconds (float, optional): maks tid i sekunder. Defaults to None.
+            sample_months (int, optional): måneder hvis fulde logs beholdes. Defaults to 1.
+            sketch_capacity (int, optional): centroider i kvantil skitsen. Defaults to 200.
+
+        Returns:
+            dict: samme som run_streaming plus months, half_width og stop_reason
+                ("precision", "max_months" eller "max_seconds")
+        """
+        size = self.chunk_size()
+        batch_months = max(size, math.ceil(batch_months / size) * size)
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        seed = self._resolve_seed()
+        results = self._new_stream(sketch_capacity)
+        started = time.perf_counter()
+        months = 0
+        while True:
+            stop = min(months + batch_months, max_months)
+            for _, _, chunk_data in self._iter_chunks(stop, sample_months, start=months, total=max_months, seed=seed):
+                self._fold(results, chunk_data)
+            months = stop
+
+            stats = results["cost_stats"]
+            half_width = z * stats.std() / math.sqrt(stats.count) if stats.count > 1 else math.inf
+            if months >= min_months and half_width <= precision:
+                stop_reason = "precision"
+                break
+            if months >= max_months:
+                stop_reason = "max_months"
+                break
+            if max_seconds is not None and time.perf_counter() - started >= max_seconds:
+                stop_reason = "max_seconds"
+                break
+
+        results["months"] = months
+        results["half_width"] = half_width
+        results["confidence"] = confidence
+        results["stop_reason"] = stop_reason
+        if self.progress_bar:
+            self.progress_bar.UpdateBar(100)
+        return results
+
+    def run_checkpointed(self, months, directory, sample_months=1, checkpoint_months=100, sketch_capacity=200):
+        """Kører som run_streaming men gemmer færdige måneder løbende i directory.
+
+        Findes der allerede et checkpoint for samme simulering i directory,
+        fortsættes der fra den første måned der ikke er gemt. Resultatet er
+        det samme som hvis kørslen aldrig var blevet afbrudt.
+
+        Args:
+            months (int): how many months to simulate
+            directory (str): checkpoint directory
+            sample_months (int, optional): months whose full logs are kept. Defaults to 1.
+            checkpoint_months (int, optional): months per saved file. Defaults to 100.
+            sketch_capacity (int, optional): centroids in the quantile sketch. Defaults to 200.
+
+        Raises:
+            ValueError: If the checkpoint belongs to a different simulation.
+
+        Returns:
+            dict: same as run_streaming plus monthly_total_costs
+        """
+        checkpoint = Checkpoint(directory)
+        if checkpoint.exists():
+            manifest = checkpoint.read_manifest()
+            seed, checkpoint_months = manifest["seed"], manifest["checkpoint_months"]
+        else:
+            # Et seed er nødvendigt for at kunne fortsætte med samme strømme
+            seed = self.seed if self.seed is not None else np.random.SeedSequence().entropy
+        manifest = checkpoint.start(self, months, sample_months, seed, checkpoint_months)
+
+        block_start = manifest["next_month"]
+        block = {name: [] for name in MONTHLY + LOGS}
+        for _, stop, chunk_data in self._iter_chunks(months, sample_months, start=block_start, seed=seed):
+            for name in MONTHLY + LOGS:
+                block[name].extend(chunk_data[name])
+            if stop - block_start >= checkpoint_months or stop == months:
+                arrays = {name: np.asarray(block[name], dtype=float) for name in MONTHLY}
+                arrays.update({name: np.asarray(block[name], dtype=float).reshape(-1, self.kølerum_template.steps) for name in LOGS})
+                checkpoint.save(manifest, block_start, stop, arrays)
+                block_start = stop
+                block = {name: [] for name in MONTHLY + LOGS}
+
+        results = self._new_stream(sketch_capacity)
+        costs = []
+        for arrays in checkpoint.blocks(manifest):
+            self._fold(results, {name: list(arrays[name]) for name in LOGS} | {name: arrays[name] for name in MONTHLY})
+            costs.append(arrays["monthly_total_costs"])
+        results["monthly_total_costs"] = np.concatenate(costs) if costs else np.empty(0)
+        return results
+
+    def resume(self, directory, sketch_capacity=200):
+        """Fortsætter en checkpointet kørsel med dens oprindelige antal måneder.
+
+        Args:
+            directory (str): checkpoint directory
+            sketch_capacity (int, optional): centroids in the quantile sketch. Defaults to 200.
+
+        Returns:
+            dict: see run_checkpointed
+        """
+        manifest = Checkpoint(directory).read_manifest()
+        return self.run_checkpointed(
+            manifest["months"],
+            directory,
+            manifest["sample_months"],
+            manifest["checkpoint_months"],
+            sketch_capacity,
+        )
+
+    def _new_stream(self, sketch_capacity):
+        """Tomme resultater til run_streaming og run_until."""
+        return {
+            "temperature_logs": [],
+            "electricity_logs": [],
+            "food_waste_logs": [],
+            "cost_stats": RunningStats(),
+            "electricity_stats": RunningStats(),
+            "food_waste_stats": RunningStats(),
+            "cost_sketch": QuantileSketch(sketch_capacity),
+        }
+
+    def _fold(self, results, chunk_data):
+        """Lægger en færdig blok ind i de løbende resultater."""
+        results["temperature_logs"].extend(chunk_data["temperature_logs"])
+        results["electricity_logs"].extend(chunk_data["electricity_logs"])
+        results["food_waste_logs"].extend(chunk_data["food_waste_logs"])
+        results["cost_stats"].add_many(chunk_data["monthly_total_costs"])
+        results["electricity_stats"].add_many(chunk_data["monthly_electricity_costs"])
+        results["food_waste_stats"].add_many(chunk_data["monthly_food_waste_costs"])
+        results["cost_sketch"].add_many(chunk_data["monthly_total_costs"])
+
+    def _resolve_seed(self):
+        """Giver det seed blokkene skal bruge."""
+        if self.seed is None and self.workers > 1:
+            # Uden seed kan processerne ikke dele det globale random modul
+            return np.random.SeedSequence().entropy
+        return self.seed
+
+    def _iter_chunks(self, months, sample_months=None, door_schedule=None, start=0, total=None, seed=None, states=False):
+        """Kører blokkene og giver dem i rækkefølge efterhånden som de bliver færdige.
+
+        Args:
+            months (int): måneden der stoppes før
+            sample_months (int, optional): måneder hvis logs beholdes. None beholder alle.
+            door_schedule (DoorSchedule, optional): dørens åbninger for alle måneder.
+            start (int, optional): første måned. Skal ligge på en blokgrænse så blokkene
+                får samme strøm som i en kørsel fra måned 0. Defaults to 0.
+            total (int, optional): antal måneder progress bar regner med. Defaults to months.
+            seed (int, optional): seed i stedet for self.seed. Defaults to None.
+            states (bool, optional): blokkene giver også state_logs, se simulate_chunk.
+                Defaults to False.
+
+        Raises:
+            ValueError: If door_schedule has fewer months than months.
+            ValueError: If start is not on a chunk boundary.
+
+        Yields:
+            tuple: start, stop og blokkens data
+        """
+        if door_schedule is not None and len(door_schedule) < months:
+            raise ValueError("door_schedule has fewer months than the simulation.")
+        size = self.chunk_size()
+        if start % size:
+            raise ValueError("start must be a multiple of the chunk size.")
+        seed = seed if seed is not None else self._resolve_seed()
+        total = total if total is not None else months
+        chunks = []
+        for first in range(start, months, size):
+            stop = min(first + size, months)
+            keep = None if sample_months is None else max(0, min(stop, sample_months) - first)
+            options = {
+                "engine": self.engine,
+                "seed_sequence": None if seed is None else chunk_seed(seed, first // size),
+                "keep": keep,
+                "door_method": self.door_method,
+                "door_schedule": None if door_schedule is None else door_schedule[first:stop],
+                "profile": self.profile is not None,
+                "states": states,
+            }
+            chunks.append((first, stop, options))
+
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                # Memory-mappede priser sendes som deres fil, så processerne deler page cachen
+                initargs=(dumps_mapped((
+                    self.kølerum_template.termostat,
+                    self.kølerum_template.energy_prices,
+                    room_options(self.kølerum_template),
+                )),),
+            )
+            try:
+                futures = [
+                    executor.submit(_simulate_chunk_in_worker, stop - start, **options)
+                    for start, stop, options in chunks
+                ]
+                # Blokkene gives i rækkefølge så resultatet ikke afhænger af workers
+                for (first, stop, _), future in zip(chunks, futures):
+                    chunk_data = self._collect_profile(future.result())
+                    yield first, stop, chunk_data
+                    self._update_progress(stop, total, chunk_data)
+            finally:
+                # Stoppes kørslen undervejs, fx af en annulleret job, startes ingen nye blokke
+                executor.shutdown(wait=True, cancel_futures=True)
+        else:
+            for first, stop, options in chunks:
+                chunk_data = simulate_chunk(
+                    self.kølerum_template.termostat,
+                    self.kølerum_template.energy_prices,
+                    stop - first,
+                    room=room_options(self.kølerum_template),
+                    **options,
+                )
+                yield first, stop, self._collect_profile(chunk_data)
+                self._update_progress(stop, total, chunk_data)
+
+    def _collect_profile(self, chunk_data):
+        """Lægger blokkens profil til den samlede profil."""
+        if "profile" in chunk_data:
+            self.profile.merge(chunk_data.pop("profile"))
+        return chunk_data
+
+    def _update_progress(self, done, months, chunk_data=None):
+        """Giver fremdrift til progress bar.
+
+        Har progress bar en chunk_done metode (se jobs.JobProgress) får den også
+        blokkens priser, så et løbende gennemsnit kan vises.
+        """
+        if self.progress_bar:
+            self.progress_bar.UpdateBar(min(100, done * 100 // months))
+            chunk_done = getattr(self.progress_bar, "chunk_done", None)
+            if chunk_done is not None and chunk_data is not None:
+                chunk_done(chunk_data["monthly_total_costs"])
 
 
 if __name__ == "__main__":
     """Kører en test af Monte Carlo-simuleringen."""
-    import csv
+    from price_series import PriceSeries
     from termostat import ThermostatSemiSmart
     import doctest
-    with open("elpris.csv") as elpris:
-        energy_prices = list(csv.DictReader(elpris))
+    energy_prices = PriceSeries.load("elpris.csv")
 
     monte_carlo = MonteCarlo(Kølerum(ThermostatSemiSmart(energy_prices), energy_prices))
-    
+
     print(monte_carlo.run_simulation(1)) # Mere data
     print(doctest.testmod())
-    
+
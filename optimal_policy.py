@@ -0,0 +1,236 @@
+"""Dette modul finder den billigste styring af kompressoren med dynamisk programmering.
+
+Temperaturen deles op i et gitter. Baglæns fra sidste step beregnes den
+forventede resterende pris for hver temperatur, både med kompressoren tændt
+og slukket, over dørens to udfald. Resultatet er en tabel med ét bool pr.
+step og gitterpunkt, som ThermostatOptimal slår op i. Tabellen gemmes på
+disken med en nøgle ud fra elpriserne og modellen, så den kun løses én gang.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from price_series import as_price_array
+
+# Kølerummets konstanter, de samme som i Kølerum og BatchKølerum
+MODEL = {
+    "t_rum": 20.0,  # Rumtemperatur
+    "t_komp": -5.0,  # Kompressorens køletemperatur
+    "delta_t": 300,  # Sekunder pr. step
+    "c_door_open": 3 * (10**-5),  # Varmeudveksling med åben dør, samme udtryk som i Kølerum
+    "c_door_closed": 5e-7,  # Varmeudveksling med lukket dør
+    "c_compressor": 8e-6,  # Kompressorens køleevne
+    "door_probability": 0.1,  # Chance for åben dør i et step
+    "power": 1.0,  # Elforbrug i forhold til Kølerum når kompressoren kører, se fleet
+}
+T_LOW = -2.0  # Laveste temperatur i gitteret
+T_HIGH = 14.0  # Højeste temperatur i gitteret
+POINTS = 321  # Gitterpunkter, 0.05 grader mellem hvert
+
+
+def food_waste(t, delta_t=300):
+    """Madspild i et step ved temperaturen t, som Kølerum.calculate_food_waste.
+
+    Args:
+        t (np.ndarray): temperaturer
+        delta_t (int, optional): sekunder pr. step. Defaults to 300.
+
+    Returns:
+        np.ndarray: madspild for hver temperatur
+
+    Examples:
+        >>> food_waste(np.array([3.0, 5.0, 7.0])).round(4).tolist()
+        [1.0094, 0.0, 0.9634]
+    """
+    t = np.asarray(t, dtype=float)
+    waste = np.where(t < 3.5, 4.39 * np.exp(-0.49 * t), np.where(t > 6.5, 0.11 * np.exp(0.31 * t), 0.0))
+    return waste * (delta_t / 300)
+
+
+def solve_policy(energy_prices, model=None, t_low=T_LOW, t_high=T_HIGH, points=POINTS, steps=None):
+    """Løser styringen baglæns fra sidste step.
+
+    I Kølerum betales madspild for temperaturen i step n, og kompressoren der
+    vælges i step n betales med prisen i step n + 1. Derfor er
+
+        V_n(T) = madspild(T) + min over u af E_dør[ u * pris(n + 1) + V_n+1(T') ]
+
+    hvor T' er temperaturen efter step n, og V_n+1 interpoleres lineært i gitteret.
+
+    Args:
+        energy_prices (PriceSeries): elpriserne, én pr. step
+        model (dict, optional): konstanter der afviger fra MODEL. Defaults to None.
+        t_low (float, optional): laveste temperatur i gitteret. Defaults to T_LOW.
+        t_high (float, optional): højeste temperatur i gitteret. Defaults to T_HIGH.
+        points (int, optional): antal gitterpunkter. Defaults to POINTS.
+        steps (int, optional): antal steps. Defaults to antallet af priser.
+
+    Raises:
+        ValueError: If there are fewer prices than steps.
+
+    Returns:
+        tuple: (policy, value) hvor policy er bool af formen (steps, points) og
+            value er den forventede pris fra step 0 for hvert gitterpunkt
+
+    Examples:
+        >>> grid = np.linspace(T_LOW, T_HIGH, POINTS)
+        >>> free, _ = solve_policy(np.zeros(50))
+        >>> bool(free[0, np.searchsorted(grid, 7.0)]), bool(free[0, np.searchsorted(grid, 3.0)])
+        (True, False)
+        >>> expensive, _ = solve_policy(np.full(50, 1e6))
+        >>> bool(expensive[0, np.searchsorted(grid, 7.0)])
+        False
+    """
+    model = {**MODEL, **(model or {})}
+    prices = as_price_array(energy_prices)
+    steps = prices.size if steps is None else steps
+    if prices.size < steps:
+        raise ValueError("energy_prices has fewer prices than steps.")
+    grid = np.linspace(t_low, t_high, points)
+    delta_t = model["delta_t"]
+    scale = delta_t / 300  # Priserne er pr. 5 minutter, se Kølerum
+
+    # Temperaturen efter et step for de fire kombinationer af dør og kompressor
+    next_t = {}
+    for door, c_1 in ((True, model["c_door_open"]), (False, model["c_door_closed"])):
+        for compressor, c_2 in ((True, model["c_compressor"]), (False, 0.0)):
+            next_t[door, compressor] = grid + (
+                c_1 * (model["t_rum"] - grid) + c_2 * (model["t_komp"] - grid)
+            ) * delta_t
+    p = model["door_probability"]
+    waste = food_waste(grid, delta_t)
+
+    policy = np.empty((steps, points), dtype=bool)
+    value = np.zeros(points)
+    for n in range(steps - 1, -1, -1):
+        expected = {
+            compressor: p * np.interp(next_t[True, compressor], grid, value)
+            + (1 - p) * np.interp(next_t[False, compressor], grid, value)
+            for compressor in (True, False)
+        }
+        price = prices.item(n + 1) * scale * model["power"] if n + 1 < steps else 0.0
+        on = expected[True] + price < expected[False]
+        policy[n] = on
+        value = waste + np.where(on, expected[True] + price, expected[False])
+    return policy, value
+
+
+def room_model(kølerum):
+    """Modellen for et kølerum, så styringen løses for det rum den skal styre.
+
+    Args:
+        kølerum (Kølerum): kølerummet
+
+    Raises:
+        ValueError: If the room has an ambient series, since the model needs a constant t_rum.
+
+    Returns:
+        dict: konstanterne til solve_policy
+
+    Examples:
+        >>> from kølerum import Kølerum
+        >>> room_model(Kølerum(thermostat=None, energy_prices=[], delta_t=60)) == {**MODEL, "delta_t": 60}
+        True
+    """
+    if kølerum.ambient is not None:
+        raise ValueError("The optimal policy needs a constant t_rum, not an ambient series.")
+    c_door_open, c_compressor = kølerum.decide_constants(True, True)
+    c_door_closed, _ = kølerum.decide_constants(False, False)
+    return {
+        **MODEL,
+        "t_rum": float(kølerum.t_rum),
+        "t_komp": float(kølerum.t_komp),
+        "delta_t": kølerum.delta_t,
+        "c_door_open": float(c_door_open),
+        "c_door_closed": float(c_door_closed),
+        "c_compressor": float(c_compressor),
+    }
+
+
+def grid_index(t, points=POINTS):
+    """Nærmeste gitterpunkt for temperaturer, halve punkter rundes op.
+
+    Args:
+        t (np.ndarray): temperaturer
+        points (int, optional): antal gitterpunkter. Defaults to POINTS.
+
+    Returns:
+        np.ndarray: indekser i gitteret, begrænset til gitteret
+
+    Examples:
+        >>> grid_index(np.array([-5.0, T_LOW + 0.125, 5.0, 99.0])).tolist()
+        [0, 3, 140, 320]
+    """
+    scale = (points - 1) / (T_HIGH - T_LOW)  # Gitterpunkter pr. grad
+    # np.rint runder halve til lige tal, hvilket ikke passer med den skalare version
+    return np.clip(np.floor((np.asarray(t) - T_LOW) * scale + 0.5), 0, points - 1).astype(np.intp)
+
+
+def policy_key(energy_prices, model=None, t_low=T_LOW, t_high=T_HIGH, points=POINTS, steps=None):
+    """Nøgle for en tabel ud fra elprisernes hash, modellen og gitteret.
+
+    Returns:
+        str: hex nøgle
+
+    Examples:
+        >>> policy_key(np.ones(3)) == policy_key(np.ones(3)), policy_key(np.ones(3)) == policy_key(np.ones(4))
+        (True, False)
+    """
+    prices = np.ascontiguousarray(as_price_array(energy_prices), dtype=np.float64)
+    description = {
+        "prices": hashlib.sha256(prices).hexdigest(),
+        "model": {**MODEL, **(model or {})},
+        "grid": [t_low, t_high, points],
+        "steps": prices.size if steps is None else steps,
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+
+def load_policy(energy_prices, model=None, t_low=T_LOW, t_high=T_HIGH, points=POINTS, steps=None, cache_dir=".cache/policies"):
+    """Giver tabellen fra cachen, eller løser den og gemmer den.
+
+    Args:
+        energy_prices (PriceSeries): elpriserne
+        model, t_low, t_high, points, steps: se solve_policy
+        cache_dir (str, optional): mappe til tabellerne. None gemmer ikke. Defaults to ".cache/policies".
+
+    Returns:
+        np.ndarray: policy af formen (steps, points), memory-mappet fra cachen
+    """
+    if cache_dir is None:
+        return solve_policy(energy_prices, model, t_low, t_high, points, steps)[0]
+    cache_dir = Path(cache_dir)
+    key = policy_key(energy_prices, model, t_low, t_high, points, steps)
+    path = cache_dir / f"{key[:32]}.policy.npy"
+    try:
+        return np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        pass
+    policy = solve_policy(energy_prices, model, t_low, t_high, points, steps)[0]
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # Skriver til en midlertidig fil først så en halv tabel aldrig kan læses
+    tmp_path = path.with_name(path.name + f".{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as handle:
+        np.save(handle, policy)
+    os.replace(tmp_path, path)
+    return np.load(path, mmap_mode="r")
+
+
+if __name__ == "__main__":
+    """Løser styringen for elpris.csv, viser tiden og kører doctest"""
+    import doctest
+    import time
+
+    from price_series import PriceSeries
+
+    energy_prices = PriceSeries.load("elpris.csv")
+    started = time.perf_counter()
+    policy, value = solve_policy(energy_prices, steps=8640)
+    grid = np.linspace(T_LOW, T_HIGH, POINTS)
+    print(f"Løst på {time.perf_counter() - started:.2f} s")
+    print(f"Forventet pris fra 5 grader: {np.interp(5.0, grid, value):.2f}")
+    print(doctest.testmod())
@@ -1,51 +1,402 @@
 """Dette modul styrer data for plottene og bliver importeret ind i main."""
 
 import numpy as np
-import pandas as pd
 from matplotlib import pyplot as plt
 
+from comparison import paired_difference
+from door_schedule import DOOR_PROBABILITY, DoorSchedule
+from jobs import StageProgress
+from downsample import lttb
+from kølerum import DELTA_T, STEPS
+
+# Sekunder i hver periode for rollups. Antal steps afhænger af delta_t
+PERIOD_SECONDS = {"hour": 3600, "day": 24 * 3600, "week": 7 * 24 * 3600, "month": STEPS * DELTA_T}
+# Sekunder i hvert plots varighed. En plot-måned er 30 dage ligesom før
+DURATION_SECONDS = {"day": 24 * 3600, "week": 7 * 24 * 3600, "month": 30 * 24 * 3600}
+
+
+class ThermostatResults:
+    def __init__(self, temperature, electricity, food_waste, delta_t=DELTA_T):
+        """Logs for én termostat som 2-D arrays med én række pr. måned.
+
+        Månedlige totaler beregnes med det samme. Kumulerede summer og rollups
+        beregnes første gang de bruges og gemmes, så plottene kun skal slice.
+        Logs kan også være TraceColumn fra en TraceStore, så læses kun de
+        måneder der bruges, se from_store.
+
+        Args:
+            temperature (np.ndarray): temperaturer af formen (months, steps)
+            electricity (np.ndarray): elpris pr. step af formen (months, steps)
+            food_waste (np.ndarray): madspild pr. step af formen (months, steps)
+            delta_t (float, optional): sekunder pr. step. Defaults to DELTA_T.
+
+        Examples:
+            >>> logs = np.ones((2, 576))
+            >>> results = ThermostatResults(logs * 5, logs, logs * 0.5)
+            >>> results.monthly_total.tolist(), results.cumsum("electricity")[-1].item()
+            ([864.0, 864.0], 576.0)
+            >>> results.rollup("food_waste", "day").tolist()
+            [[144.0, 144.0], [144.0, 144.0]]
+            >>> results.rollup("temperature", "day", "mean")[0].tolist()
+            [5.0, 5.0]
+            >>> ThermostatResults(logs[:, :120], logs[:, :120], logs[:, :120], delta_t=60).rollup("electricity", "hour")[0].tolist()
+            [60.0, 60.0]
+        """
+        self.temperature = temperature  # Temperaturer
+        self.electricity = electricity  # Elpris pr. step
+        self.food_waste = food_waste  # Madspild pr. step
+        self.months, self.steps = temperature.shape  # Måneder med logs og steps pr. måned
+        self.delta_t = delta_t  # Sekunder pr. step
+        self.monthly_electricity = electricity.sum(axis=1)  # Elpris pr. måned
+        self.monthly_food_waste = food_waste.sum(axis=1)  # Madspild pr. måned
+        self.monthly_total = self.monthly_electricity + self.monthly_food_waste  # Samlet pris pr. måned
+        self._cache = {}  # Beregnede cumsums og rollups
+
+    @classmethod
+    def from_logs(cls, data, delta_t=DELTA_T):
+        """Stabler logs fra MonteCarlo til arrays.
+
+        Args:
+            data (dict): temperature_logs, electricity_logs og food_waste_logs som lister
+                af arrays, en pr. måned
+            delta_t (float, optional): sekunder pr. step. Defaults to DELTA_T.
+
+        Returns:
+            ThermostatResults: resultaterne
+        """
+        def stack(logs):
+            if isinstance(logs, np.ndarray) and logs.ndim == 2:
+                return logs
+            return np.array(logs, dtype=np.float64).reshape(len(logs), -1)
+
+        return cls(
+            stack(data["temperature_logs"]),
+            stack(data["electricity_logs"]),
+            stack(data["food_waste_logs"]),
+            delta_t,
+        )
+
+    @classmethod
+    def from_store(cls, store):
+        """Læser logs lazy fra en TraceStore.
+
+        Args:
+            store (TraceStore): mappen med logs
+
+        Returns:
+            ThermostatResults: resultaterne
+        """
+        return cls(
+            store.column("temperature"),
+            store.column("electricity"),
+            store.column("food_waste"),
+            store.delta_t,
+        )
+
+    def cumsum(self, name, month=0):
+        """Den kumulerede sum af en log for en måned.
+
+        Args:
+            name (str): "electricity", "food_waste" eller "temperature"
+            month (int, optional): måneden. Defaults to 0.
+
+        Returns:
+            np.ndarray: den kumulerede sum pr. step
+        """
+        key = ("cumsum", name, month)
+        if key not in self._cache:
+            self._cache[key] = np.cumsum(getattr(self, name)[month], dtype=np.float64)
+        return self._cache[key]
+
+    def step_costs(self, month=0):
+        """Samlet pris (el plus madspild) for hvert step i en måned.
+
+        Args:
+            month (int, optional): måneden. Defaults to 0.
+
+        Returns:
+            np.ndarray: pris pr. step
+        """
+        key = ("step_costs", month)
+        if key not in self._cache:
+            self._cache[key] = np.add(self.electricity[month], self.food_waste[month], dtype=np.float64)
+        return self._cache[key]
+
+    def rollup(self, name, period, how="sum"):
+        """Summerer eller middelværdier en log over perioder for alle måneder.
+
+        Den sidste periode kan være kortere, fx er en måned 4 uger og 2 dage.
+        Er perioden kortere end et step bruges ét step.
+
+        Args:
+            name (str): "electricity", "food_waste" eller "temperature"
+            period (str): "hour", "day", "week" eller "month"
+            how (str, optional): "sum" eller "mean". Defaults to "sum".
+
+        Returns:
+            np.ndarray: array af formen (months, perioder)
+        """
+        key = ("rollup", name, period, how)
+        if key not in self._cache:
+            starts = np.arange(0, self.steps, max(1, round(PERIOD_SECONDS[period] / self.delta_t)))
+            log = getattr(self, name)
+            # En TraceColumn læses én fil ad gangen
+            block = max(1, getattr(log, "chunk_months", self.months))
+            values = np.concatenate([
+                np.add.reduceat(np.asarray(log[first:first + block], dtype=np.float64), starts, axis=1)
+                for first in range(0, self.months, block)
+            ] or [np.empty((0, starts.size))])
+            if how == "mean":
+                values = values / np.diff(np.append(starts, self.steps))
+            self._cache[key] = values
+        return self._cache[key]
+
+
 
 class CoolingPlotter:
-    def __init__(self, months=10, progress_bar=None, kølerum_simple=None, kølerum_smart=None, monte_carlo_class=None):
+    def __init__(self, months=10, progress_bar=None, kølerum_simple=None, kølerum_smart=None, monte_carlo_class=None, engine="scalar", seed=None, workers=1, streaming=False, sample_months=1, paired=False, antithetic=False, precision=None, cache=None, traces=None):
         """Forbereder data til plottene.
 
         Args:
             months (int, optional): amount of months to simulate. Defaults to 10.
-            progress_bar (sg.ProgressBar, optional): to track progress of the simulation. Defaults to None.
+            progress_bar (sg.ProgressBar, optional): to track progress of the simulation. The simple
+                run fills the first half and the smart run the second half. Defaults to None.
             monte_carlo_class (class, optional): an instance of the montecarlo class. Defaults to None.
-        """
+            engine (str, optional): "scalar" or "batch" engine for monte carlo. Defaults to "scalar".
+            seed (int, optional): seed for reproducible runs. Defaults to None.
+            workers (int, optional): processes to spread the months over. Defaults to 1.
+            streaming (bool, optional): only keep logs for sample_months and fold the rest
+                into running statistics. Defaults to False.
+            sample_months (int, optional): months with full logs when streaming. Defaults to 1.
+            paired (bool, optional): both thermostats see the same door schedule in month i and
+                the paired cost difference is stored in cost_difference. Defaults to False.
+            antithetic (bool, optional): draw the paired door schedules in antithetic pairs.
+                Defaults to False.
+            precision (float, optional): stop each run once the 95% interval of the mean
+                monthly cost is this narrow, with months as the upper limit. Implies
+                streaming. Defaults to None.
+            cache (ResultCache, optional): take seeded runs from an on-disk result cache.
+                Implies streaming. Defaults to None.
+            traces (tuple, optional): TraceStore for simple and smart. Nothing is simulated,
+                and the plots read only the months and steps they show from the stores.
+                Defaults to None.
 
+        Raises:
+            ValueError: If paired is combined with streaming, precision or cache.
+            ValueError: If traces is combined with paired.
+        """
+        if traces is not None:
+            if paired:
+                raise ValueError("Paired comparison needs a simulation. Use traces=None.")
+            simple_store, smart_store = traces
+            self.delta_t = simple_store.delta_t  # Sekunder pr. step
+            self.simple = ThermostatResults.from_store(simple_store)  # Lazy logs for simple
+            self.smart = ThermostatResults.from_store(smart_store)  # Lazy logs for smart
+            self.cost_difference = None
+            self.months_simple = self.simple.months
+            self.months_smart = self.smart.months
+            self.simple_average = float(self.simple.monthly_total.mean())
+            self.smart_average = float(self.smart.monthly_total.mean())
+            self.x_hours = np.arange(self.simple.steps) * (self.delta_t / 3600)
+            self._views = {}
+            return
+
+        streaming = streaming or precision is not None or cache is not None
+        if paired and streaming:
+            raise ValueError("Paired comparison needs the monthly costs. Use streaming=False.")
+
+        progress_simple = progress_smart = None
+        if progress_bar is not None:
+            # Begge kørsler deler baren, så den kun fyldes én gang
+            progress_simple = StageProgress(progress_bar, 0, 50, "simple")
+            progress_smart = StageProgress(progress_bar, 50, 50, "smart")
         mc_simple = monte_carlo_class(
-            kølerum_simple, progress_bar)  # Monte Carlo for simple
+            kølerum_simple, progress_simple, engine=engine, seed=seed, workers=workers)  # Monte Carlo for simple
         mc_smart = monte_carlo_class(
-            kølerum_smart, progress_bar)  # Monte Carlo for smart
+            kølerum_smart, progress_smart, engine=engine, seed=seed, workers=workers)  # Monte Carlo for smart
 
-        self.simple_data = mc_simple.run_simulation(
-            months)  # Simulerer for simple
-        self.smart_data = mc_smart.run_simulation(
-            months)  # Simulerer for smart
+        door_schedule = None
+        self.cost_difference = None  # Parret forskel simple - smart
+        if paired:
+            door_schedule = DoorSchedule.generate(
+                months, np.random.default_rng(seed), steps=kølerum_simple.steps, method="bernoulli", antithetic=antithetic
+            )
 
-        self.df_data_simple = pd.DataFrame(
-            self.simple_data)  # Dataframe for simple
-        self.df_data_smart = pd.DataFrame(
-            self.smart_data)  # Dataframe for smart
+        if precision is not None:
+            simple_stream = mc_simple.run_until(
+                precision, max_months=months, sample_months=sample_months)  # Simulerer for simple
+            smart_stream = mc_smart.run_until(
+                precision, max_months=months, sample_months=sample_months)  # Simulerer for smart
+        elif cache is not None:
+            simple_stream = cache.run(
+                mc_simple, months, sample_months)  # Simulerer for simple
+            smart_stream = cache.run(
+                mc_smart, months, sample_months)  # Simulerer for smart
+        elif streaming:
+            simple_stream = mc_simple.run_streaming(
+                months, sample_months)  # Simulerer for simple
+            smart_stream = mc_smart.run_streaming(
+                months, sample_months)  # Simulerer for smart
+        if streaming:
+            log_keys = ("temperature_logs", "electricity_logs", "food_waste_logs")
+            simple_data = {key: simple_stream[key] for key in log_keys}
+            smart_data = {key: smart_stream[key] for key in log_keys}
+        else:
+            simple_data = mc_simple.run_simulation(
+                months, door_schedule)  # Simulerer for simple
+            smart_data = mc_smart.run_simulation(
+                months, door_schedule)  # Simulerer for smart
+
+        self.delta_t = kølerum_simple.delta_t  # Sekunder pr. step
+        self.simple = ThermostatResults.from_logs(simple_data, self.delta_t)  # Arrays for simple
+        self.smart = ThermostatResults.from_logs(smart_data, self.delta_t)  # Arrays for smart
+
+        # Antal simulerede måneder (kan være færre end months med precision)
+        self.months_simple = months
+        self.months_smart = months
+        if streaming:
+            # Gennemsnittet skal være over alle måneder, ikke kun dem med logs
+            self.simple_average = simple_stream["cost_stats"].mean
+            self.smart_average = smart_stream["cost_stats"].mean
+            self.months_simple = simple_stream["cost_stats"].count
+            self.months_smart = smart_stream["cost_stats"].count
+        else:
+            self.simple_average = float(self.simple.monthly_total.mean())
+            self.smart_average = float(self.smart.monthly_total.mean())
+
+        if paired:
+            # Døråbninger som control variate, da deres forventning er kendt
+            self.cost_difference = paired_difference(
+                mc_simple.monthly_total_costs,
+                mc_smart.monthly_total_costs,
+                door_counts=door_schedule.open_counts(),
+                expected_count=door_schedule.steps * DOOR_PROBABILITY,
+                antithetic=antithetic,
+            )
 
-        self.df_data_simple_average = (
-            self.df_data_simple["electricity_logs"].apply(sum).mean() +
-            self.df_data_simple["food_waste_logs"].apply(sum).mean()
-        )
+        # Ville gerne have dataet vist i steps af timer da dette er mere overskueligt
+        self.x_hours = np.arange(self.simple.steps) * (self.delta_t / 3600)
+        self._views = {}  # Beregnede views, se view
 
-        self.df_data_smart_average = (
-            self.df_data_smart["electricity_logs"].apply(sum).mean() +
-            self.df_data_smart["food_waste_logs"].apply(sum).mean()
-        )
+    def view(self, name, duration="week", type="simple", max_points=None):
+        """Beregner det et plot skal vise, uden at tegne noget.
 
-        # Antal steps
-        num_steps = len(self.df_data_simple["electricity_logs"][0])
+        Resultatet gemmes, så det kun beregnes én gang for hver kombination.
 
-        # Ville gerne have dataet vist i steps af timer da dette er mere overskueligt
-        self.x_hours = np.arange(num_steps) / 12
+        Args:
+            name (str): "electricity_cumsum", "food_waste_cumsum", "temperature" eller "histogram"
+            duration (str, optional): day, week or month. Defaults to "week".
+            type (str, optional): thermostat for temperature. Defaults to "simple".
+            max_points (int, optional): skær linjer ned til så mange punkter med LTTB, fx
+                canvas bredden i pixels. None beholder alle. Defaults to None.
 
+        Raises:
+            ValueError: If name is not a known view.
+            ValueError: If duration is not valid for the view.
+            ValueError: If type is not 'simple' or 'smart'.
+
+        Returns:
+            dict: title, xlabel, ylabel, lines, hists, text, legend og grid
+        """
+        key = (name, duration, type, max_points)
+        if key in self._views:
+            return self._views[key]
+
+        if name in ("electricity_cumsum", "food_waste_cumsum"):
+            log = name.removesuffix("_cumsum")
+            label = "elforbrug" if log == "electricity" else "madspild"
+            if duration == "day":
+                title = f"Akkumuleret {label} over én dag"
+            elif duration == "week":
+                title = f"Akkumuleret {label} over en uge(168 timer)"
+            elif duration == "month":
+                title = f"Akkumuleret {label} over en måned"
+            else:
+                raise ValueError("Invalid duration. Use 'day', 'week' or 'month'.")
+            end_index = self._duration_steps(duration)
+            simple_data_cumsum = self.simple.cumsum(log)[:end_index]
+            smart_data_cumsum = self.smart.cumsum(log)[:end_index]
+            view = {
+                "title": title,
+                "xlabel": "Timer",
+                "ylabel": f"Akkumuleret {label}",
+                "lines": [
+                    self._line(simple_data_cumsum, max_points, label="Simple", color="blue", linewidth=2),
+                    self._line(smart_data_cumsum, max_points, label="Smart", color="orange", linewidth=2, linestyle="--"),
+                ],
+                "hists": [],
+                "text": (
+                    f"Total (Simple): {simple_data_cumsum[-1]:.2f}\n"
+                    f"Total (Smart): {smart_data_cumsum[-1]:.2f}"
+                ),
+                "legend": "upper left",
+                "grid": {"visible": True, "linestyle": "--", "alpha": 0.7},
+            }
+        elif name == "temperature":
+            if duration == "day":
+                title = "Temperaturændringer over én dag"
+            elif duration == "week":
+                title = "Temperaturændringer over en uge"
+            else:
+                raise ValueError("Invalid duration. Use 'day' or 'week'.")
+            if type == "simple":
+                temperature = self.simple.temperature[0]
+            elif type == "smart":
+                temperature = self.smart.temperature[0]
+            else:
+                raise ValueError("Invalid type. Use 'simple' or 'smart'.")
+            view = {
+                "title": title + f" ({type.capitalize()})",
+                "xlabel": "Timer",
+                "ylabel": "Temperatur (°C)",
+                "lines": [self._line(temperature[:self._duration_steps(duration)], max_points, color="C0")],
+                "hists": [],
+                "text": None,
+                "legend": None,
+                "grid": {"visible": True},
+            }
+        elif name == "histogram":
+            simple_costs = self.simple.step_costs()
+            smart_costs = self.smart.step_costs()
+            total_simple = self.simple.monthly_total[0]
+            total_smart = self.smart.monthly_total[0]
+            mean_simple = total_simple / simple_costs.size
+            mean_smart = total_smart / smart_costs.size
+            view = {
+                "title": "Histogram af totalpris for en måned",
+                "xlabel": "DKK",
+                "ylabel": "Frekvens",
+                "lines": [],
+                "hists": [
+                    (*np.histogram(simple_costs, bins=30), {"label": "Simple", "color": "blue"}),
+                    (*np.histogram(smart_costs, bins=30), {"label": "Smart", "color": "orange"}),
+                ],
+                "text": (
+                    f"Simple:\n"
+                    f"  Total: {total_simple:.2f}\n"
+                    f"  Median: {mean_simple:.2f}\n\n"
+                    f"Smart:\n"
+                    f"  Total: {total_smart:.2f}\n"
+                    f"  Median: {mean_smart:.2f}"
+                ),
+                "legend": "best",
+                "grid": {"visible": True, "axis": "y", "linestyle": "--", "alpha": 0.7},
+            }
+        else:
+            raise ValueError("Invalid view. Use 'electricity_cumsum', 'food_waste_cumsum', 'temperature' or 'histogram'.")
+        self._views[key] = view
+        return view
+
+    def _duration_steps(self, duration):
+        """Antal steps i et plots varighed med kørslens delta_t."""
+        return max(1, round(DURATION_SECONDS[duration] / self.delta_t))
+
+    def _line(self, y, max_points, **style):
+        """En linje over timer, evt. skåret ned med LTTB."""
+        x = self.x_hours[:y.size]
+        if max_points is not None:
+            x, y = lttb(x, y, max_points)
+        return x, y, style
 
     def plot_electricity_cumsum(self, duration="week"):
         """Returnerer et plot for akkumuleret elforbrug for en uge, dag eller måned.
@@ -59,65 +410,10 @@ class CoolingPlotter:
         Returns:
             fig: a figure for the plot
         """
-        simple_data_cumsum = np.asarray(
-            self.df_data_simple["electricity_logs"][0]
-        ).cumsum()
-        smart_data_cumsum = np.asarray(
-            self.df_data_smart["electricity_logs"][0]
-        ).cumsum()
-
-        if duration == "day":
-            end_index = 24 * 12
-            title = "Akkumuleret elforbrug over én dag"
-        elif duration == "week":
-            end_index = 24 * 12 * 7
-            title = "Akkumuleret elforbrug over en uge(168 timer)"
-        elif duration == "month":
-            end_index = 24 * 12 * 30
-            title = "Akkumuleret elforbrug over en måned"
-        else:
-            raise ValueError("Invalid duration. Use 'day', 'week' or 'month'.")
-
-        fig, ax = plt.subplots(figsize=(10, 6))
-        ax.plot(
-            self.x_hours[:end_index],
-            simple_data_cumsum[:end_index],
-            label="Simple",
-            linewidth=2,
-            color="blue",
-        )
-        ax.plot(
-            self.x_hours[:end_index],
-            smart_data_cumsum[:end_index],
-            label="Smart",
-            linewidth=2,
-            color="orange",
-            linestyle="--",
-        )
-        # Calculate totals
-        total_simple = simple_data_cumsum[end_index - 1]
-        total_smart = smart_data_cumsum[end_index - 1]
-
-        # Add totals as text in the top-right corner
-        ax.text(
-            0.95,
-            0.95,
-            f"Total (Simple): {total_simple:.2f}\nTotal (Smart): {total_smart:.2f}",
-            transform=ax.transAxes,
-            fontsize=10,
-            verticalalignment="top",
-            horizontalalignment="right",
-            bbox=dict(boxstyle="round", facecolor="white", alpha=0.8),
-        )
-        ax.set_title(title)
-        ax.set_xlabel("Timer")
-        ax.set_ylabel("Akkumuleret elforbrug")
-        ax.legend(loc="upper left")
-        ax.grid(True, linestyle="--", alpha=0.7)
-        return fig
+        return PlotCanvas().show(self.view("electricity_cumsum", duration))
 
     def plot_food_waste_cumsum(self, duration="week"):
-        """Returnerer et plot for akkumuleret elforbrug for en uge, dag eller måned.
+        """Returnerer et plot for akkumuleret madspild for en uge, dag eller måned.
 
         Args:
             duration (str, optional): week, day or month. Defaults to "week"
@@ -128,63 +424,7 @@ class CoolingPlotter:
         Returns:
             fig: a figure for the plot
         """
-        simple_data_cumsum = np.asarray(
-            self.df_data_simple["food_waste_logs"][0]
-        ).cumsum()
-        smart_data_cumsum = np.asarray(
-            self.df_data_smart["food_waste_logs"][0]
-        ).cumsum()
-
-        if duration == "day":
-            end_index = 24 * 12
-            title = "Akkumuleret madspild over én dag"
-        elif duration == "week":
-            end_index = 24 * 12 * 7
-            title = "Akkumuleret madspild over en uge(168 timer)"
-        elif duration == "month":
-            end_index = 24 * 12 * 30
-            title = "Akkumuleret madspild over en måned"
-        else:
-            raise ValueError("Invalid duration. Use 'day', 'week' or 'month'.")
-
-        fig, ax = plt.subplots(figsize=(10, 6))
-        ax.plot(
-            self.x_hours[:end_index],
-            simple_data_cumsum[:end_index],
-            label="Simple",
-            linewidth=2,
-            color="blue",
-        )
-        ax.plot(
-            self.x_hours[:end_index],
-            smart_data_cumsum[:end_index],
-            label="Smart",
-            linewidth=2,
-            color="orange",
-            linestyle="--",
-        )
-        # Calculate totals
-        total_simple = simple_data_cumsum[end_index - 1]
-        total_smart = smart_data_cumsum[end_index - 1]
-
-        # Add totals as text in the top-right corner
-        ax.text(
-            0.95,
-            0.95,
-            f"Total (Simple): {total_simple:.2f}\nTotal (Smart): {total_smart:.2f}",
-            transform=ax.transAxes,
-            fontsize=10,
-            verticalalignment="top",
-            horizontalalignment="right",
-            bbox=dict(boxstyle="round", facecolor="white", alpha=0.8),
-        )
-        ax.set_title(title)
-        ax.set_xlabel("Timer")
-        ax.set_ylabel("Akkumuleret elforbrug")
-        ax.legend(loc="upper left")
-        ax.grid(True, linestyle="--", alpha=0.7)
-        return fig
-
+        return PlotCanvas().show(self.view("food_waste_cumsum", duration))
 
     def plot_temperature(self, duration="week", type="simple"):
         """Returnerer et plot for temperaturændringer over en dag eller uge.
@@ -200,35 +440,7 @@ class CoolingPlotter:
         Returns:
             fig: a figure for the plot
         """
-        simple_data_temperature = np.asarray(
-            self.df_data_simple["temperature_logs"][0])
-        smart_data_temperature = np.asarray(
-            self.df_data_smart["temperature_logs"][0])
-
-        if duration == "day":
-            end_index = 24 * 12  # 60/5 = 12
-            title = "Temperaturændringer over én dag"
-        elif duration == "week":
-            end_index = 24 * 12 * 7
-            title = "Temperaturændringer over en uge"
-        else:
-            raise ValueError("Invalid duration. Use 'day' or 'week'.")
-
-        fig, ax = plt.subplots(figsize=(10, 6))
-        if type == "simple":
-            ax.plot(self.x_hours[:end_index],
-                    simple_data_temperature[:end_index])
-        elif type == "smart":
-            ax.plot(self.x_hours[:end_index],
-                    smart_data_temperature[:end_index])
-        else:
-            raise ValueError("Invalid type. Use 'simple' or 'smart'.")
-
-        ax.set_title(title + f" ({type.capitalize()})")
-        ax.set_xlabel("Timer")
-        ax.set_ylabel("Temperatur (°C)")
-        ax.grid(True)
-        return fig
+        return PlotCanvas().show(self.view("temperature", duration, type))
 
     def plot_histogram_cost(self):
         """Returnerer et histogram for totalpris for en måned.
@@ -236,64 +448,103 @@ class CoolingPlotter:
         Returns:
             fig: a figure for the plot
         """
-        simple_costs = [
-            e + f
-            for e, f in zip(
-                self.df_data_simple["electricity_logs"][0],
-                self.df_data_simple["food_waste_logs"][0],
-            )
-        ]
-        smart_costs = [
-            e + f
-            for e, f in zip(
-                self.df_data_smart["electricity_logs"][0],
-                self.df_data_smart["food_waste_logs"][0],
-            )
-        ]
+        return PlotCanvas().show(self.view("histogram"))
+
+
+class PlotCanvas:
+    def __init__(self, figure=None):
+        """Én figur hvis linjer og søjler genbruges når der skiftes plot.
 
-        fig, ax = plt.subplots(figsize=(10, 6))
-        ax.hist(simple_costs, bins=30, alpha=0.7, color="blue", label="Simple")
-        ax.hist(smart_costs, bins=30, alpha=0.7, color="orange", label="Smart")
-        total_simple = sum(simple_costs)
-        total_smart = sum(smart_costs)
-        mean_simple = total_simple / len(simple_costs)
-        mean_smart = total_smart / len(smart_costs)
+        I stedet for at lave en ny figur for hvert plot sættes nye data på de
+        eksisterende linjer, så GUI'en kun skal tegne figuren igen.
 
-        ax.text(
+        Args:
+            figure (Figure, optional): figuren der tegnes i. Defaults to a new 10x6 figure.
+
+        Examples:
+            >>> canvas = PlotCanvas()
+            >>> view = {"title": "a", "xlabel": "x", "ylabel": "y", "lines": [(np.arange(3), np.ones(3), {})],
+            ...         "hists": [], "text": None, "legend": None, "grid": {"visible": True}}
+            >>> line = canvas.show(view).axes[0].lines[0]
+            >>> canvas.show(view | {"lines": [(np.arange(5), np.zeros(5), {})]}).axes[0].lines[0] is line
+            True
+            >>> plt.close(canvas.figure)
+        """
+        if figure is None:
+            figure, _ = plt.subplots(figsize=(10, 6))
+        self.figure = figure  # Figuren der genbruges
+        self.ax = figure.axes[0] if figure.axes else figure.add_subplot()
+        self.lines = []  # Linjer der kan genbruges
+        self.hists = []  # Søjler der kan genbruges
+        self.text = self.ax.text(
             0.95,
             0.95,
-            (
-                f"Simple:\n"
-                f"  Total: {total_simple:.2f}\n"
-                f"  Median: {mean_simple:.2f}\n\n"
-                f"Smart:\n"
-                f"  Total: {total_smart:.2f}\n"
-                f"  Median: {mean_smart:.2f}"
-            ),
-            transform=ax.transAxes,
+            "",
+            transform=self.ax.transAxes,
             fontsize=10,
             verticalalignment="top",
             horizontalalignment="right",
             bbox=dict(boxstyle="round", facecolor="white", alpha=0.8),
+            zorder=5,
         )
-        ax.set_title("Histogram af totalpris for en måned")
-        ax.set_xlabel("DKK")
-        ax.set_ylabel("Frekvens")
-        ax.legend()
-        ax.grid(axis="y", linestyle="--", alpha=0.7)
-        return fig
+
+    def show(self, view):
+        """Viser et view fra CoolingPlotter.view i figuren.
+
+        Args:
+            view (dict): se CoolingPlotter.view
+
+        Returns:
+            Figure: figuren
+        """
+        ax = self.ax
+        while len(self.lines) < len(view["lines"]):
+            self.lines.append(ax.plot([], [])[0])
+        while len(self.hists) < len(view["hists"]):
+            self.hists.append(ax.stairs([0], [0, 1], fill=True, alpha=0.7))
+
+        for line, (x, y, style) in zip(self.lines, view["lines"]):
+            line.set_data(x, y)
+            line.set(
+                label=style.get("label", "_nolegend_"),
+                color=style.get("color", "C0"),
+                linewidth=style.get("linewidth", 1.5),
+                linestyle=style.get("linestyle", "-"),
+                visible=True,
+            )
+        for line in self.lines[len(view["lines"]):]:
+            line.set(visible=False, label="_nolegend_")
+        for hist, (counts, edges, style) in zip(self.hists, view["hists"]):
+            hist.set_data(counts, edges)
+            hist.set(label=style["label"], color=style["color"], visible=True)
+        for hist in self.hists[len(view["hists"]):]:
+            hist.set(visible=False, label="_nolegend_")
+
+        self.text.set_text(view["text"] or "")
+        self.text.set_visible(view["text"] is not None)
+        ax.set_title(view["title"])
+        ax.set_xlabel(view["xlabel"])
+        ax.set_ylabel(view["ylabel"])
+        ax.grid(False)
+        ax.grid(**view["grid"])
+        if ax.get_legend() is not None:
+            ax.get_legend().remove()
+        if view["legend"] is not None:
+            ax.legend(loc=view["legend"])
+        ax.relim(visible_only=True)
+        ax.autoscale_view()
+        return self.figure
 
 if __name__ == "__main__":
     """Kører bare igennem og plotter alle plottene."""
     import matplotlib.pyplot as plt
-    import csv
+    from price_series import PriceSeries
     from monte_carlo import MonteCarlo
     from kølerum import Kølerum
     from termostat import ThermostatSimple, ThermostatSemiSmart
 
 
-    with open("elpris.csv") as file:
-        energy_prices = list(csv.DictReader(file))
+    energy_prices = PriceSeries.load("elpris.csv")
 
     months = 10
 
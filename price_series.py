@@ -0,0 +1,320 @@
+"""Dette modul indlæser elpriserne én gang og gemmer dem som binære arrays.
+
+Første gang elpris.csv læses gemmes priser og tidspunkter som .npy filer i en
+cache mappe. Filnavnet indeholder CSV filens hash, så cachen bliver ugyldig
+når CSV filen ændres. Senere kørsler memory-mapper .npy filen direkte.
+
+CSV filen læses i blokke af rækker, og on_grid lægger en serie ud på
+simuleringens steps i blokke, så selv en lang serie med korte steps aldrig
+skal ligge i hukommelsen på én gang. Samme kode bruges til andre tidsserier,
+fx rumtemperaturen, ved at vælge en anden kolonne.
+"""
+
+import csv
+import hashlib
+import io
+import itertools
+import mmap
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+
+SOURCE_DELTA_T = 300  # Sekunder mellem rækkerne i elpris.csv
+CHUNK_ROWS = 1 << 16  # Rækker der behandles ad gangen
+IN_MEMORY_BYTES = 8 << 20  # Større serier på steps gemmes som memory-mappede filer
+CACHE_VERSION = 2  # Indgår i cachens filnavne, så caches med et gammelt indhold ikke læses
+
+
+def file_digest(path):
+    """Beregner sha256 af en fil.
+
+    Args:
+        path (str): stien til filen
+
+    Returns:
+        str: hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def as_price_array(energy_prices):
+    """Giver elpriserne som et float64 array uanset hvordan de er givet.
+
+    Args:
+        energy_prices (PriceSeries | np.ndarray | list): en PriceSeries, et array
+            eller rækker fra csv.DictReader med en "Pris" kolonne
+
+    Returns:
+        np.ndarray: priserne som float64
+
+    Examples:
+        >>> as_price_array([{"Tid": "2022-09-01 00:00:00", "Pris": "3.65"}])
+        array([3.65])
+        >>> as_price_array(np.array([1, 2]))
+        array([1., 2.])
+        >>> as_price_array([]).shape
+        (0,)
+    """
+    if isinstance(energy_prices, PriceSeries):
+        return energy_prices.prices
+    if isinstance(energy_prices, np.ndarray):
+        return energy_prices.astype(np.float64, copy=False)
+    return np.array([float(row["Pris"]) for row in energy_prices], dtype=np.float64)
+
+
+def _open_mapped(path):
+    """Åbner en .npy fil read-only med memory-map, se dumps_mapped."""
+    return np.load(path, mmap_mode="r")
+
+
+class _MappedPickler(pickle.Pickler):
+    def reducer_override(self, obj):
+        """Sender read-only memory-mappede .npy filer som deres sti i stedet for deres indhold."""
+        if (
+            isinstance(obj, np.memmap)
+            and obj.mode == "r"
+            and isinstance(obj.base, mmap.mmap)  # Hele filen, ikke et udsnit
+            and str(obj.filename).endswith(".npy")
+        ):
+            return _open_mapped, (obj.filename,)
+        return NotImplemented
+
+
+def dumps_mapped(obj):
+    """Pickler obj til en proces på samme maskine uden at kopiere cache filerne.
+
+    Memory-mappede cache filer, fx PriceSeries.load priserne, gemmes som deres
+    sti og åbnes igen med memory-map af pickle.loads. Processerne deler så
+    filen gennem page cachen i stedet for at have hver sin kopi. Brug almindelig
+    pickle til processer på andre maskiner.
+
+    Args:
+        obj (object): det der skal sendes
+
+    Returns:
+        bytes: obj pickled
+
+    Examples:
+        >>> import tempfile
+        >>> directory = tempfile.TemporaryDirectory()
+        >>> np.save(Path(directory.name) / "pris.npy", np.arange(1000.0))
+        >>> prices = np.load(Path(directory.name) / "pris.npy", mmap_mode="r")
+        >>> len(dumps_mapped(prices)) < 1000 < len(pickle.dumps(prices))
+        True
+        >>> loaded = pickle.loads(dumps_mapped({"prices": prices, "copy": np.array(prices[:2])}))
+        >>> type(loaded["prices"]).__name__, loaded["prices"].sum(), loaded["copy"].tolist()
+        ('memmap', np.float64(499500.0), [0.0, 1.0])
+        >>> del prices, loaded
+        >>> directory.cleanup()
+    """
+    with io.BytesIO() as buffer:
+        _MappedPickler(buffer, pickle.HIGHEST_PROTOCOL).dump(obj)
+        return buffer.getvalue()
+
+
+class PriceSeries:
+    def __init__(self, prices, times=None, digest=None, source=None):
+        """Elpriser som et sammenhængende float64 array med tidspunkter.
+
+        Args:
+            prices (np.ndarray): pris pr. step i DKK
+            times (np.ndarray, optional): tidspunkter som datetime64[s]. Defaults to None.
+            digest (str, optional): sha256 af kilde filen. Defaults to None.
+            source (str, optional): stien til kilde filen. Defaults to None.
+
+        Examples:
+            >>> series = PriceSeries(np.array([1.0, 2.0]))
+            >>> len(series), series[1]
+            (2, np.float64(2.0))
+        """
+        self.prices = prices  # Priser
+        self.times = times  # Tidspunkter
+        self.digest = digest  # Hash af CSV filen
+        self.source = source  # CSV filen
+
+    @classmethod
+    def from_csv(cls, path):
+        """Parser en CSV fil med kolonnerne Tid og Pris.
+
+        Args:
+            path (str): stien til CSV filen
+
+        Returns:
+            PriceSeries: de parsede priser
+        """
+        with open(path, newline="") as file:
+            rows = list(csv.DictReader(file))
+        prices = np.array([float(row["Pris"]) for row in rows], dtype=np.float64)
+        times = np.array([row["Tid"] for row in rows], dtype="datetime64[s]")
+        return cls(prices, times, file_digest(path), str(path))
+
+    @classmethod
+    def load(cls, path="elpris.csv", cache_dir=None, column="Pris"):
+        """Indlæser priserne fra cachen, eller parser CSV filen og gemmer cachen.
+
+        CSV filen læses i blokke af CHUNK_ROWS rækker direkte ned i cache filerne.
+
+        Args:
+            path (str, optional): stien til CSV filen. Defaults to "elpris.csv".
+            cache_dir (str, optional): mappe til cachen. Defaults to .cache ved siden af CSV filen.
+            column (str, optional): kolonnen med værdierne. Defaults to "Pris".
+
+        Returns:
+            PriceSeries: priserne, memory-mappet fra cachen
+
+        Examples:
+            >>> import tempfile
+            >>> directory = tempfile.TemporaryDirectory()
+            >>> csv_path = Path(directory.name) / "pris.csv"
+            >>> _ = csv_path.write_text("Tid,Pris\\n2024-01-01T00:00,3.0\\n2024-01-01T00:05,4.0\\n\\n")
+            >>> PriceSeries.load(csv_path).prices.tolist(), PriceSeries.from_csv(csv_path).prices.tolist()
+            ([3.0, 4.0], [3.0, 4.0])
+            >>> directory.cleanup()
+        """
+        path = Path(path)
+        cache_dir = Path(cache_dir) if cache_dir is not None else path.parent / ".cache"
+        digest = file_digest(path)
+        name = path.stem if column == "Pris" else f"{path.stem}-{column}"
+        prices_file = cache_dir / f"{name}-{digest[:16]}-v{CACHE_VERSION}.prices.npy"
+        times_file = cache_dir / f"{name}-{digest[:16]}-v{CACHE_VERSION}.times.npy"
+
+        series = cls._read_cache(prices_file, times_file)
+        if series is None:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            cls._write_cache(path, column, prices_file, times_file)
+            series = cls._read_cache(prices_file, times_file)
+        series.digest, series.source = digest, str(path)
+        return series
+
+    @staticmethod
+    def _write_cache(path, column, prices_file, times_file):
+        """Parser CSV filen i blokke ned i to .npy filer."""
+        # Rækkerne tælles med samme reader som de læses med, da den springer tomme linjer over
+        with open(path, newline="") as file:
+            rows = sum(1 for _ in csv.DictReader(file))
+        tmp_files = [file.with_name(file.name + f".{os.getpid()}.tmp") for file in (prices_file, times_file)]
+        prices = np.lib.format.open_memmap(tmp_files[0], mode="w+", dtype=np.float64, shape=(rows,))
+        times = np.lib.format.open_memmap(tmp_files[1], mode="w+", dtype="datetime64[s]", shape=(rows,))
+        with open(path, newline="") as file:
+            reader = csv.DictReader(file)
+            start = 0
+            while chunk := list(itertools.islice(reader, CHUNK_ROWS)):
+                stop = start + len(chunk)
+                prices[start:stop] = [float(row[column]) for row in chunk]
+                times[start:stop] = [row["Tid"] for row in chunk]
+                start = stop
+        prices.flush()
+        times.flush()
+        del prices, times
+        # Skriver til midlertidige filer først så en halv cache aldrig kan læses
+        os.replace(tmp_files[1], times_file)
+        os.replace(tmp_files[0], prices_file)
+
+    def source_delta_t(self):
+        """Sekunder mellem to værdier i serien, ud fra de to første tidspunkter.
+
+        Returns:
+            int: sekunder, SOURCE_DELTA_T hvis der ikke er tidspunkter
+        """
+        if self.times is None or len(self.times) < 2:
+            return SOURCE_DELTA_T
+        return int((self.times[1] - self.times[0]) / np.timedelta64(1, "s"))
+
+    def on_grid(self, delta_t, steps, cache_dir=None):
+        """Lægger serien ud på simuleringens steps.
+
+        Step n får værdien der gælder på tidspunktet n * delta_t (den seneste
+        værdi før, ikke interpoleret). Er serien kortere end horisonten
+        gentages den forfra. Store resultater skrives i blokke til en
+        memory-mappet fil i cachen, så hukommelsen ikke vokser med horisonten.
+
+        Args:
+            delta_t (int): sekunder pr. step
+            steps (int): antal steps
+            cache_dir (str, optional): mappe til store resultater. Defaults to .cache
+                ved siden af kilde filen.
+
+        Returns:
+            PriceSeries: værdien for hvert step
+
+        Examples:
+            >>> series = PriceSeries(np.array([1.0, 2.0, 3.0]))
+            >>> series.on_grid(60, 12).prices.tolist()
+            [1.0, 1.0, 1.0, 1.0, 1.0, 2.0, 2.0, 2.0, 2.0, 2.0, 3.0, 3.0]
+            >>> series.on_grid(600, 3).prices.tolist()
+            [1.0, 3.0, 2.0]
+        """
+        source_delta_t = self.source_delta_t()
+        if delta_t == source_delta_t and steps <= len(self.prices):
+            return PriceSeries(self.prices[:steps], None if self.times is None else self.times[:steps], self.digest, self.source)
+
+        if steps * 8 <= IN_MEMORY_BYTES or (self.source is None and cache_dir is None):
+            grid = np.empty(steps)
+        else:
+            cache_dir = Path(cache_dir) if cache_dir is not None else Path(self.source).parent / ".cache"
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            # Nøglen er værdierne selv, så forskellige kolonner fra samme fil ikke blandes
+            values_digest = hashlib.sha256(np.ascontiguousarray(self.prices, dtype=np.float64)).hexdigest()
+            grid_file = cache_dir / f"{values_digest[:16]}-{source_delta_t}s-{delta_t}s-{steps}.grid.npy"
+            try:
+                grid = np.load(grid_file, mmap_mode="r")
+                if grid.shape == (steps,) and grid.dtype == np.float64:
+                    return PriceSeries(grid, None, self.digest, self.source)
+            except (OSError, ValueError):
+                pass
+            tmp_file = grid_file.with_name(grid_file.name + f".{os.getpid()}.tmp")
+            grid = np.lib.format.open_memmap(tmp_file, mode="w+", dtype=np.float64, shape=(steps,))
+
+        for start in range(0, steps, CHUNK_ROWS):
+            n = np.arange(start, min(start + CHUNK_ROWS, steps), dtype=np.int64)
+            grid[start:start + n.size] = self.prices[n * delta_t // source_delta_t % len(self.prices)]
+
+        if isinstance(grid, np.memmap):
+            grid.flush()
+            del grid
+            os.replace(tmp_file, grid_file)
+            grid = np.load(grid_file, mmap_mode="r")
+        return PriceSeries(grid, None, self.digest, self.source)
+
+    @classmethod
+    def _read_cache(cls, prices_file, times_file):
+        """Læser og validerer cachen. Returnerer None hvis den mangler eller er ugyldig."""
+        if not (prices_file.exists() and times_file.exists()):
+            return None
+        try:
+            prices = np.load(prices_file, mmap_mode="r")
+            times = np.load(times_file, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if (
+            prices.ndim != 1
+            or prices.dtype != np.float64
+            or times.dtype != np.dtype("datetime64[s]")
+            or times.shape != prices.shape
+        ):
+            return None
+        return cls(prices, times)
+
+    def __len__(self):
+        return len(self.prices)
+
+    def __getitem__(self, index):
+        return self.prices[index]
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.prices, dtype=dtype)
+
+
+if __name__ == "__main__":
+    """Indlæser elpriserne og kører doctest"""
+    import doctest
+
+    series = PriceSeries.load("elpris.csv")
+    print(len(series), series.digest, series.prices[:5], series.times[:5])
+    print(doctest.testmod())
@@ -0,0 +1,236 @@
+"""Dette modul måler hvor tiden i et step går hen og tæller hændelser.
+
+ProfiledKølerum og ProfiledBatchKølerum er underklasser af kølerummene der
+tager tid på hver fase i step og tæller kompressor-steps, døråbninger og
+madspild. Monte Carlo bruger dem kun når profile=True, så de almindelige
+klasser ikke betaler noget for målingen.
+"""
+
+import time
+
+import numpy as np
+
+from batch_kølerum import BatchKølerum
+from kølerum import Kølerum
+
+PHASES = ("food_waste", "electricity", "door", "thermostat", "temperature")
+COUNTERS = ("compressor_on_steps", "door_openings", "frost_events", "bacteria_events")
+
+
+class StepProfile:
+    def __init__(self):
+        """Samlet tid og antal kald for hver fase samt tællere.
+
+        Examples:
+            >>> a, b = StepProfile(), StepProfile()
+            >>> a.add_time("door", 0.5)
+            >>> b.add_time("door", 1.5)
+            >>> b.counters["door_openings"] = 3
+            >>> a.merge(b).seconds["door"], a.calls["door"], a.counters["door_openings"]
+            (2.0, 2, 3)
+        """
+        self.seconds = dict.fromkeys(PHASES, 0.0)  # Samlet tid pr. fase
+        self.calls = dict.fromkeys(PHASES, 0)  # Antal kald pr. fase
+        self.counters = dict.fromkeys(COUNTERS, 0)  # Hændelser
+        self.steps = 0  # Simulerede steps, én pr. måned pr. step
+
+    def add_time(self, phase, seconds):
+        """Lægger et kald til en fase.
+
+        Args:
+            phase (str): fasen
+            seconds (float): tiden kaldet tog
+        """
+        self.seconds[phase] += seconds
+        self.calls[phase] += 1
+
+    def merge(self, other):
+        """Lægger en anden profil til denne, fx fra en anden blok.
+
+        Args:
+            other (StepProfile): den anden profil
+
+        Returns:
+            StepProfile: self
+        """
+        for phase in PHASES:
+            self.seconds[phase] += other.seconds[phase]
+            self.calls[phase] += other.calls[phase]
+        for name in COUNTERS:
+            self.counters[name] += other.counters[name]
+        self.steps += other.steps
+        return self
+
+    def report(self):
+        """Giver profilen som en dict.
+
+        Returns:
+            dict: steps, total_seconds, phases (seconds, calls, share og
+                ns_per_step for hver fase), counters og rates (tællerne pr. step)
+
+        Examples:
+            >>> profile = StepProfile()
+            >>> profile.steps = 10
+            >>> profile.add_time("thermostat", 1.0)
+            >>> profile.counters["door_openings"] = 1
+            >>> report = profile.report()
+            >>> report["phases"]["thermostat"]["share"], report["rates"]["door_openings"]
+            (1.0, 0.1)
+        """
+        total = sum(self.seconds.values())
+        steps = max(self.steps, 1)
+        return {
+            "steps": self.steps,
+            "total_seconds": total,
+            "phases": {
+                phase: {
+                    "seconds": self.seconds[phase],
+                    "calls": self.calls[phase],
+                    "share": self.seconds[phase] / total if total > 0 else 0.0,
+                    "ns_per_step": self.seconds[phase] / steps * 1e9,
+                }
+                for phase in PHASES
+            },
+            "counters": dict(self.counters),
+            "rates": {name: self.counters[name] / steps for name in COUNTERS},
+        }
+
+
+class _TimedThermostat:
+    def __init__(self, thermostat, profile, count):
+        """Tager tid på termostatets kald og tæller steps med kompressoren tændt."""
+        self.thermostat = thermostat  # Det rigtige termostat
+        self.profile = profile  # Profilen der måles i
+        self.count = count  # Tæller True i et resultat
+
+    def update_compressor(self, t_current, n):
+        start = time.perf_counter()
+        compressor_on = self.thermostat.update_compressor(t_current, n)
+        self.profile.add_time("thermostat", time.perf_counter() - start)
+        self.profile.counters["compressor_on_steps"] += self.count(compressor_on)
+        return compressor_on
+
+    def update_compressor_batch(self, t_current, n):
+        start = time.perf_counter()
+        compressor_on = self.thermostat.update_compressor_batch(t_current, n)
+        self.profile.add_time("thermostat", time.perf_counter() - start)
+        self.profile.counters["compressor_on_steps"] += self.count(compressor_on)
+        return compressor_on
+
+    def __getattr__(self, name):
+        return getattr(self.thermostat, name)
+
+
+class _ProfiledSteps:
+    """Fælles målinger for ProfiledKølerum og ProfiledBatchKølerum.
+
+    Temperaturfasen er get_new_temperature uden døren og termostatet, som
+    måles for sig inde i den.
+    """
+
+    __slots__ = ()
+
+    def _setup_profile(self, profile):
+        self.profile = profile if profile is not None else StepProfile()
+        self.termostat = _TimedThermostat(self.termostat, self.profile, self._count)
+
+    def decide_door(self, percentage=0.1):
+        start = time.perf_counter()
+        door_open = super().decide_door(percentage)
+        self.profile.add_time("door", time.perf_counter() - start)
+        self.profile.counters["door_openings"] += self._count(door_open)
+        return door_open
+
+    def calculate_food_waste(self):
+        start = time.perf_counter()
+        super().calculate_food_waste()
+        self.profile.add_time("food_waste", time.perf_counter() - start)
+        self.profile.counters["frost_events"] += self._count(self.t_current < 3.5)
+        self.profile.counters["bacteria_events"] += self._count(self.t_current > 6.5)
+
+    def calculate_electricity_price(self):
+        start = time.perf_counter()
+        super().calculate_electricity_price()
+        self.profile.add_time("electricity", time.perf_counter() - start)
+
+    def get_new_temperature(self):
+        profile = self.profile
+        inner = profile.seconds["door"] + profile.seconds["thermostat"]
+        start = time.perf_counter()
+        new_temp = super().get_new_temperature()
+        elapsed = time.perf_counter() - start
+        inner = profile.seconds["door"] + profile.seconds["thermostat"] - inner
+        profile.add_time("temperature", elapsed - inner)
+        return new_temp
+
+
+class ProfiledKølerum(_ProfiledSteps, Kølerum):
+    __slots__ = ("profile",)
+
+    def __init__(self, thermostat, energy_prices, rng=None, door_schedule=None, profile=None, **room):
+        """Kølerum der måler hver fase i step.
+
+        Args:
+            thermostat (Thermostat): termostatet
+            energy_prices (PriceSeries): elpriserne
+            rng (random.Random, optional): se Kølerum. Defaults to None.
+            door_schedule (list, optional): se Kølerum. Defaults to None.
+            profile (StepProfile, optional): profilen der måles i. Defaults to None.
+            **room: steps, delta_t, ambient og record_states, se Kølerum.
+
+        Examples:
+            >>> from termostat import ThermostatSimple
+            >>> k = ProfiledKølerum(ThermostatSimple(), np.ones(8640), door_schedule=[True, False] * 4320)
+            >>> _ = k.run_simulation()
+            >>> k.profile.steps, k.profile.counters["door_openings"], k.profile.calls["thermostat"]
+            (8640, 4320, 8640)
+        """
+        super().__init__(thermostat, energy_prices, rng, door_schedule, **room)
+        self._setup_profile(profile)
+
+    def _count(self, value):
+        return 1 if value else 0
+
+    def run_simulation(self):
+        self.profile.steps += self.steps
+        return super().run_simulation()
+
+
+class ProfiledBatchKølerum(_ProfiledSteps, BatchKølerum):
+    def __init__(self, thermostat, energy_prices, months=1, rng=None, door_schedule=None, record_logs=True, profile=None, **room):
+        """BatchKølerum der måler hver fase i step. Tællerne summeres over månederne.
+
+        Args:
+            thermostat (Thermostat): termostatet
+            energy_prices (PriceSeries): elpriserne
+            months (int, optional): se BatchKølerum. Defaults to 1.
+            rng (np.random.Generator, optional): se BatchKølerum. Defaults to None.
+            door_schedule (DoorSchedule, optional): se BatchKølerum. Defaults to None.
+            record_logs (bool, optional): se BatchKølerum. Defaults to True.
+            profile (StepProfile, optional): profilen der måles i. Defaults to None.
+            **room: steps, delta_t, ambient og record_states, se BatchKølerum.
+        """
+        super().__init__(thermostat, energy_prices, months, rng, door_schedule, record_logs, **room)
+        self._setup_profile(profile)
+
+    def _count(self, value):
+        return int(np.count_nonzero(value))
+
+    def run_simulation(self):
+        self.profile.steps += self.steps * self.months
+        return super().run_simulation()
+
+
+if __name__ == "__main__":
+    """Profilerer en måned med det smarte termostat og kører doctest"""
+    import doctest
+    import json
+
+    from price_series import PriceSeries
+    from termostat import ThermostatSmart
+
+    energy_prices = PriceSeries.load("elpris.csv")
+    kølerum = ProfiledKølerum(ThermostatSmart(energy_prices), energy_prices)
+    kølerum.run_simulation()
+    print(json.dumps(kølerum.profile.report(), indent=2))
+    print(doctest.testmod())
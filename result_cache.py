@@ -0,0 +1,199 @@
+"""Dette modul gemmer resultater af Monte Carlo kørsler på disken.
+
+Nøglen er en hash af alt der bestemmer resultatet: termostatets klasse og
+parametre, elprisernes hash, kølerummets fysiske konstanter, motoren og
+seed. Antal måneder er ikke en del af nøglen. Hver post gemmer prisen for
+hver måned, så en kørsel med færre måneder kan tages direkte fra en større,
+og en større kørsel kun skal simulere de nye måneder.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from running_stats import QuantileSketch, RunningStats
+
+PHYSICAL_CONSTANTS = ("t_rum", "t_komp", "delta_t", "t_start", "t_target")
+
+
+def _describe(value):
+    """Gør en parameter til noget der kan stå i JSON, arrays som deres hash."""
+    if isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        return {"dtype": str(array.dtype), "shape": array.shape, "sha256": hashlib.sha256(array.tobytes()).hexdigest()}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (int, float, str, bool)) or value is None:
+        return value
+    return repr(value)
+
+
+def cache_key(monte_carlo):
+    """Beregner nøglen for en MonteCarlo kørsel.
+
+    Args:
+        monte_carlo (MonteCarlo): kørslen
+
+    Returns:
+        tuple: (hex nøgle, dict med det der er hashet)
+
+    Examples:
+        >>> from kølerum import Kølerum
+        >>> from monte_carlo import MonteCarlo
+        >>> from termostat import ThermostatSimple
+        >>> a = MonteCarlo(Kølerum(ThermostatSimple(), np.ones(3)), seed=1)
+        >>> b = MonteCarlo(Kølerum(ThermostatSimple(t_target=6), np.ones(3)), seed=1)
+        >>> cache_key(a)[0] == cache_key(a)[0], cache_key(a)[0] == cache_key(b)[0]
+        (True, False)
+    """
+    kølerum = monte_carlo.kølerum_template
+    thermostat = kølerum.termostat
+    description = {
+        "thermostat": f"{type(thermostat).__module__}.{type(thermostat).__qualname__}",
+        "thermostat_params": {name: _describe(value) for name, value in sorted(vars(thermostat).items())},
+        "prices": _describe(np.asarray(kølerum.energy_prices, dtype=np.float64)),
+        "kølerum": {name: getattr(kølerum, name) for name in PHYSICAL_CONSTANTS},
+        "steps": kølerum.steps,
+        "ambient": None if kølerum.ambient is None else _describe(np.asarray(kølerum.ambient, dtype=np.float64)),
+        "engine": monte_carlo.engine,
+        "chunk_size": monte_carlo.chunk_size(),
+        "door_method": monte_carlo.door_method,
+        "seed": monte_carlo.seed,
+    }
+    text = json.dumps(description, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest(), description
+
+
+class ResultCache:
+    def __init__(self, directory=".cache/results", max_bytes=512 * 2**20):
+        """Cache for Monte Carlo resultater med LRU oprydning.
+
+        Args:
+            directory (str, optional): mappen posterne gemmes i. Defaults to ".cache/results".
+            max_bytes (int, optional): maks samlet størrelse før de ældste slettes. Defaults to 512 MiB.
+        """
+        self.directory = Path(directory)  # Mappe til posterne
+        self.max_bytes = max_bytes  # Maks størrelse
+
+    def run(self, monte_carlo, months, sample_months=1, sketch_capacity=200):
+        """Giver resultatet fra cachen, udvider en mindre post eller kører forfra.
+
+        Kun kørsler med seed kan caches. Uden seed køres run_streaming direkte.
+
+        Args:
+            monte_carlo (MonteCarlo): kørslen
+            months (int): antal måneder
+            sample_months (int, optional): måneder hvis fulde logs returneres. Defaults to 1.
+            sketch_capacity (int, optional): centroider i kvantil skitsen. Defaults to 200.
+
+        Returns:
+            dict: samme som MonteCarlo.run_streaming plus monthly_total_costs og
+                cache ("hit", "extended", "miss" eller "disabled")
+        """
+        if monte_carlo.seed is None:
+            results = monte_carlo.run_streaming(months, sample_months, sketch_capacity)
+            results["cache"] = "disabled"
+            return results
+
+        key, description = cache_key(monte_carlo)
+        path = self.directory / f"{key}.npz"
+        entry = self._load(path)
+        sample_months = min(sample_months, months)
+
+        if entry is not None and entry["temperature_logs"].shape[0] >= sample_months:
+            cached_months = entry["monthly_total_costs"].size
+            if cached_months >= months:
+                os.utime(path)  # Markerer posten som senest brugt
+                return self._results(entry, months, sample_months, sketch_capacity, "hit")
+            status = "extended"
+            # Den sidste halve blok køres igen så strømmene passer
+            start = cached_months // monte_carlo.chunk_size() * monte_carlo.chunk_size()
+            entry = {name: values[:start] if name.startswith("monthly") else values for name, values in entry.items()}
+        else:
+            status = "miss"
+            start = 0
+            entry = {
+                "monthly_total_costs": np.empty(0),
+                "monthly_electricity_costs": np.empty(0),
+                "monthly_food_waste_costs": np.empty(0),
+                "temperature_logs": np.empty((0, monte_carlo.kølerum_template.steps)),
+                "electricity_logs": np.empty((0, monte_carlo.kølerum_template.steps)),
+                "food_waste_logs": np.empty((0, monte_carlo.kølerum_template.steps)),
+            }
+
+        new = {name: [values] for name, values in entry.items()}
+        keep_from = entry["temperature_logs"].shape[0]
+        for first, stop, chunk_data in monte_carlo._iter_chunks(months, sample_months, start=start):
+            for name in ("monthly_total_costs", "monthly_electricity_costs", "monthly_food_waste_costs"):
+                new[name].append(np.asarray(chunk_data[name]))
+            # Logs fra måneder cachen ikke allerede har
+            for name in ("temperature_logs", "electricity_logs", "food_waste_logs"):
+                logs = chunk_data[name][max(0, keep_from - first):]
+                if logs:
+                    new[name].append(np.asarray(logs))
+        entry = {name: np.concatenate(parts) for name, parts in new.items()}
+        self._store(path, entry, description)
+        return self._results(entry, months, sample_months, sketch_capacity, status)
+
+    def _results(self, entry, months, sample_months, sketch_capacity, status):
+        """Bygger resultatet for de første months måneder af en post."""
+        costs = entry["monthly_total_costs"][:months]
+        results = {
+            "temperature_logs": list(entry["temperature_logs"][:sample_months]),
+            "electricity_logs": list(entry["electricity_logs"][:sample_months]),
+            "food_waste_logs": list(entry["food_waste_logs"][:sample_months]),
+            "cost_stats": RunningStats(),
+            "electricity_stats": RunningStats(),
+            "food_waste_stats": RunningStats(),
+            "cost_sketch": QuantileSketch(sketch_capacity),
+            "monthly_total_costs": costs,
+            "cache": status,
+        }
+        results["cost_stats"].add_many(costs)
+        results["electricity_stats"].add_many(entry["monthly_electricity_costs"][:months])
+        results["food_waste_stats"].add_many(entry["monthly_food_waste_costs"][:months])
+        results["cost_sketch"].add_many(costs)
+        return results
+
+    def _load(self, path):
+        """Læser en post, eller None hvis den mangler eller er ødelagt."""
+        if not path.exists():
+            return None
+        try:
+            with np.load(path) as data:
+                return {name: data[name] for name in data.files if name != "description"}
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _store(self, path, entry, description):
+        """Skriver en post atomisk og rydder op i de ældste."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as handle:
+            np.savez(handle, description=json.dumps(description, default=str), **entry)
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """Sletter de mindst nyligt brugte poster indtil cachen er under max_bytes.
+
+        Args:
+            keep (Path, optional): en post der ikke må slettes. Defaults to None.
+        """
+        entries = sorted(self.directory.glob("*.npz"), key=lambda file: file.stat().st_mtime)
+        total = sum(file.stat().st_size for file in entries)
+        for file in entries:
+            if total <= self.max_bytes:
+                break
+            if keep is not None and file == keep:
+                continue
+            total -= file.stat().st_size
+            file.unlink()
+
+    def clear(self):
+        """Sletter alle poster."""
+        for file in self.directory.glob("*.npz"):
+            file.unlink()
@@ -0,0 +1,204 @@
+"""Dette modul indeholder løbende statistik der kan samle måneder op uden at gemme dem.
+
+Bliver brugt af Monte Carlo når den kører i streaming mode.
+"""
+
+import math
+
+import numpy as np
+
+
+class RunningStats:
+    def __init__(self):
+        """Welford middelværdi/varians samt min og max.
+
+        Examples:
+            >>> stats = RunningStats()
+            >>> stats.add_many([1.0, 2.0, 3.0, 4.0])
+            >>> stats.count, stats.mean, stats.variance(), stats.min, stats.max
+            (4, 2.5, 1.6666666666666667, 1.0, 4.0)
+        """
+        self.count = 0  # Antal værdier
+        self.mean = 0.0  # Middelværdi
+        self.m2 = 0.0  # Sum af kvadrerede afvigelser
+        self.min = math.inf  # Mindste værdi
+        self.max = -math.inf  # Største værdi
+
+    def add(self, value):
+        """Tilføjer en enkelt værdi (Welford).
+
+        Args:
+            value (float): værdien
+        """
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def add_many(self, values):
+        """Tilføjer mange værdier på én gang ved at lægge deres statistik sammen.
+
+        Args:
+            values (list): værdierne
+        """
+        values = np.asarray(values, dtype=float)
+        if values.size == 0:
+            return
+        batch = RunningStats()
+        batch.count = int(values.size)
+        batch.mean = float(values.mean())
+        batch.m2 = float(((values - batch.mean) ** 2).sum())
+        batch.min = float(values.min())
+        batch.max = float(values.max())
+        self.merge(batch)
+
+    def merge(self, other):
+        """Lægger statistikken fra en anden RunningStats til (Chan et al.).
+
+        Args:
+            other (RunningStats): statistikken der lægges til
+
+        Examples:
+            >>> a, b = RunningStats(), RunningStats()
+            >>> a.add_many([1.0, 2.0])
+            >>> b.add_many([3.0, 4.0])
+            >>> a.merge(b)
+            >>> a.mean, a.variance()
+            (2.5, 1.6666666666666667)
+        """
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def variance(self):
+        """Stikprøvevariansen.
+
+        Returns:
+            float: variansen, nan hvis der er under to værdier
+        """
+        if self.count < 2:
+            return math.nan
+        return self.m2 / (self.count - 1)
+
+    def std(self):
+        """Stikprøvens standardafvigelse.
+
+        Returns:
+            float: standardafvigelsen
+        """
+        return math.sqrt(self.variance())
+
+    def to_dict(self):
+        """Statistikken som en dict.
+
+        Returns:
+            dict: count, mean, std, min og max
+        """
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "std": self.std() if self.count > 1 else math.nan,
+            "min": self.min,
+            "max": self.max,
+        }
+
+
+class QuantileSketch:
+    def __init__(self, capacity=200):
+        """Begrænset skitse af en fordeling der kan give kvantiler.
+
+        Værdierne holdes som højst capacity vægtede centroider. Når der er for
+        mange, slås nabo-centroider sammen så hver får omtrent lige meget vægt.
+
+        Args:
+            capacity (int, optional): maks antal centroider. Defaults to 200.
+
+        Examples:
+            >>> sketch = QuantileSketch(capacity=50)
+            >>> sketch.add_many(np.arange(1001.0))
+            >>> len(sketch.means) <= 50
+            True
+            >>> round(sketch.quantile(0.5))
+            500
+            >>> sketch.quantile(0.0), sketch.quantile(1.0)
+            (0.0, 1000.0)
+        """
+        self.capacity = capacity  # Maks antal centroider
+        self.means = np.empty(0)  # Centroidernes værdier
+        self.weights = np.empty(0)  # Centroidernes vægt
+        self.min = math.inf  # Mindste værdi
+        self.max = -math.inf  # Største værdi
+
+    def add_many(self, values):
+        """Tilføjer mange værdier.
+
+        Args:
+            values (list): værdierne
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        if values.size == 0:
+            return
+        self._add_centroids(values, np.ones(values.size))
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other):
+        """Lægger en anden skitse til.
+
+        Args:
+            other (QuantileSketch): skitsen der lægges til
+        """
+        if other.weights.size == 0:
+            return
+        self._add_centroids(other.means, other.weights)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def _add_centroids(self, means, weights):
+        """Sorterer centroiderne og komprimerer dem til højst capacity."""
+        means = np.concatenate([self.means, means])
+        weights = np.concatenate([self.weights, weights])
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        if means.size > self.capacity:
+            # Hver centroide kommer i den spand dens midterste vægt falder i
+            cumulative = np.cumsum(weights) - weights / 2
+            buckets = np.minimum(
+                (cumulative / weights.sum() * self.capacity).astype(int),
+                self.capacity - 1,
+            )
+            bucket_weights = np.bincount(buckets, weights=weights, minlength=self.capacity)
+            bucket_sums = np.bincount(buckets, weights=means * weights, minlength=self.capacity)
+            used = bucket_weights > 0
+            means = bucket_sums[used] / bucket_weights[used]
+            weights = bucket_weights[used]
+        self.means, self.weights = means, weights
+
+    def quantile(self, q):
+        """Estimerer kvantilen q.
+
+        Args:
+            q (float): kvantil mellem 0 og 1
+
+        Returns:
+            float: den estimerede værdi, nan hvis skitsen er tom
+        """
+        if self.weights.size == 0:
+            return math.nan
+        total = self.weights.sum()
+        positions = np.concatenate([[0.0], np.cumsum(self.weights) - self.weights / 2, [total]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return float(np.interp(q * total, positions, values))
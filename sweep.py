@@ -0,0 +1,186 @@
+"""Dette modul finder gode parametre til termostaterne med et parameter sweep.
+
+Alle konfigurationer ser de samme dørmønstre (common random numbers), så
+forskellen mellem dem ikke drukner i støj fra døren. Successive halving
+smider de dårligste halvdel ud efter få måneder og giver resten flere.
+"""
+
+import itertools
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from door_schedule import DoorSchedule
+from monte_carlo import simulate_chunk
+from price_series import as_price_array
+from running_stats import RunningStats
+
+
+def parameter_grid(ranges):
+    """Laver alle kombinationer af parameterværdierne.
+
+    Args:
+        ranges (dict): parameternavn -> liste af værdier
+
+    Returns:
+        list: en dict pr. konfiguration
+
+    Examples:
+        >>> parameter_grid({"t_target_low": [2, 3], "t_target_high": [6.2]})
+        [{'t_target_low': 2, 't_target_high': 6.2}, {'t_target_low': 3, 't_target_high': 6.2}]
+    """
+    names = list(ranges)
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(ranges[name] for name in names))
+    ]
+
+
+def evaluate_configurations(thermostat_class, energy_prices, configurations, door_schedule):
+    """Kører alle konfigurationer mod de samme måneder i én BatchKølerum.
+
+    Parametrene gives til termostatet som arrays med én værdi pr. række, så
+    termostatets update_compressor_batch skal kunne tage array parametre.
+
+    Args:
+        thermostat_class (class): termostatet der skal tunes
+        energy_prices (np.ndarray): elpriserne
+        configurations (list): en dict af parametre pr. konfiguration
+        door_schedule (DoorSchedule): dørens åbninger for månederne
+
+    Returns:
+        np.ndarray: pris pr. måned af formen (configurations, months)
+
+    Examples:
+        >>> from termostat import ThermostatSimple
+        >>> doors = DoorSchedule.generate(2, np.random.default_rng(0))
+        >>> costs = evaluate_configurations(ThermostatSimple, np.ones(8641), [{"t_target": 4}, {"t_target": 6}], doors)
+        >>> costs.shape
+        (2, 2)
+    """
+    months = len(door_schedule)
+    count = len(configurations)
+    params = {
+        name: np.repeat([configuration[name] for configuration in configurations], months)
+        for name in configurations[0]
+    }
+    thermostat = thermostat_class(energy_prices, **params)
+    stacked_doors = DoorSchedule(np.tile(door_schedule.bits, (count, 1)), door_schedule.steps)
+    data = simulate_chunk(
+        thermostat,
+        energy_prices,
+        count * months,
+        engine="batch",
+        keep=0,
+        door_schedule=stacked_doors,
+    )
+    return np.asarray(data["monthly_total_costs"]).reshape(count, months)
+
+
+class ThermostatSweep:
+    def __init__(self, thermostat_class, energy_prices, ranges, seed=0, workers=1, door_method="geometric", block_size=1024):
+        """Forbereder et sweep over et termostats parametre.
+
+        Args:
+            thermostat_class (class): termostatet der skal tunes, fx ThermostatSmart
+            energy_prices (PriceSeries): elpriserne
+            ranges (dict): parameternavn -> liste af værdier
+            seed (int, optional): seed for dørmønstrene. Defaults to 0.
+            workers (int, optional): antal processer. Defaults to 1.
+            door_method (str, optional): se DoorSchedule.generate. Defaults to "geometric".
+            block_size (int, optional): konfigurationer pr. BatchKølerum. Defaults to 1024.
+        """
+        self.thermostat_class = thermostat_class  # Termostatet der tunes
+        self.energy_prices = as_price_array(energy_prices)  # Elpriser
+        self.configurations = parameter_grid(ranges)  # Alle konfigurationer
+        self.seed = seed  # Seed for dørmønstrene
+        self.workers = workers  # Antal processer
+        self.door_method = door_method  # Hvordan døren trækkes
+        self.block_size = block_size  # Konfigurationer pr. batch
+
+    def run(self, min_months=4, max_months=256, eta=2):
+        """Kører successive halving og returnerer en rangeret tabel.
+
+        Første runde kører alle konfigurationer i min_months måneder. Efter hver
+        runde beholdes den bedste 1/eta del og antallet af måneder ganges med eta,
+        indtil der er én tilbage eller max_months er nået. Nye runder kører kun de
+        nye måneder og lægger dem til statistikken fra tidligere runder.
+
+        Args:
+            min_months (int, optional): måneder i første runde. Defaults to 4.
+            max_months (int, optional): maks måneder for en konfiguration. Defaults to 256.
+            eta (int, optional): hvor meget der skæres fra i hver runde. Defaults to 2.
+
+        Returns:
+            pd.DataFrame: parametre, mean_cost, std_cost, stderr, months og rank sorteret
+                efter flest måneder og derefter laveste forventede månedlige pris
+        """
+        doors = DoorSchedule.generate(
+            max_months, np.random.default_rng(self.seed), method=self.door_method
+        )
+        stats = [RunningStats() for _ in self.configurations]
+        alive = np.arange(len(self.configurations))
+        used = 0
+        target = min(min_months, max_months)
+        while True:
+            costs = self._evaluate(alive, doors[used:target])
+            for index, month_costs in zip(alive, costs):
+                stats[index].add_many(month_costs)
+            used = target
+            if alive.size == 1 or used >= max_months:
+                break
+            # Beholder de bedste efter samme måneder for alle
+            keep = max(1, math.ceil(alive.size / eta))
+            order = np.argsort([stats[index].mean for index in alive], kind="stable")
+            alive = alive[order[:keep]]
+            target = min(max_months, used * eta)
+
+        table = pd.DataFrame(self.configurations)
+        table["mean_cost"] = [s.mean for s in stats]
+        table["std_cost"] = [s.std() if s.count > 1 else math.nan for s in stats]
+        table["stderr"] = table["std_cost"] / np.sqrt([s.count for s in stats])
+        table["months"] = [s.count for s in stats]
+        table = table.sort_values(["months", "mean_cost"], ascending=[False, True], kind="stable")
+        table["rank"] = np.arange(1, len(table) + 1)
+        return table.reset_index(drop=True)
+
+    def _evaluate(self, alive, doors):
+        """Kører de levende konfigurationer i blokke, evt. fordelt på processer."""
+        blocks = [
+            [self.configurations[index] for index in alive[start:start + self.block_size]]
+            for start in range(0, alive.size, self.block_size)
+        ]
+        args = (self.thermostat_class, self.energy_prices)
+        if self.workers > 1 and len(blocks) > 1:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = [
+                    executor.submit(evaluate_configurations, *args, block, doors)
+                    for block in blocks
+                ]
+                results = [future.result() for future in futures]
+        else:
+            results = [evaluate_configurations(*args, block, doors) for block in blocks]
+        return np.concatenate(results)
+
+
+if __name__ == "__main__":
+    """Tuner det smarte termostat og kører doctest"""
+    import doctest
+
+    from price_series import PriceSeries
+    from termostat import ThermostatSmart
+
+    sweep = ThermostatSweep(
+        ThermostatSmart,
+        PriceSeries.load("elpris.csv"),
+        {
+            "t_target_low": [2, 3, 4],
+            "t_target_high": [5.8, 6.0, 6.2, 6.4],
+            "threshold_price": [1, 1.5, 2, 2.5],
+            "cutoff_step": [2000, 3000, 4000],
+        },
+    )
+    print(sweep.run().head(10))
+    print(doctest.testmod())
@@ -0,0 +1,233 @@
+"""Dette modul estimerer de dyre måneder i halen med importance sampling.
+
+De dyre måneder er dem hvor døren står åben usædvanligt tit, så temperaturen
+længe ligger over 6.5 grader. Med almindelig Monte Carlo er kun 1% af
+månederne over 99% kvantilen. Her trækkes dørene i stedet med en højere
+sandsynlighed q, og hver måned vægtes med likelihood ratio
+
+    w = (p / q)^k * ((1 - p) / (1 - q))^(steps - k)
+
+hvor k er månedens antal døråbninger. Så er vægtede gennemsnit stadig
+middelrette for den rigtige dør, men langt flere måneder lander i halen.
+q findes med cross-entropy metoden ud fra nogle korte kørsler.
+"""
+
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+from door_schedule import DOOR_PROBABILITY, DoorSchedule
+from monte_carlo import MonteCarlo
+
+
+def likelihood_ratio(open_counts, steps, p=DOOR_PROBABILITY, q=DOOR_PROBABILITY):
+    """Vægten for hver måned når dørene er trukket med q i stedet for p.
+
+    Args:
+        open_counts (np.ndarray): døråbninger pr. måned
+        steps (int): steps pr. måned
+        p (float, optional): den rigtige sandsynlighed. Defaults to DOOR_PROBABILITY.
+        q (float, optional): sandsynligheden dørene er trukket med. Defaults to DOOR_PROBABILITY.
+
+    Returns:
+        np.ndarray: vægt pr. måned
+
+    Examples:
+        >>> likelihood_ratio(np.array([1, 2]), 2, p=0.5, q=0.5).tolist()
+        [1.0, 1.0]
+        >>> likelihood_ratio(np.array([0, 1, 2]), 2, p=0.5, q=0.25).round(4).tolist()
+        [0.4444, 1.3333, 4.0]
+    """
+    k = np.asarray(open_counts, dtype=float)
+    log_weights = k * math.log(p / q) + (steps - k) * math.log((1 - p) / (1 - q))
+    return np.exp(log_weights)
+
+
+def exceedance(costs, weights, threshold, confidence=0.95):
+    """Estimerer P(pris > threshold) fra vægtede måneder.
+
+    Args:
+        costs (np.ndarray): pris pr. måned
+        weights (np.ndarray): likelihood ratio pr. måned
+        threshold (float): grænsen
+        confidence (float, optional): konfidensniveau. Defaults to 0.95.
+
+    Returns:
+        dict: threshold, probability, std_error, ci_low og ci_high
+
+    Examples:
+        >>> result = exceedance(np.array([1.0, 5.0, 9.0, 9.0]), np.array([1.0, 1.0, 0.5, 0.5]), 8)
+        >>> result["probability"], round(result["std_error"], 4)
+        (0.25, 0.1443)
+    """
+    hits = np.asarray(weights, dtype=float) * (np.asarray(costs) > threshold)
+    probability = float(hits.mean())
+    std_error = float(hits.std(ddof=1) / math.sqrt(hits.size)) if hits.size > 1 else math.nan
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    return {
+        "threshold": threshold,
+        "probability": probability,
+        "std_error": std_error,
+        "ci_low": max(0.0, probability - z * std_error),
+        "ci_high": probability + z * std_error,
+    }
+
+
+def weighted_quantile(costs, weights, level):
+    """Den mindste pris hvor den vægtede P(pris > c) højst er 1 - level.
+
+    Halen normeres med antal måneder og ikke med summen af vægtene, så
+    halesandsynligheden ved hver pris er middelret.
+
+    Args:
+        costs (np.ndarray): pris pr. måned
+        weights (np.ndarray): likelihood ratio pr. måned
+        level (float): fx 0.99
+
+    Returns:
+        float: prisen ved kvantilen
+
+    Examples:
+        >>> costs = np.arange(100.0)
+        >>> weighted_quantile(costs, np.ones(100), 0.95)
+        94.0
+        >>> weighted_quantile(costs, np.where(costs >= 90, 0.5, 1.0), 0.95)
+        89.0
+    """
+    costs = np.asarray(costs, dtype=float)
+    order = np.argsort(costs)[::-1]
+    tail = np.cumsum(np.asarray(weights, dtype=float)[order]) / costs.size
+    # Antal dyreste måneder der tilsammen højst er 1 - level, med plads til afrunding i cumsum
+    index = min(int(np.searchsorted(tail, (1 - level) * (1 + 1e-9), side="right")), costs.size - 1)
+    return float(costs[order][index])
+
+
+def effective_sample_size(weights):
+    """Antal uvægtede måneder vægtene svarer til.
+
+    Examples:
+        >>> effective_sample_size(np.ones(10)), effective_sample_size(np.array([1.0, 0.0]))
+        (10.0, 1.0)
+    """
+    weights = np.asarray(weights, dtype=float)
+    return float(weights.sum() ** 2 / (weights**2).sum())
+
+
+class TailRisk:
+    def __init__(self, kølerum, engine="batch", workers=1, seed=None, door_probability=DOOR_PROBABILITY):
+        """Importance sampling af halen for et kølerum.
+
+        Args:
+            kølerum (Kølerum): kølerummet med termostat
+            engine (str, optional): "scalar" eller "batch". Defaults to "batch".
+            workers (int, optional): antal processer. Defaults to 1.
+            seed (int, optional): seed for dørene. Defaults to None.
+            door_probability (float, optional): den rigtige chance for åben dør.
+                Defaults to DOOR_PROBABILITY.
+        """
+        self.monte_carlo = MonteCarlo(kølerum, engine=engine, workers=workers)  # Kører månederne
+        self.steps = kølerum.steps  # Steps pr. måned
+        self.p = door_probability  # Den rigtige chance for åben dør
+        self.seed_sequence = np.random.SeedSequence(seed)  # Giver en ny strøm til hver kørsel
+
+    def sample(self, months, q):
+        """Kører months måneder med dørene trukket med q.
+
+        Args:
+            months (int): antal måneder
+            q (float): chance for åben dør i et step
+
+        Returns:
+            tuple: (pris pr. måned, vægt pr. måned, døråbninger pr. måned)
+        """
+        rng = np.random.default_rng(self.seed_sequence.spawn(1)[0])
+        doors = DoorSchedule.generate(months, rng, steps=self.steps, percentage=q)
+        costs = self.monte_carlo.run_costs(months, doors)
+        counts = doors.open_counts()
+        return costs, likelihood_ratio(counts, self.steps, self.p, q), counts
+
+    def tilt(self, level=0.99, months=500, rho=0.1, iterations=6):
+        """Finder q med cross-entropy metoden.
+
+        I hver runde vælges de rho dyreste måneder, og q sættes til deres
+        vægtede andel af åbne steps. Runderne stopper når de valgte måneder
+        ligger i halen over level kvantilen.
+
+        Args:
+            level (float, optional): kvantilen halen starter ved. Defaults to 0.99.
+            months (int, optional): måneder pr. runde. Defaults to 500.
+            rho (float, optional): andel af månederne der vælges. Defaults to 0.1.
+            iterations (int, optional): maks runder. Defaults to 6.
+
+        Returns:
+            float: q
+        """
+        q = self.p
+        for _ in range(iterations):
+            costs, weights, counts = self.sample(months, q)
+            gamma = np.quantile(costs, 1 - rho)
+            elite = costs >= gamma
+            q = float((weights[elite] * counts[elite]).sum() / (weights[elite].sum() * self.steps))
+            if exceedance(costs, weights, gamma)["probability"] <= 1 - level:
+                break
+        return q
+
+    def run(self, level=0.99, months=2000, thresholds=(), q=None, pilot_months=500, confidence=0.95):
+        """Estimerer kvantilen og sandsynligheden for at overskride grænser.
+
+        Args:
+            level (float, optional): kvantilen der estimeres. Defaults to 0.99.
+            months (int, optional): måneder i den endelige kørsel. Defaults to 2000.
+            thresholds (tuple, optional): priser hvis overskridelse estimeres. Defaults to ().
+            q (float, optional): chance for åben dør i kørslen. Defaults to tilt.
+            pilot_months (int, optional): måneder pr. runde i tilt. Defaults to 500.
+            confidence (float, optional): konfidensniveau. Defaults to 0.95.
+
+        Returns:
+            dict: door_probability (q), level, quantile, exceedance (en dict pr. grænse,
+                se exceedance), quantile_exceedance, effective_sample_size, months,
+                costs og weights
+        """
+        q = q if q is not None else self.tilt(level, pilot_months)
+        costs, weights, _ = self.sample(months, q)
+        quantile = weighted_quantile(costs, weights, level)
+        return {
+            "door_probability": q,
+            "level": level,
+            "quantile": quantile,
+            "exceedance": [exceedance(costs, weights, threshold, confidence) for threshold in thresholds],
+            "quantile_exceedance": exceedance(costs, weights, quantile, confidence),
+            "effective_sample_size": effective_sample_size(weights),
+            "months": months,
+            "costs": costs,
+            "weights": weights,
+        }
+
+
+if __name__ == "__main__":
+    """Sammenligner halen fra importance sampling med almindelig Monte Carlo og kører doctest"""
+    import doctest
+    import time
+
+    from kølerum import Kølerum
+    from price_series import PriceSeries
+    from termostat import ThermostatSmart
+
+    energy_prices = PriceSeries.load("elpris.csv")
+    kølerum = Kølerum(ThermostatSmart(energy_prices), energy_prices)
+
+    started = time.perf_counter()
+    plain = MonteCarlo(kølerum, engine="batch", seed=1).run_costs(20000)
+    plain_p99 = float(np.quantile(plain, 0.99))
+    print(f"Monte Carlo: p99 {plain_p99:.1f} fra 20000 måneder på {time.perf_counter() - started:.1f} s")
+
+    started = time.perf_counter()
+    result = TailRisk(kølerum, seed=2).run(0.99, months=2000, thresholds=(plain_p99,))
+    tail = result["exceedance"][0]
+    print(
+        f"Importance sampling: p99 {result['quantile']:.1f}, q={result['door_probability']:.4f}, "
+        f"P(pris > {plain_p99:.1f}) = {tail['probability']:.4f} ± {tail['std_error']:.4f} "
+        f"på {time.perf_counter() - started:.1f} s"
+    )
+    print(doctest.testmod())
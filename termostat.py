@@ -6,6 +6,11 @@
 
 from abc import ABC, abstractmethod
 
+import numpy as np
+
+from optimal_policy import MODEL, POINTS, T_HIGH, T_LOW, grid_index, load_policy, room_model
+from price_series import as_price_array
+
 
 class Thermostat(ABC):
     """Generel termostat der ikke kan noget for sig selv.
@@ -14,20 +19,49 @@ class Thermostat(ABC):
         ABC: Abtract Base Class
     """
     @abstractmethod
-    def update_compressor(self):
+    def update_compressor(self, t_current, n):
         """
         Bestemmer om kompressoren skal tændes.
         """
 
+    def update_compressor_batch(self, t_current, n):
+        """Bestemmer om kompressoren skal tændes for mange temperaturer i samme step.
+
+        Standardversionen kalder update_compressor for hver temperatur, så
+        egne termostater virker uden videre. Termostaterne her har deres egen
+        NumPy version.
+
+        Args:
+            t_current (np.ndarray): nuværende temperatur for hver måned/rum
+            n (int): iteration
+
+        Returns:
+            np.ndarray: bool maske, True hvor kompressoren skal tændes
+
+        Examples:
+            >>> class Custom(Thermostat):
+            ...     def update_compressor(self, t_current, n):
+            ...         return t_current > 4
+            >>> Custom().update_compressor_batch(np.array([3.0, 5.0]), 0)
+            array([False,  True])
+        """
+        t_current = np.asarray(t_current, dtype=float)
+        return np.fromiter(
+            (self.update_compressor(t, n) for t in t_current),
+            dtype=bool,
+            count=t_current.size,
+        )
+
 
 class ThermostatSimple(Thermostat):
-    def __init__(self, energy_prices=None):
+    def __init__(self, energy_prices=None, t_target=5):
         """Initialiserer det simple termostat.
 
         Args:
             energy_prices (dict, optional): Ikke nødvendig her blot tilføjet for konsistens. Defaults to None.
+            t_target (float, optional): Måletemperatur. Defaults to 5.
         """
-        self.t_target = 5
+        self.t_target = t_target
 
     def update_compressor(self, t_current, n):
         """Bestemmer om kompressoren skal tændes.
@@ -41,15 +75,32 @@ class ThermostatSimple(Thermostat):
         """
         return t_current > self.t_target
 
+    def update_compressor_batch(self, t_current, n):
+        """Bestemmer om kompressoren skal tændes for mange temperaturer.
+
+        Args:
+            t_current (np.ndarray): nuværende temperaturer
+            n (int): iteration
+
+        Returns:
+            np.ndarray: True hvor kompressoren skal tændes
+
+        Examples:
+            >>> ThermostatSimple().update_compressor_batch(np.array([4.0, 6.0]), 0)
+            array([False,  True])
+        """
+        return np.asarray(t_current) > self.t_target
+
 
 class ThermostatSemiSmart(Thermostat):
-    def __init__(self, energy_prices=None):
+    def __init__(self, energy_prices=None, t_target=6.4):
         """Initialiserer det semi-smarte termostat.
 
         Args:
             energy_prices (dict, optional): Bruges ikke her. Defaults to None.
+            t_target (float, optional): Måletemperatur. Defaults to 6.4.
         """
-        self.t_target = 6.4 # Måletemperatur
+        self.t_target = t_target # Måletemperatur
 
     def update_compressor(self, t_current, n):
         """Bestemmer om kompressoren skal tændes.
@@ -63,17 +114,35 @@ class ThermostatSemiSmart(Thermostat):
         """
         return t_current > self.t_target
 
+    def update_compressor_batch(self, t_current, n):
+        """Bestemmer om kompressoren skal tændes for mange temperaturer.
+
+        Args:
+            t_current (np.ndarray): nuværende temperaturer
+            n (int): iteration
+
+        Returns:
+            np.ndarray: True hvor kompressoren skal tændes
+        """
+        return np.asarray(t_current) > self.t_target
+
 
 class ThermostatSmart(Thermostat):
-    def __init__(self, energy_prices):
+    def __init__(self, energy_prices, t_target_low=3, t_target_high=6.2, threshold_price=2, cutoff_step=3000):
         """Initialiserer det smarte termostat.
 
         Args:
-            energy_prices (dict): Priser på energi
+            energy_prices (PriceSeries): Priser på energi, se price_series.as_price_array
+            t_target_low (float, optional): Lavere grænse. Defaults to 3.
+            t_target_high (float, optional): Øvre grænse. Defaults to 6.2.
+            threshold_price (float, optional): Pris i DKK hvor kompressoren altid tændes. Defaults to 2.
+            cutoff_step (int, optional): Step hvorefter den billige pris ikke bruges. Defaults to 3000.
         """
-        self.t_target_low = 3  # Lavere grænse
-        self.t_target_high = 6.2  # Øvre grænse
-        self.energy_prices = energy_prices # Priser på energi
+        self.t_target_low = t_target_low  # Lavere grænse
+        self.t_target_high = t_target_high  # Øvre grænse
+        self.threshold_price = threshold_price  # Billig pris
+        self.cutoff_step = cutoff_step  # Sidste step med billig pris
+        self.energy_prices = as_price_array(energy_prices) # Priser på energi
 
     def update_compressor(self, t_current, n):
         """Bestemmer om kompressoren skal tændes på baggrund af pris, temperatur og iteration.
@@ -85,13 +154,136 @@ class ThermostatSmart(Thermostat):
         Returns:
             bool: True hvis kompressoren skal tændes, ellers False.
         """
-        current_price = float(self.energy_prices[n]["Pris"])
-        threshold_price = 2
+        current_price = self.energy_prices.item(n)
 
         if t_current >= self.t_target_high:
             return True
-        elif current_price <= threshold_price and n < 3000:
+        elif current_price <= self.threshold_price and n < self.cutoff_step:
             return True
         elif t_current <= self.t_target_low:
             return False
         return False
+
+    def update_compressor_batch(self, t_current, n):
+        """Bestemmer om kompressoren skal tændes for mange temperaturer.
+
+        Prisen og n er de samme for alle i et step, så kun temperaturgrænsen
+        skal sammenlignes element for element. Parametrene må også være arrays
+        med én værdi pr. element, hvilket sweep bruger til at køre mange
+        konfigurationer i samme batch.
+
+        Args:
+            t_current (np.ndarray): nuværende temperaturer
+            n (int): iteration
+
+        Returns:
+            np.ndarray: True hvor kompressoren skal tændes
+
+        Examples:
+            >>> t = ThermostatSmart(np.array([1.0, 3.0]))
+            >>> t.update_compressor_batch(np.array([4.0, 7.0]), 0).tolist()
+            [True, True]
+            >>> t.update_compressor_batch(np.array([4.0, 7.0]), 1).tolist()
+            [False, True]
+        """
+        cheap = (self.energy_prices.item(n) <= self.threshold_price) & (n < self.cutoff_step)
+        return (np.asarray(t_current) >= self.t_target_high) | cheap
+
+
+class ThermostatOptimal(Thermostat):
+    def __init__(self, energy_prices, model=None, points=POINTS, steps=None, cache_dir=".cache/policies"):
+        """Initialiserer det optimale termostat.
+
+        Styringen løses én gang for elpriserne med dynamisk programmering, se
+        optimal_policy, og hentes fra cachen næste gang de samme priser bruges.
+        Hvert kald er derefter kun et opslag i tabellen.
+
+        Modellen skal passe til det kølerum termostatet styrer. Brug for_room
+        for et Kølerum, Fleet bygger modellen ud fra hvert rums parametre.
+
+        Args:
+            energy_prices (PriceSeries): Priser på energi, én pr. step
+            model (dict, optional): konstanter der afviger fra optimal_policy.MODEL, fx
+                delta_t. Defaults to None.
+            points (int, optional): antal punkter i temperaturgitteret. Defaults to POINTS.
+            steps (int, optional): antal steps. Defaults to antallet af priser.
+            cache_dir (str, optional): mappe til tabellerne. None gemmer ikke. Defaults to ".cache/policies".
+        """
+        self.model = {**MODEL, **(model or {})}  # Konstanterne styringen er løst for
+        self.policy = load_policy(energy_prices, model, T_LOW, T_HIGH, points, steps, cache_dir)  # Tabellen
+        self.max_index = points - 1  # Sidste punkt i gitteret
+        self.scale = (points - 1) / (T_HIGH - T_LOW)  # Gitterpunkter pr. grad
+
+    @classmethod
+    def for_room(cls, kølerum, points=POINTS, cache_dir=".cache/policies"):
+        """Løser styringen for kølerummets konstanter, tidsskridt, horisont og elpriser.
+
+        Args:
+            kølerum (Kølerum): kølerummet termostatet skal styre
+            points (int, optional): antal punkter i temperaturgitteret. Defaults to POINTS.
+            cache_dir (str, optional): se __init__. Defaults to ".cache/policies".
+
+        Raises:
+            ValueError: If the room has an ambient series, see optimal_policy.room_model.
+
+        Returns:
+            ThermostatOptimal: termostatet
+
+        Examples:
+            >>> from kølerum import Kølerum
+            >>> t = ThermostatOptimal.for_room(Kølerum(None, np.zeros(50), steps=20, delta_t=60), cache_dir=None)
+            >>> t.policy.shape, t.model["delta_t"]
+            ((20, 321), 60)
+        """
+        return cls(kølerum.energy_prices, room_model(kølerum), points, kølerum.steps, cache_dir)
+
+    def update_compressor(self, t_current, n):
+        """Slår op i tabellen ved det nærmeste gitterpunkt.
+
+        Args:
+            t_current (float): nuværende temperatur
+            n (int): iteration
+
+        Returns:
+            bool: True hvis kompressoren skal tændes, ellers False.
+
+        Examples:
+            >>> t = ThermostatOptimal(np.zeros(50), cache_dir=None)
+            >>> t.update_compressor(7.0, 0), t.update_compressor(3.0, 0), t.update_compressor(99.0, 0)
+            (True, False, True)
+        """
+        index = int((t_current - T_LOW) * self.scale + 0.5)
+        index = 0 if index < 0 else self.max_index if index > self.max_index else index
+        return self.policy.item(n, index)
+
+    def update_compressor_batch(self, t_current, n):
+        """Slår op i tabellen for mange temperaturer.
+
+        Args:
+            t_current (np.ndarray): nuværende temperaturer
+            n (int): iteration
+
+        Returns:
+            np.ndarray: True hvor kompressoren skal tændes
+
+        Examples:
+            >>> t = ThermostatOptimal(np.zeros(50), cache_dir=None)
+            >>> t.update_compressor_batch(np.array([3.0, 7.0]), 0)
+            array([False,  True])
+
+            Halve gitterpunkter rundes op som i update_compressor:
+
+            >>> temperatures = T_LOW + (np.arange(t.max_index) + 0.5) / t.scale
+            >>> all(t.update_compressor_batch(temperatures, 0) == [t.update_compressor(x, 0) for x in temperatures])
+            True
+        """
+        return self.policy[n][grid_index(t_current, self.max_index + 1)]
+
+
+# Termostaterne efter det navn de vælges med i cli, benchmark og fleet
+THERMOSTATS = {
+    "simple": ThermostatSimple,
+    "semismart": ThermostatSemiSmart,
+    "smart": ThermostatSmart,
+    "optimal": ThermostatOptimal,
+}
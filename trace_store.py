@@ -0,0 +1,406 @@
+"""Dette modul gemmer de fulde logs for mange måneder på disken som kolonner.
+
+Temperatur, el og madspild gemmes som float32 i blokke af chunk_months
+måneder, én .npy fil pr. blok og kolonne, indekseret med (måned, step). Dør
+og kompressor gemmes som pakkede bitmasker ligesom DoorSchedule. Filerne
+åbnes med memory-map, så en måned eller et tidsvindue kan læses uden at
+resten af kørslen lægges i RAM. Manifestet skrives efter filerne, så en halvt
+skrevet blok aldrig læses.
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from door_schedule import DoorSchedule
+from kølerum import COMPRESSOR_BIT, DELTA_T, DOOR_BIT, STEPS
+from result_cache import cache_key
+
+COLUMNS = ("temperature", "electricity", "food_waste")  # float32 kolonner
+FLAGS = {"door": DOOR_BIT, "compressor": COMPRESSOR_BIT}  # Pakkede bit kolonner og deres bit
+CHUNK_MONTHS = 64  # Måneder pr. fil, omkring 2 MiB pr. kolonne med 8640 steps
+
+
+class TraceStore:
+    def __init__(self, directory, steps=None, delta_t=None, chunk_months=CHUNK_MONTHS):
+        """En mappe med logs, eller en ny tom mappe.
+
+        Args:
+            directory (str): mappen
+            steps (int, optional): steps pr. måned. Skal passe med en eksisterende mappe.
+                Defaults to STEPS for en ny mappe.
+            delta_t (float, optional): sekunder pr. step. Skal passe med en eksisterende
+                mappe. Defaults to DELTA_T for en ny mappe.
+            chunk_months (int, optional): måneder pr. fil i en ny mappe. Defaults to CHUNK_MONTHS.
+
+        Raises:
+            ValueError: If steps or delta_t differ from an existing store.
+
+        Examples:
+            >>> import tempfile
+            >>> directory = tempfile.TemporaryDirectory()
+            >>> store = TraceStore(directory.name, steps=10, chunk_months=2)
+            >>> logs = np.arange(30.0).reshape(3, 10)
+            >>> states = np.zeros((3, 10), dtype=np.uint8)
+            >>> states[1, 4] = DOOR_BIT | COMPRESSOR_BIT
+            >>> store.append(logs, logs, logs, states)
+            >>> len(TraceStore(directory.name)), store.read("temperature", 2, 3, 6).tolist()
+            (3, [23.0, 24.0, 25.0])
+            >>> store.read("door", slice(1, 3), 3, 6).tolist()
+            [[False, True, False], [False, False, False]]
+            >>> store.monthly_sums("electricity").tolist()
+            [45.0, 145.0, 245.0]
+            >>> directory.cleanup()
+        """
+        self.directory = Path(directory)  # Mappen med filerne
+        self.manifest_path = self.directory / "manifest.json"
+        if self.manifest_path.exists():
+            with open(self.manifest_path) as file:
+                self.manifest = json.load(file)
+            for name, value in (("steps", steps), ("delta_t", delta_t)):
+                if value is not None and value != self.manifest[name]:
+                    raise ValueError(f"The store has {name}={self.manifest[name]}, not {value}.")
+        else:
+            self.manifest = {
+                "steps": STEPS if steps is None else steps,
+                "delta_t": DELTA_T if delta_t is None else delta_t,
+                "chunk_months": chunk_months,
+                "months": 0,
+                "key": None,
+            }
+
+    @property
+    def steps(self):
+        return self.manifest["steps"]
+
+    @property
+    def delta_t(self):
+        return self.manifest["delta_t"]
+
+    @property
+    def chunk_months(self):
+        return self.manifest["chunk_months"]
+
+    @property
+    def months(self):
+        return self.manifest["months"]
+
+    def __len__(self):
+        return self.months
+
+    def append(self, temperature, electricity, food_waste, states):
+        """Skriver måneder efter dem der allerede er i mappen.
+
+        Args:
+            temperature (np.ndarray): temperaturer af formen (months, steps)
+            electricity (np.ndarray): elpris pr. step af formen (months, steps)
+            food_waste (np.ndarray): madspild pr. step af formen (months, steps)
+            states (np.ndarray): DOOR_BIT og COMPRESSOR_BIT pr. step af formen (months, steps)
+
+        Raises:
+            ValueError: If a log does not have one row of steps values per month.
+        """
+        values = {name: np.asarray(log) for name, log in zip(COLUMNS + ("states",), (temperature, electricity, food_waste, states))}
+        count = len(values["states"])
+        for name, log in values.items():
+            if log.shape != (count, self.steps):
+                raise ValueError(f"{name} must have the shape ({count}, {self.steps}).")
+        if count == 0:
+            return
+        states = values.pop("states")
+        values.update({name: np.packbits((states & bit) != 0, axis=1) for name, bit in FLAGS.items()})
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        first = self.months
+        for chunk in range(first // self.chunk_months, (first + count - 1) // self.chunk_months + 1):
+            base = chunk * self.chunk_months
+            low = max(first, base)
+            high = min(first + count, base + self.chunk_months)
+            for name, rows in values.items():
+                target = self._chunk(chunk, name, write=True)
+                target[low - base:high - base] = rows[low - first:high - first]
+                target.flush()
+                del target
+        self.manifest["months"] = first + count
+        self._write_manifest()
+
+    def truncate(self, months):
+        """Glemmer månederne fra months og frem, så de kan skrives igen med append.
+
+        Args:
+            months (int): antal måneder der beholdes
+
+        Raises:
+            ValueError: If months is negative or more than the store holds.
+        """
+        if not 0 <= months <= self.months:
+            raise ValueError(f"months must be between 0 and {self.months}.")
+        self.manifest["months"] = months
+        self._write_manifest()
+
+    def record(self, monte_carlo, months, sample_months=1, sketch_capacity=200):
+        """Kører en Monte Carlo kørsel og skriver alle månedernes logs.
+
+        Kun én blok er i RAM ad gangen, så brug en mindre batch_size til lange
+        måneder. Har mappen allerede måneder fra samme kørsel fortsættes der fra
+        dem, og blokkene får samme strømme som i en kørsel der aldrig stoppede.
+        Sluttede den forrige kørsel midt i en blok, køres den blok igen fra
+        blokgrænsen.
+
+        Args:
+            monte_carlo (MonteCarlo): kørslen
+            months (int): antal måneder i mappen når kørslen er færdig
+            sample_months (int, optional): måneder hvis logs også returneres. Defaults to 1.
+            sketch_capacity (int, optional): centroider i kvantil skitsen. Defaults to 200.
+
+        Raises:
+            ValueError: If the store holds months from a different simulation.
+            ValueError: If steps or delta_t differ from the simulation.
+
+        Returns:
+            dict: samme som MonteCarlo.run_streaming for de måneder der blev skrevet nu
+        """
+        kølerum = monte_carlo.kølerum_template
+        key, _ = cache_key(monte_carlo)
+        if self.months == 0:
+            self.manifest.update(steps=kølerum.steps, delta_t=kølerum.delta_t)
+        elif self.manifest["key"] != key:
+            raise ValueError("The store belongs to a different simulation.")
+        elif (self.steps, self.delta_t) != (kølerum.steps, kølerum.delta_t):
+            raise ValueError("The store has a different steps or delta_t than the simulation.")
+        self.manifest["key"] = key
+
+        partial = self.months % monte_carlo.chunk_size()
+        if months > self.months and partial:
+            # Den sidste blok sluttede før blokgrænsen og køres igen fra grænsen,
+            # da en kortere blok ikke giver de samme måneder som en hel blok
+            self.truncate(self.months - partial)
+
+        results = monte_carlo._new_stream(sketch_capacity)
+        logs = ("temperature_logs", "electricity_logs", "food_waste_logs")
+        for first, stop, chunk_data in monte_carlo._iter_chunks(months, start=self.months, states=True):
+            self.append(*(np.asarray(chunk_data[name]) for name in logs + ("state_logs",)))
+            # Kun de første sample_months måneder beholder deres logs i resultatet
+            keep = max(0, min(stop, sample_months) - first)
+            monte_carlo._fold(results, {name: values[:keep] if name in logs else values for name, values in chunk_data.items()})
+        return results
+
+    def read(self, name, months=None, start=0, stop=None):
+        """Læser en kolonne for nogle måneder og et vindue af steps.
+
+        Kun filerne for de valgte måneder åbnes, og kun vinduet kopieres ud.
+
+        Args:
+            name (str): "temperature", "electricity", "food_waste", "door" eller "compressor"
+            months (int | slice, optional): én måned eller et udsnit med step 1.
+                Defaults to alle måneder.
+            start (int, optional): første step. Defaults to 0.
+            stop (int, optional): steppet der stoppes før. Defaults to steps.
+
+        Raises:
+            ValueError: If name is not a column.
+            ValueError: If months is a slice with a step other than 1.
+            IndexError: If a single month is outside the store.
+
+        Returns:
+            np.ndarray: float32 for logs og bool for dør og kompressor, af formen
+                (months, stop - start), eller 1-D for én måned
+        """
+        if name not in COLUMNS and name not in FLAGS:
+            raise ValueError(f"Invalid column. Use one of {', '.join(COLUMNS + tuple(FLAGS))}.")
+        single = not isinstance(months, slice) and months is not None
+        if single:
+            month = int(months)
+            month = month + self.months if month < 0 else month
+            if not 0 <= month < self.months:
+                raise IndexError("month is outside the store.")
+            first, last = month, month + 1
+        else:
+            first, last, step = (months or slice(None)).indices(self.months)
+            if step != 1:
+                raise ValueError("Only month slices with step 1 are supported.")
+            last = max(first, last)
+        start, stop, _ = slice(start, stop).indices(self.steps)
+        stop = max(start, stop)
+
+        if name in FLAGS:
+            out = np.empty((last - first, stop - start), dtype=bool)
+            # Kun de bytes der dækker vinduet pakkes ud
+            byte_start, offset = start >> 3, start & 7
+            byte_stop = (stop + 7) >> 3
+        else:
+            out = np.empty((last - first, stop - start), dtype=np.float32)
+        for chunk in range(first // self.chunk_months, (last - 1) // self.chunk_months + 1) if last > first else ():
+            base = chunk * self.chunk_months
+            low = max(first, base)
+            high = min(last, base + self.chunk_months)
+            data = self._chunk(chunk, name)
+            if name in FLAGS:
+                bits = np.unpackbits(data[low - base:high - base, byte_start:byte_stop], axis=1)
+                out[low - first:high - first] = bits[:, offset:offset + stop - start]
+            else:
+                out[low - first:high - first] = data[low - base:high - base, start:stop]
+            del data
+        return out[0] if single else out
+
+    def window(self, name, month, start_hours=0, stop_hours=None):
+        """Læser et tidsvindue af en måned i timer.
+
+        Args:
+            name (str): kolonnen, se read
+            month (int): måneden
+            start_hours (float, optional): vinduets start. Defaults to 0.
+            stop_hours (float, optional): vinduets slut. Defaults to månedens slut.
+
+        Returns:
+            tuple: (timer for hvert step, værdierne)
+        """
+        start = round(start_hours * 3600 / self.delta_t)
+        stop = None if stop_hours is None else round(stop_hours * 3600 / self.delta_t)
+        values = self.read(name, month, start, stop)
+        return (start + np.arange(values.size)) * (self.delta_t / 3600), values
+
+    def monthly_sums(self, name):
+        """Summen af en log for hver måned, beregnet én fil ad gangen.
+
+        Summen tages i float64, men logs er gemt som float32, så den kan afvige
+        lidt fra summen under selve kørslen.
+
+        Args:
+            name (str): "temperature", "electricity" eller "food_waste"
+
+        Returns:
+            np.ndarray: sum pr. måned
+        """
+        sums = np.empty(self.months)
+        for base in range(0, self.months, self.chunk_months):
+            high = min(self.months, base + self.chunk_months)
+            data = self._chunk(base // self.chunk_months, name)
+            sums[base:high] = data[:high - base].sum(axis=1, dtype=np.float64)
+            del data
+        return sums
+
+    def door_schedule(self, months=None):
+        """Dørens åbninger som DoorSchedule, fx til at afspille dem under et andet termostat.
+
+        Args:
+            months (slice, optional): månederne. Defaults to alle.
+
+        Returns:
+            DoorSchedule: skemaet
+        """
+        first, last, _ = (months or slice(None)).indices(self.months)
+        bits = [
+            self._chunk(base // self.chunk_months, "door")[max(first, base) - base:min(last, base + self.chunk_months) - base]
+            for base in range(first // self.chunk_months * self.chunk_months, last, self.chunk_months)
+        ]
+        packed = np.concatenate(bits) if bits else np.empty((0, (self.steps + 7) >> 3), dtype=np.uint8)
+        return DoorSchedule(packed, self.steps)
+
+    def column(self, name):
+        """Et lazy view af en kolonne der kan indekseres som et array, se TraceColumn.
+
+        Args:
+            name (str): kolonnen, se read
+
+        Returns:
+            TraceColumn: viewet
+        """
+        return TraceColumn(self, name)
+
+    def _chunk(self, chunk, name, write=False):
+        """Memory-mapper filen for en blok og en kolonne."""
+        path = self.directory / f"chunk-{chunk:06d}.{name}.npy"
+        if not write:
+            return np.load(path, mmap_mode="r")
+        if path.exists():
+            return np.load(path, mmap_mode="r+")
+        if name in FLAGS:
+            shape, dtype = (self.chunk_months, (self.steps + 7) >> 3), np.uint8
+        else:
+            shape, dtype = (self.chunk_months, self.steps), np.float32
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+    def _write_manifest(self):
+        """Skriver manifestet atomisk."""
+        tmp_path = self.manifest_path.with_name("manifest.json.tmp")
+        with open(tmp_path, "w") as file:
+            json.dump(self.manifest, file, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+
+class TraceColumn:
+    def __init__(self, store, name):
+        """En kolonne i en TraceStore der opfører sig som et (months, steps) array.
+
+        Indeksering læser kun de måneder og steps der spørges om. Det er nok til
+        ThermostatResults, så plottene kan vises for kørsler større end RAM.
+
+        Args:
+            store (TraceStore): mappen
+            name (str): kolonnen, se TraceStore.read
+
+        Examples:
+            >>> import tempfile
+            >>> directory = tempfile.TemporaryDirectory()
+            >>> store = TraceStore(directory.name, steps=4)
+            >>> store.append(np.ones((2, 4)), np.ones((2, 4)), np.ones((2, 4)), np.zeros((2, 4), dtype=np.uint8))
+            >>> column = store.column("temperature")
+            >>> column.shape, column[1, 2:].tolist(), column.sum(axis=1).tolist()
+            ((2, 4), [1.0, 1.0], [4.0, 4.0])
+            >>> directory.cleanup()
+        """
+        self.store = store  # Mappen
+        self.name = name  # Kolonnen
+
+    @property
+    def shape(self):
+        return (self.store.months, self.store.steps)
+
+    @property
+    def chunk_months(self):
+        return self.store.chunk_months
+
+    def __len__(self):
+        return self.store.months
+
+    def __getitem__(self, key):
+        months, steps = key if isinstance(key, tuple) else (key, slice(None))
+        if not isinstance(steps, slice) or steps.step not in (None, 1):
+            raise ValueError("Only step slices with step 1 are supported.")
+        return self.store.read(self.name, months, steps.start or 0, steps.stop)
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.store.read(self.name)
+        return values if dtype is None else values.astype(dtype)
+
+    def sum(self, axis=None):
+        """Summen pr. måned med axis=1, ellers den samlede sum."""
+        sums = self.store.monthly_sums(self.name)
+        return sums if axis == 1 else float(sums.sum())
+
+
+if __name__ == "__main__":
+    """Skriver en kørsel til en midlertidig mappe, læser en uge og kører doctest"""
+    import doctest
+    import tempfile
+    import time
+
+    from kølerum import Kølerum
+    from monte_carlo import MonteCarlo
+    from price_series import PriceSeries
+    from termostat import ThermostatSmart
+
+    energy_prices = PriceSeries.load("elpris.csv")
+    monte_carlo = MonteCarlo(Kølerum(ThermostatSmart(energy_prices), energy_prices), engine="batch", batch_size=100, seed=1)
+    with tempfile.TemporaryDirectory() as directory:
+        store = TraceStore(directory)
+        started = time.perf_counter()
+        results = store.record(monte_carlo, 500)
+        print(f"500 måneder skrevet på {time.perf_counter() - started:.2f} s, gennemsnit {results['cost_stats'].mean:.2f}")
+        started = time.perf_counter()
+        hours, temperature = store.window("temperature", 321, 0, 168)
+        print(f"En uge af måned 321 læst på {1000 * (time.perf_counter() - started):.2f} ms, maks {temperature.max():.2f} grader")
+    print(doctest.testmod())